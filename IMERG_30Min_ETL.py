@@ -15,7 +15,6 @@
 #       from the FTP site vs. "building a predictive list of filenames to try to download" as was the initial approach.
 # -------------------------------------------------------------------------------
 
-import arcpy
 import argparse  # required for processing command line arguments
 import datetime
 import time
@@ -23,29 +22,76 @@ import os
 
 import pickle
 import logging
-import glob  # required for usage within deleteOutOfDateRasters()
+import glob  # required for PlanRun() (listing the extract folders)
 
 import linecache  # required for capture_exception()
 import sys  # required for capture_exception()
 
 import re  # required for Regular Expressions
+import IMERG_30Min_Filename  # required for parsing the IMERG filenames
+import IMERG_30Min_Mosaic  # required for the mosaic dataset operations (arcpy or the local stand-in)
+import IMERG_30Min_Retention  # required for deleteOutOfDateRasters() and DeleteRasterFiles()
 
 import json  # required for RefreshService() (stopping and starting services)
 import urllib  # required for RefreshService() (stopping and starting services) and retrieving remote files.
-import urllib2  # required for retrieving remote files.
+import urlparse  # required for ProxySession
+import httplib  # required for ProxySession (keep-alive connections to the proxy site)
+import socket  # required for ProxySession
+import threading  # required for ProxySession
+import sqlite3  # required for ListingManifest
 
 import ftplib  # require for ftp downloads
+import Queue  # required for FTPSessionPool
 
 import shutil  # required for DeleteFolderContents()
 import json  # required for UpdateServicesJsonFile() (updating services JSON file)
 
+from multiprocessing.pool import ThreadPool  # required for the concurrent proxy and ftp downloads
+import functools  # required for the concurrent ftp downloads
+import multiprocessing  # required for the transform worker processes
+import tempfile  # required for the transform worker processes
+import random  # required for the daemon mode (poll interval jitter)
+import math  # required for RunMetrics (percentiles)
+import hashlib  # required for VerifyDownload() (checksums)
+import base64  # required for VerifyDownload() (checksums)
+
 # ------------------------------------------------------------
-# Read configuration settings
+# Configuration settings - read from config.pkl on first use by GetConfig()
 # Global Variables - contents will not change during execution
 # ------------------------------------------------------------
-pkl_file = open('config.pkl', 'rb')
-myConfig = pickle.load(pkl_file)
-pkl_file.close()
+myConfig = None
+
+# The arcpy module - imported on first use by ImportArcpy() (importing it takes several seconds, which --help and
+# --plan do not need to pay for)
+arcpy = None
+
+# The IMERG_30Min_Transform module (NumPy/GDAL transform engine and pixel statistics) - imported on first use by
+# ImportTransform(), as importing NumPy and GDAL is not needed for --help and --plan either
+IMERG_30Min_Transform = None
+
+# Shared keep-alive session for the proxy site - created on first use by GetProxySession()
+myProxySession = None
+
+# Retry/backoff and circuit breaker settings for the remote requests - created on first use by GetFetchPolicy()
+myFetchPolicy = None
+
+# Local index of the remote folder listings - opened on first use by GetListingManifest()
+myListingManifest = None
+
+# The backend for the mosaic dataset operations (see IMERG_30Min_Mosaic.py) - created on first use by GetMosaicBackend()
+myMosaicBackend = None
+
+# Name, timestamp and Data_Age of every mosaic dataset row - read once per run on first use by GetMosaicCatalog()
+myMosaicCatalog = None
+
+# Per-raster statistics of the mosaic dataset rasters - loaded from the state file on first use by GetMosaicStatistics()
+myMosaicStatistics = None
+
+# Stage timings and counters of the current run - created on first use by GetRunMetrics(), written by WriteRunMetrics()
+myRunMetrics = None
+
+# The most sessions we will ever open at once to the PPS ftp site, regardless of the 'ftp_MaxSessions' setting.
+FTP_MAX_SESSIONS = 4
 
 
 class MapService(object):
@@ -86,6 +132,1142 @@ class MapService(object):
         self.svcType = svc_type
 
 
+class HTTPStatusError(IOError):
+    """
+        Raised by ProxySession when the proxy site answers with an HTTP error status (kept in 'status').
+    """
+
+    def __init__(self, status, message):
+        IOError.__init__(self, message)
+        self.status = status
+
+
+class CircuitOpenError(IOError):
+    """
+        Raised by FetchPolicy instead of sending a request to a host whose circuit is open.
+    """
+    pass
+
+
+class FetchPolicy(object):
+    """
+        How the requests to the remote sites (proxy listings and files, ftp commands) are retried.  i.e.
+          'retries':       3     (attempts per request)
+          'backoff':       1.0   (seconds of backoff before the first retry, doubled for each retry after it)
+          'max_backoff':   30.0  (the most backoff between two attempts)
+          'budget':        20    (retries allowed per run, over all of the requests)
+          'break_after':   5     (failures in a row that open the circuit of a host)
+          'break_seconds': 120   (how long an open circuit holds back the requests to its host)
+        The wait before a retry is half of the backoff plus a random part of the other half, so the download threads
+        do not all retry in step.  Only the errors that may go away are retried (timeouts, dropped connections, HTTP
+        5xx/429 and ftp 4xx replies) - a missing folder or file is not.  Once a host has failed break_after times in a
+        row, its circuit is opened and every request to it fails at once (CircuitOpenError) for break_seconds; then a
+        single request is let through, and if it succeeds the circuit is closed again.
+    """
+
+    def __init__(self, retries=3, backoff=1.0, max_backoff=30.0, budget=20, break_after=5, break_seconds=120):
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.maxBackoff = max_backoff
+        self.budget = budget
+        self.breakAfter = max(1, break_after)
+        self.breakSeconds = break_seconds
+        self.retriesUsed = 0
+        self.circuitsOpened = 0
+        self.listingsFailed = 0
+        # host -> [failures in a row, time its circuit was opened (None = closed)]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def StartRun(self):
+        # A new budget for each run.  The circuits are kept, so a host that is down is not hammered by the next cycle.
+        with self._lock:
+            self.retriesUsed = 0
+            self.listingsFailed = 0
+
+    def RecordFailedListing(self):
+        # A folder that could not be listed this run (see ListFolder())
+        with self._lock:
+            self.listingsFailed += 1
+
+    @staticmethod
+    def IsRetryable(err):
+        """
+        Returns True if the error passed in may go away when the request is tried again.
+        """
+        if isinstance(err, CircuitOpenError) or isinstance(err, ftplib.error_perm):
+            return False
+        if isinstance(err, HTTPStatusError):
+            return err.status >= 500 or err.status in (408, 429)
+        return isinstance(err, (EnvironmentError, EOFError, httplib.HTTPException, ftplib.Error))
+
+    def Check(self, host):
+        """
+        Raises CircuitOpenError if the circuit of the host passed in is open.  Once break_seconds have passed, the
+        request is let through as the test of the host (and the circuit re-armed, to hold back the others meanwhile).
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return
+            if time.time() - state[1] < self.breakSeconds:
+                raise CircuitOpenError("Circuit open for {0} after {1} failures in a row".format(host, state[0]))
+            state[1] = time.time()
+
+    def RecordSuccess(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def RecordFailure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None])
+            state[0] += 1
+            bOpened = state[0] >= self.breakAfter and state[1] is None
+            if bOpened:
+                state[1] = time.time()
+                self.circuitsOpened += 1
+        if bOpened:
+            logging.warning("{0} failures in a row from {1} - holding back its requests for {2:.0f} seconds.".format(
+                            self.breakAfter, host, self.breakSeconds))
+            IncrementMetric("fetch_circuits_opened")
+
+    def OnError(self, host, err, attempt, attempts=None):
+        """
+        Called after a failed attempt of a request to the host passed in.  Returns True, once the backoff has been
+        waited out, if the request should be tried again: the error is retryable, attempts (default 'retries') have not
+        all been used, the circuit of the host is still closed and the run's retry budget is not spent.
+        """
+        if not self.IsRetryable(err):
+            return False
+        self.RecordFailure(host)
+        if attempt >= (attempts or self.retries):
+            return False
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None and state[1] is not None:
+                return False
+            if self.retriesUsed >= self.budget:
+                logging.debug("\t\tRetry budget of {0} spent, not retrying: {1}".format(self.budget, err))
+                return False
+            self.retriesUsed += 1
+        IncrementMetric("fetch_retries")
+        seconds = min(self.maxBackoff, self.backoff * 2 ** (attempt - 1))
+        time.sleep(seconds / 2.0 + random.uniform(0, seconds / 2.0))
+        return True
+
+    def Call(self, host, function, attempts=None):
+        """
+        Returns function() - a request to the host passed in - retried as above.  The last error is raised if it does
+        not succeed.
+        """
+        attempts = attempts or self.retries
+        for attempt in range(1, attempts + 1):
+            self.Check(host)
+            try:
+                result = function()
+            except Exception, e:
+                if self.OnError(host, e, attempt, attempts):
+                    continue
+                raise
+            self.RecordSuccess(host)
+            return result
+
+
+class ProxySession(object):
+    """
+        A small, thread-safe HTTP(S) session for the FTP proxy site.  i.e.
+          'proxyURL':     'https://proxy.servirglobal.net/ProxyFTP.aspx',
+          'timeout':      60   (seconds, per file request)
+          'list_timeout': 30   (seconds, per directory listing request - defaults to timeout)
+        Connections to the proxy host are kept alive and handed back to an idle list after each request, so the
+        directory listings and the file fetches (including the ones made by the download pool threads) reuse a few
+        connections instead of paying a new TLS handshake for every request.  The opened vs. reused connection
+        counters are reported at the end of the run.
+    """
+
+    def __init__(self, proxy_url="", timeout=60, chunk_size=65536, list_timeout=None):
+        urlParts = urlparse.urlsplit(proxy_url)
+        self.proxyURL = proxy_url
+        self.scheme = urlParts.scheme
+        self.host = urlParts.netloc
+        self.path = urlParts.path
+        self.timeout = timeout
+        self.listTimeout = list_timeout or timeout
+        self.chunkSize = chunk_size
+        self.connectionsOpened = 0
+        self.connectionsReused = 0
+        self.requestCount = 0
+        self._idleConnections = []
+        self._lock = threading.Lock()
+
+    def _getConnection(self):
+        # Hand out an idle keep-alive connection if there is one, otherwise open a new one.
+        with self._lock:
+            if len(self._idleConnections) > 0:
+                self.connectionsReused += 1
+                return self._idleConnections.pop(), True
+            self.connectionsOpened += 1
+        if self.scheme == "https":
+            return httplib.HTTPSConnection(self.host, timeout=self.timeout), False
+        return httplib.HTTPConnection(self.host, timeout=self.timeout), False
+
+    def _releaseConnection(self, conn, response):
+        # The connection can only be reused if the server did not ask us to close it.
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idleConnections.append(conn)
+
+    def _open(self, query, headers=None, timeout=None):
+        """
+        Send a GET for <proxy path>?<query> and return the (connection, response) once the response headers are in.
+        The timeout (default 'timeout') applies to each socket operation of this request.  A reused connection that the
+        server has already dropped is retried once on a brand new connection.  Raises HTTPStatusError if the proxy does
+        not return HTTP 200 (or 206 Partial Content, for a request with a Range header).
+        """
+        headers = headers or {}
+        for attempt in (1, 2):
+            conn, bReused = self._getConnection()
+            try:
+                conn.timeout = timeout or self.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                conn.request("GET", self.path + "?" + query, headers=headers)
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if bReused and attempt == 1:
+                    continue
+                raise
+
+            with self._lock:
+                self.requestCount += 1
+
+            if response.status != 200 and not (response.status == 206 and "Range" in headers):
+                conn.close()
+                raise HTTPStatusError(response.status, "HTTP {0} {1} from proxy for: {2}".format(
+                                      response.status, response.reason, query))
+            return conn, response
+
+    def _read(self, conn, response, writer):
+        # Pass the response body, chunk by chunk, to the writer function and return the number of bytes received.
+        try:
+            iBytes = 0
+            while True:
+                chunk = response.read(self.chunkSize)
+                if not chunk:
+                    break
+                writer(chunk)
+                iBytes += len(chunk)
+        except:
+            conn.close()
+            raise
+
+        self._releaseConnection(conn, response)
+        return iBytes
+
+    def _request(self, query, writer, timeout=None):
+        """
+        Send a GET for <proxy path>?<query> and pass the response body, chunk by chunk, to the writer function.
+        Returns the number of bytes received.
+        """
+        conn, response = self._open(query, None, timeout)
+        return self._read(conn, response, writer)
+
+    def GetDirectoryListing(self, ftpDirectory):
+        """
+        Returns the raw (comma separated) listing of the FTP directory passed in.
+          i.e. 'ftp://host/data/imerg/gis/2018/08/'
+        A failed listing is retried as set by the FetchPolicy (see GetFetchPolicy()).
+        """
+        def _list():
+            timeStart = time.time()
+            chunks = []
+            self._request("directory=" + ftpDirectory, chunks.append, self.listTimeout)
+            RecordFileTime("list", time.time() - timeStart, True)
+            return "".join(chunks)
+        return GetFetchPolicy().Call(self.host, _list)
+
+    def RetrieveFile(self, ftpFile, targetFile, iOffset=0):
+        """
+        Streams the FTP file passed in to the target file.  With an iOffset, only the rest of the file is asked for (an
+        HTTP Range request) and appended to the target file - unless the proxy ignores the Range and sends the whole
+        file, which then replaces the target file.
+        Returns a tuple of (size of the target file, size of the whole remote file or None if the proxy did not say,
+        Last-Modified header or None, Content-MD5 header or None).
+        """
+        headers = {"Range": "bytes={0}-".format(iOffset)} if iOffset > 0 else None
+        conn, response = self._open("url=" + ftpFile, headers)
+        iRemoteSize = None
+        if response.status == 206:
+            # i.e. 'bytes 65536-1036799/1036800'
+            sTotal = (response.getheader("Content-Range") or "").rpartition("/")[2]
+            if sTotal.isdigit():
+                iRemoteSize = int(sTotal)
+        elif (response.getheader("Content-Length") or "").isdigit():
+            iRemoteSize = int(response.getheader("Content-Length"))
+
+        with open(targetFile, "ab" if response.status == 206 else "wb") as f:
+            self._read(conn, response, f.write)
+        return (os.path.getsize(targetFile), iRemoteSize, response.getheader("Last-Modified"),
+                response.getheader("Content-MD5"))
+
+    def close(self):
+        with self._lock:
+            for conn in self._idleConnections:
+                conn.close()
+            del self._idleConnections[:]
+
+
+class FTPSessionPool(object):
+    """
+        A small pool of authenticated ftplib.FTP sessions to the PPS ftp site.  i.e.
+          'host':     'jsimpson.pps.eosdis.nasa.gov',
+          'port':     21,
+          'size':     2    (capped at FTP_MAX_SESSIONS so we stay within the PPS connection limits)
+          'retries':  3    (attempts per listing before giving up)
+        Sessions are only opened as they are needed, and each is handed to one thread at a time so several files can
+        be RETR'd at once.  If the server drops a session, it is thrown away and the listing is retried on a freshly
+        logged in session (with the backoff, retry budget and circuit breaker of the FetchPolicy).  A file download
+        is tried once here - RetrieveVerifiedFile() resumes it, under the same FetchPolicy.
+    """
+
+    def __init__(self, host="", uname="", psswd="", size=2, retries=3, timeout=60, port=21):
+        self.host = host
+        self.port = port
+        self.username = uname
+        self.password = psswd
+        self.size = max(1, min(size, FTP_MAX_SESSIONS))
+        self.retries = max(1, retries)
+        self.timeout = timeout
+        self.sessionsOpened = 0
+        self.reconnects = 0
+        self._idleSessions = Queue.Queue()
+        self._liveSessions = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        # Use an idle session if there is one, open a new one if we are under the cap, otherwise wait for one.
+        try:
+            return self._idleSessions.get_nowait()
+        except Queue.Empty:
+            pass
+        with self._lock:
+            bOpenNew = self._liveSessions < self.size
+            if bOpenNew:
+                self._liveSessions += 1
+        if not bOpenNew:
+            return self._idleSessions.get()
+        try:
+            ftp = ftplib.FTP(timeout=self.timeout)
+            ftp.connect(self.host, self.port)
+            ftp.login(self.username, self.password)
+        except:
+            with self._lock:
+                self._liveSessions -= 1
+            raise
+        with self._lock:
+            self.sessionsOpened += 1
+        return ftp
+
+    def _release(self, ftp):
+        self._idleSessions.put(ftp)
+
+    def _discard(self, ftp):
+        # The session is broken - close it quietly and free up its slot for a new one.
+        try:
+            ftp.close()
+        except:
+            pass
+        with self._lock:
+            self._liveSessions -= 1
+
+    def _run(self, ftpCommand, bRetry=True):
+        """
+        Run ftpCommand(ftp) on a pooled session and return its result.  When the server drops the session (or the
+        command fails with any ftplib error) the session is discarded and, if the FetchPolicy allows it (a permanent
+        5xx reply is not retried), the command is retried on a new session.  With bRetry False the command is tried
+        once and the error raised without going through the FetchPolicy - for a caller that applies the policy itself
+        (see RetrieveVerifiedFile()), so a failure is neither retried nor counted by the circuit breaker twice.
+        """
+        fetchPolicy = GetFetchPolicy()
+        attempts = self.retries if bRetry else 1
+        for attempt in range(1, attempts + 1):
+            if bRetry:
+                fetchPolicy.Check(self.host)
+            try:
+                ftp = self._acquire()
+            except ftplib.all_errors, e:
+                # Could not connect/log in
+                if not bRetry or not fetchPolicy.OnError(self.host, e, attempt, attempts):
+                    raise
+                continue
+            try:
+                result = ftpCommand(ftp)
+            except ftplib.all_errors, e:
+                self._discard(ftp)
+                with self._lock:
+                    self.reconnects += 1
+                if not bRetry or not fetchPolicy.OnError(self.host, e, attempt, attempts):
+                    raise
+                logging.debug("\t\tFTP session dropped, retrying (attempt {0} of {1})".format(attempt + 1, attempts))
+                continue
+            if bRetry:
+                fetchPolicy.RecordSuccess(self.host)
+            self._release(ftp)
+            return result
+
+    def ListFiles(self, ftpFolder):
+        """
+        Returns the list of ALL filenames in the FTP folder passed in.
+        """
+        def _nlst(ftp):
+            tmpList = []
+            ftp.cwd(ftpFolder)
+            ftp.retrlines("NLST", tmpList.append)
+            return tmpList
+        timeStart = time.time()
+        tmpList = self._run(_nlst)
+        RecordFileTime("list", time.time() - timeStart, True)
+        return tmpList
+
+    def RetrieveFile(self, ftpFile, targetFile, iOffset=0):
+        """
+        RETR the (fully qualified) FTP file passed in to the target file.  With an iOffset, the transfer is restarted
+        (REST) at that byte and appended to the target file.  Returns a tuple of (size of the target file, size of the
+        remote file or None if the server does not support SIZE, None, None) - the same as ProxySession.RetrieveFile().
+        It is tried once: the retries (resumed from the bytes already written) are left to RetrieveVerifiedFile().
+        """
+        def _retr(ftp):
+            ftp.voidcmd("TYPE I")
+            try:
+                iRemoteSize = ftp.size(ftpFile)
+            except ftplib.error_perm:
+                iRemoteSize = None
+            with open(targetFile, "ab" if iOffset > 0 else "wb") as f:
+                ftp.retrbinary("RETR %s" % ftpFile, f.write, rest=iOffset if iOffset > 0 else None)
+            return os.path.getsize(targetFile), iRemoteSize, None, None
+        return self._run(_retr, False)
+
+    def close(self):
+        while True:
+            try:
+                ftp = self._idleSessions.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except:
+                ftp.close()
+            with self._lock:
+                self._liveSessions -= 1
+
+
+class ListingManifest(object):
+    """
+        A local (SQLite) index of the remote FTP folder listings.  i.e.
+          'db_file': 'IMERG_30Min_Manifest.sqlite'   (only used if 'manifest_File' is set, i.e. next to config.pkl)
+        Each listed filename is recorded once, with its folder, product ("E" or "L"), start timestamp (parsed from the
+        name) and a status of 'listed', 'downloaded' or 'loaded' ('ignored' for names that are not 30 minute tifs).
+        Each run only has to parse the names that are new since the last listing, so discovery costs roughly the number
+        of new files instead of the size of the folder.
+        It also keeps the download cache: the size (plus the Last-Modified date and checksum, when the server gave them)
+        of each file whose download was verified, so a file that is still on disk is not fetched again.
+        With read_only, the index is only queried (used by --plan, which must not change anything).
+    """
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, db_file="", read_only=False):
+        self.dbFile = db_file
+        self.conn = sqlite3.connect(db_file)
+        if read_only:
+            self.conn.execute("PRAGMA query_only = ON")
+            return
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, folder TEXT NOT NULL, "
+                          "product TEXT, timestamp TEXT, status TEXT NOT NULL, listed TEXT NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_folder ON files (folder, product, timestamp)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS folders (folder TEXT PRIMARY KEY, listed TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS downloads (name TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                          "modified TEXT, checksum TEXT, verified TEXT NOT NULL)")
+        self.conn.commit()
+
+    def GetNewNames(self, folder, names):
+        """
+        Returns the names from the listing passed in that are not in the index yet.
+        """
+        knownNames = set(r[0] for r in self.conn.execute("SELECT name FROM files WHERE folder = ?", (folder,)))
+        return [name for name in names if len(name) > 0 and name not in knownNames]
+
+    def AddListed(self, folder, records):
+        """
+        Add the (name, product, start datetime) records passed in to the index.  A record with no product is stored as
+        'ignored' so it is never looked at again.
+        """
+        sListed = datetime.datetime.now().strftime(self.DATE_FORMAT)
+        rows = []
+        for name, product, oDateTime in records:
+            sTimestamp = oDateTime.strftime(self.DATE_FORMAT) if oDateTime is not None else None
+            rows.append((name, folder, product, sTimestamp, "listed" if product is not None else "ignored", sListed))
+        self.conn.executemany("INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.execute("INSERT OR REPLACE INTO folders VALUES (?, ?)", (folder, sListed))
+        self.conn.commit()
+
+    def GetListingAge(self, folder):
+        """
+        Returns the number of seconds since the folder passed in was last listed, or None if it has never been listed.
+        """
+        row = self.conn.execute("SELECT listed FROM folders WHERE folder = ?", (folder,)).fetchone()
+        if row is None:
+            return None
+        oListed = datetime.datetime.strptime(row[0], self.DATE_FORMAT)
+        return (datetime.datetime.now() - oListed).total_seconds()
+
+    def GetLatestLoaded(self, product):
+        """
+        Returns the start datetime of the latest file of the product passed in ("E" or "L") that has been loaded, or
+        None if there is none in the index.
+        """
+        row = self.conn.execute("SELECT MAX(timestamp) FROM files WHERE product = ? AND status = 'loaded'",
+                                (product,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return datetime.datetime.strptime(row[0], self.DATE_FORMAT)
+
+    def GetCandidates(self, folder, product, oAfterDateTime, oUpToDateTime=None):
+        """
+        Returns the names in the folder for the product passed in that have not been downloaded yet and are dated
+        later than oAfterDateTime (and no later than oUpToDateTime, if passed in), oldest first.  (Files whose download
+        failed are still 'listed', so they are retried.)
+        """
+        sql = "SELECT name FROM files WHERE folder = ? AND product = ? AND status = 'listed' AND timestamp > ?"
+        params = [folder, product, oAfterDateTime.strftime(self.DATE_FORMAT)]
+        if oUpToDateTime is not None:
+            sql += " AND timestamp <= ?"
+            params.append(oUpToDateTime.strftime(self.DATE_FORMAT))
+        cursor = self.conn.execute(sql + " ORDER BY timestamp", params)
+        return [str(r[0]) for r in cursor]
+
+    def SetStatus(self, names, status):
+        """
+        Set the status of the names passed in.  A name is never moved back from 'loaded' to 'downloaded' (in pipeline
+        mode a file can be loaded before its download is recorded).
+        """
+        if status == "downloaded":
+            sql = "UPDATE files SET status = ? WHERE name = ? AND status = 'listed'"
+        else:
+            sql = "UPDATE files SET status = ? WHERE name = ?"
+        self.conn.executemany(sql, [(status, name) for name in names])
+        self.conn.commit()
+
+    def AddVerified(self, records):
+        """
+        Record the (name, size, Last-Modified or None, checksum or None) of the downloads passed in, which have been
+        verified.  A file downloaded again replaces its earlier record.
+        """
+        sVerified = datetime.datetime.now().strftime(self.DATE_FORMAT)
+        self.conn.executemany("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                              [(name, iSize, sModified, sChecksum, sVerified)
+                               for name, iSize, sModified, sChecksum in records])
+        self.conn.commit()
+
+    def GetVerified(self, names):
+        """
+        Returns a dictionary of name -> (size, Last-Modified, checksum) for the names passed in that have a verified
+        download recorded.
+        """
+        verified = {}
+        names = list(names)
+        # (In chunks, to stay under SQLite's limit on the number of query parameters)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            sql = "SELECT name, size, modified, checksum FROM downloads WHERE name IN ({0})".format(
+                ", ".join("?" * len(chunk)))
+            for name, iSize, sModified, sChecksum in self.conn.execute(sql, chunk):
+                verified[str(name)] = (iSize, sModified, sChecksum)
+        return verified
+
+    def Prune(self, oBeforeDateTime):
+        """
+        Remove entries dated (or, for the 'ignored' names, listed) before oBeforeDateTime - their folders are no
+        longer listed - and the download records verified before then.  Returns the number of entries removed.
+        """
+        sBefore = oBeforeDateTime.strftime(self.DATE_FORMAT)
+        cursor = self.conn.execute("DELETE FROM files WHERE timestamp < ? OR (timestamp IS NULL AND listed < ?)",
+                                   (sBefore, sBefore))
+        self.conn.execute("DELETE FROM downloads WHERE verified < ?", (sBefore,))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        self.conn.close()
+
+
+class MosaicCatalog(object):
+    """
+        The Name, timestamp and Data_Age of every row in the mosaic dataset.  i.e.
+          'mosaic_ds': 'E:/SERVIR/DATA/Global/IMERG_30Min_SR3857.gdb/IMERG'
+        The rows are read once (one ReadRows() call on the mosaic backend) into three parallel lists plus a name index,
+        and then kept up to date as rasters are added to or removed from the mosaic dataset during the run.  The latest
+        date, row count, sibling and retention queries are answered from memory instead of querying the GDB each time.
+    """
+
+    def __init__(self, mosaic_ds=""):
+        self.mosaicDS = mosaic_ds
+        self.names = []
+        self.timestamps = []
+        self.dataAges = []
+        self.index = {}
+        # Incremented whenever rasters are added or removed, so a run can tell whether it changed the mosaic dataset
+        self.changeCount = 0
+
+        for name, oTimestamp, dataAge in GetMosaicBackend(mosaic_ds).ReadRows():
+            self._Set(name, oTimestamp, dataAge)
+
+    def _Set(self, name, oTimestamp, dataAge):
+        i = self.index.get(name)
+        if i is None:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.timestamps.append(oTimestamp)
+            self.dataAges.append(dataAge)
+        else:
+            self.timestamps[i] = oTimestamp
+            self.dataAges[i] = dataAge
+
+    def GetCount(self):
+        return len(self.names)
+
+    def Contains(self, name):
+        # name is the raster name, minus the .tif extension
+        return name in self.index
+
+    def GetLatest(self, early_or_late):
+        """
+        Returns the latest timestamp of the "EARLY" or "LATE" rows, or None if there are none.
+        """
+        theDate = None
+        for oTimestamp, dataAge in zip(self.timestamps, self.dataAges):
+            if dataAge == early_or_late and oTimestamp is not None and (theDate is None or oTimestamp > theDate):
+                theDate = oTimestamp
+        return theDate
+
+    def GetNamesBefore(self, oDate):
+        """
+        Returns the names of the rows whose timestamp is before the date passed in (the rasters past retention).
+        """
+        return [name for name, oTimestamp in zip(self.names, self.timestamps)
+                if oTimestamp is not None and oTimestamp.date() < oDate]
+
+    def AddRasters(self, records):
+        """
+        Add (or update) the (name, timestamp, Data_Age) records passed in, for rasters just added to the mosaic.
+        """
+        for name, oTimestamp, dataAge in records:
+            self._Set(name, oTimestamp, dataAge)
+            self.changeCount += 1
+
+    def RemoveRasters(self, names):
+        """
+        Drop the names passed in, for rasters just removed from the mosaic.  The lists are rebuilt once per call.
+        """
+        names = set(names)
+        if len(names.intersection(self.index)) == 0:
+            return
+        keep = [i for i, name in enumerate(self.names) if name not in names]
+        self.changeCount += len(self.names) - len(keep)
+        self.names = [self.names[i] for i in keep]
+        self.timestamps = [self.timestamps[i] for i in keep]
+        self.dataAges = [self.dataAges[i] for i in keep]
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+
+
+class MosaicStatistics(object):
+    """
+        The pixel statistics of each raster in the mosaic dataset (count, sum, sum of squares, min and max - see
+        IMERG_30Min_Transform.PixelStats), keyed by raster name and kept in the state file between runs.  i.e.
+          'state': the "statistics" section of the state file (see LoadStateFile())
+        The statistics of each raster are recorded when it is loaded, and merged into a (min, max, mean, std. dev.)
+        summary of every pixel of every raster.  The summary at the last full recalculation of the mosaic dataset
+        statistics, and when that was, are kept in the state file too, so each run can tell how far the data has
+        drifted since the statistics were last calculated (see UpdateMosaicStatistics()).
+    """
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.rasters = state.get("rasters", {})
+        self.recalculated = state.get("recalculated")
+        self.baseline = state.get("baseline")
+
+    def AddRaster(self, name, stats):
+        """
+        Record the statistics for the raster name (minus .tif) passed in.
+        """
+        self.rasters[name] = list(stats)
+
+    def Reconcile(self, mosaicNames):
+        """
+        Forget the rasters that are no longer in the mosaic dataset and return the (sorted) names of the rasters in the
+        mosaic dataset that have no statistics recorded.
+        """
+        mosaicNames = set(mosaicNames)
+        for name in [name for name in self.rasters if name not in mosaicNames]:
+            del self.rasters[name]
+        return sorted(name for name in mosaicNames if name not in self.rasters)
+
+    def GetSummary(self):
+        """
+        Returns the [min, max, mean, std. dev.] of all of the recorded statistics, or None if they hold no pixels.
+        """
+        merged = ImportTransform().MergePixelStats(self.rasters.values())
+        mean, stdDev = IMERG_30Min_Transform.GetMeanAndStdDev(merged)
+        if mean is None:
+            return None
+        return [merged.minimum, merged.maximum, mean, stdDev]
+
+    def GetHoursSinceRecalculated(self, oNow):
+        # None if the statistics have never been recalculated
+        if self.recalculated is None:
+            return None
+        return (oNow - datetime.datetime.strptime(self.recalculated, self.DATE_FORMAT)).total_seconds() / 3600.0
+
+    def GetDrift(self, summary):
+        """
+        Returns the largest change of the min, max, mean or std. dev. in the summary passed in since the last full
+        recalculation, as a fraction of the (min to max) range at the time, or None if there is nothing to compare.
+        """
+        if summary is None or self.baseline is None:
+            return None
+        valueRange = self.baseline[1] - self.baseline[0]
+        change = max(abs(value - baseValue) for value, baseValue in zip(summary, self.baseline))
+        if valueRange <= 0:
+            return 0.0 if change == 0 else float("inf")
+        return change / valueRange
+
+    def Recalculated(self, oNow, summary):
+        # The statistics of the mosaic dataset have just been recalculated in full
+        self.recalculated = oNow.strftime(self.DATE_FORMAT)
+        self.baseline = summary
+
+    def ToState(self):
+        return {"rasters": self.rasters, "recalculated": self.recalculated, "baseline": self.baseline}
+
+
+class RunMetrics(object):
+    """
+        The stage timings and the byte/file counters of one run.  i.e.
+          'stages':    {'download': [seconds, calls], 'add': [seconds, calls], ...}
+          'fileTimes': {'download': [seconds per file, ...], 'transform': [...], ...}
+          'counters':  {'download_bytes': 1234567, 'loaded_late': 48, ...}
+        Written by WriteRunMetrics(), if turned on, as one JSON line per run ('metrics_File') and/or as a Prometheus
+        node exporter textfile ('metrics_PromFile').  The download pool threads record their times too, hence the lock.
+    """
+
+    # The stages, in run order: list, download, transform (per file, in the worker processes), add (to the mosaic),
+    # attributes, cleanup (Early replacement and retention), stats, compact and refresh (the services)
+    STAGES = ("list", "download", "transform", "add", "attributes", "cleanup", "stats", "compact", "refresh")
+
+    def __init__(self):
+        self.oStart = datetime.datetime.now()
+        self.timeStart = time.time()
+        self.stages = {}
+        self.fileTimes = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def AddStageTime(self, stage, seconds):
+        with self._lock:
+            stageTime = self.stages.setdefault(stage, [0.0, 0])
+            stageTime[0] += seconds
+            stageTime[1] += 1
+
+    def AddFileTime(self, stage, seconds):
+        with self._lock:
+            self.fileTimes.setdefault(stage, []).append(seconds)
+
+    def Increment(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def GetFileSummary(self, stage):
+        """
+        Returns the count, mean, p50, p95 and max of the per-file seconds of the stage passed in.
+        """
+        times = sorted(self.fileTimes.get(stage, []))
+        if len(times) == 0:
+            return {"count": 0}
+
+        def percentile(fraction):
+            # Nearest rank
+            return times[max(0, int(math.ceil(fraction * len(times))) - 1)]
+        return {"count": len(times), "mean": sum(times) / len(times), "p50": percentile(0.5),
+                "p95": percentile(0.95), "max": times[-1]}
+
+    def ToRecord(self, mode, bSuccess):
+        return {"start": self.oStart.strftime('%Y-%m-%d %H:%M:%S'), "mode": mode, "success": bSuccess,
+                "seconds": time.time() - self.timeStart,
+                "stages": dict((stage, {"seconds": v[0], "calls": v[1]}) for stage, v in self.stages.items()),
+                "files": dict((stage, self.GetFileSummary(stage)) for stage in self.fileTimes),
+                "counters": self.counters}
+
+    def ToPrometheus(self, mode, bSuccess):
+        """
+        Returns the run in the Prometheus text format (gauges, as each run replaces the last one).
+        """
+        labels = 'mode="{0}"'.format(mode)
+        lines = ["# HELP imerg_etl_run_seconds Total seconds taken by the last run.",
+                 "# TYPE imerg_etl_run_seconds gauge",
+                 "imerg_etl_run_seconds{{{0}}} {1:.3f}".format(labels, time.time() - self.timeStart),
+                 "# HELP imerg_etl_run_success 1 if the last run finished, 0 if it stopped on an error.",
+                 "# TYPE imerg_etl_run_success gauge",
+                 "imerg_etl_run_success{{{0}}} {1}".format(labels, 1 if bSuccess else 0),
+                 "# HELP imerg_etl_run_timestamp_seconds Unix time the last run started.",
+                 "# TYPE imerg_etl_run_timestamp_seconds gauge",
+                 "imerg_etl_run_timestamp_seconds{{{0}}} {1:.0f}".format(labels, self.timeStart),
+                 "# HELP imerg_etl_stage_seconds Seconds spent in each stage of the last run.",
+                 "# TYPE imerg_etl_stage_seconds gauge"]
+        for stage in sorted(self.stages):
+            lines.append('imerg_etl_stage_seconds{{{0},stage="{1}"}} {2:.3f}'.format(labels, stage,
+                                                                                    self.stages[stage][0]))
+        lines += ["# HELP imerg_etl_file_seconds Per-file seconds of each stage of the last run.",
+                  "# TYPE imerg_etl_file_seconds gauge"]
+        for stage in sorted(self.fileTimes):
+            summary = self.GetFileSummary(stage)
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("1", "max")):
+                lines.append('imerg_etl_file_seconds{{{0},stage="{1}",quantile="{2}"}} {3:.3f}'.format(
+                             labels, stage, quantile, summary[key]))
+        lines += ["# HELP imerg_etl_count File, raster and byte counts of the last run.",
+                  "# TYPE imerg_etl_count gauge"]
+        for counter in sorted(self.counters):
+            lines.append('imerg_etl_count{{{0},counter="{1}"}} {2}'.format(labels, counter, self.counters[counter]))
+        return "\n".join(lines) + "\n"
+
+
+class RetentionReport(object):
+    """
+        How the out of date rasters removed from the mosaic dataset line up with the files deleted from the source
+        folder in one deleteOutOfDateRasters() call.  i.e.
+          'removedFromMosaic': names removed by the date query
+          'expiredInFolder':   names of the expired rasters found in the source folder
+          'removedByName':     expired names that the date query left in the mosaic (removed by name)
+          'deleted':           raster files (.tif) whose files were all deleted
+          'failures':          (file path, error) for the files that could not be deleted
+          'plan':              the IMERG_30Min_Retention.RetentionPlan of the folder
+    """
+
+    def __init__(self, removedFromMosaic, expiredInFolder, removedByName, deleted, failures, plan):
+        removed = set(removedFromMosaic)
+        expired = set(expiredInFolder)
+        self.removedFromMosaic = len(removed)
+        self.removedByName = len(removedByName)
+        self.rastersDeleted = len(deleted)
+        self.filesDeleted = sum(len(plan.expired[raster]) for raster in deleted)
+        self.failedFiles = len(failures)
+        # Rows removed from the mosaic with no file in the folder, and expired files that had no row in the mosaic
+        self.missingFiles = sorted(removed - expired)
+        self.orphanFiles = sorted(expired - removed - set(removedByName))
+        self.kept = plan.kept
+        self.unparsed = plan.unparsed
+
+    def Log(self):
+        logging.info("\tRetention: {0} rasters removed from the mosaic dataset ({1} of them by name), {2} rasters "
+                     "deleted from the folder ({3} files with their sidecars, {4} could not be deleted), {5} kept."
+                     .format(self.removedFromMosaic + self.removedByName, self.removedByName, self.rastersDeleted,
+                             self.filesDeleted, self.failedFiles, self.kept))
+        if len(self.missingFiles) > 0:
+            logging.warning("\t{0} rasters removed from the mosaic dataset had no expired file in the folder.".format(
+                            len(self.missingFiles)))
+            for name in self.missingFiles:
+                logging.debug("\t\t{0}".format(name))
+        if len(self.orphanFiles) > 0:
+            logging.info("\t{0} expired files deleted from the folder were not in the mosaic dataset.".format(
+                         len(self.orphanFiles)))
+            for name in self.orphanFiles:
+                logging.debug("\t\t{0}".format(name))
+        if len(self.unparsed) > 0:
+            logging.debug("\t{0} rasters in the folder have no IMERG date and were left alone.".format(
+                          len(self.unparsed)))
+
+
+class RasterLoader(object):
+    """
+        Loads "Early" or "Late" raster files from a temp extract workspace (folder) into the mosaic dataset.  i.e.
+          'temp_workspace': 'E:\ETLScratch\IMERG_Extract\Late',
+          'early_or_late':  'LATE'
+        LoadRaster() handles a single file (the extract/save may run in a pool of worker processes), so in "pipeline"
+        mode each file can be loaded as soon as it has been downloaded (while the download pool keeps fetching the
+        rest), and LoadFolder() handles whatever rasters are sitting in the temp workspace.  The saved rasters are
+        added to the mosaic in bulk by AddPendingRasters() and their attributes are set together by StampAttributes().
+        Finish() adds/stamps anything still pending and reports the number of files loaded.
+    """
+
+    def __init__(self, temp_workspace="", early_or_late=""):
+        # Grab some config settings that will be needed...
+        self.finalFolder = GetConfigString('final_Folder')
+        self.targetMosaic = os.path.join(GetConfigString('GDBPath'), GetConfigString('mosaicDSName'))
+        self.backend = GetMosaicBackend(self.targetMosaic)
+        self.backend.Prepare(temp_workspace)
+
+        self.tempWorkspace = temp_workspace
+        self.earlyOrLate = early_or_late
+        self.loadedCount = 0
+        self.finished = False
+        # The names of the rasters added to the mosaic by this loader (see LoadFolder())
+        self.loadedNames = set()
+
+        # Attribute values waiting to be set, keyed by raster name (minus .tif), and how many names go in each
+        # "Name IN (...)" cursor pass.
+        self.pendingAttributes = {}
+        self.attributeBatchSize = max(1, int(GetConfigValue("attribute_BatchSize", 500)))
+
+        # Rasters saved to the final folder and waiting to be added to the mosaic, as (temp raster, final raster, pixel
+        # statistics) tuples, and how many are added to the mosaic with each AddRastersToMosaicDataset call.
+        self.pendingRasters = []
+        self.addBatchSize = max(1, int(GetConfigValue("add_BatchSize", 100)))
+
+        # The extract/save of each raster is independent of the others, so it can run in a pool of worker processes
+        # ('transform_MaxWorkers').  Adding the rasters to the mosaic stays here, on the main process, because of the
+        # file GDB locking.
+        self.transformPool = None
+        self.pendingTransforms = []
+        iTransformWorkers = GetTransformPoolSize()
+
+        # We do not want the zero values and we also do not want the "NoData" value of 29999.
+        # So let's extract only the values above 0 and less than 29999.
+        self.inSQLClause = "VALUE > 0 AND VALUE < 29999"
+        # ... using either Spatial Analyst or the NumPy/GDAL engine (and its NoData value, None = pick per data type)
+        self.transformEngine = GetTransformEngine()
+
+        # The layout (tiling, compression, overviews, pixel type) of the rasters written to the final folder
+        # (arcpy is not imported when only the local mosaic backend is used, i.e. by the benchmarks)
+        self.outputProfile = GetOutputProfile()
+        if self.transformEngine == "SA" and arcpy is not None:
+            ApplyOutputProfile(self.outputProfile)
+        if iTransformWorkers > 1:
+            self.transformPool = multiprocessing.Pool(iTransformWorkers, InitTransformWorker,
+                                                      (self.outputProfile, self.transformEngine))
+        self.noDataValue = GetConfigValue("transform_NoDataValue", None)
+        if self.noDataValue is not None:
+            self.noDataValue = float(self.noDataValue)
+        # ... and work out the pixel statistics of each saved raster (see UpdateMosaicStatistics())
+        self.bPixelStats = GetConfigFlag("stats_Incremental", False)
+
+    def LoadFolder(self):
+        """
+        Load every raster found in the temp workspace.  The rasters already handed to LoadRaster() (i.e. as they were
+        downloaded in pipeline mode) are added to the mosaic first, which removes them from the temp workspace, so only
+        the rasters left over (from an earlier run, or that failed to load) are loaded again.  A raster this loader has
+        added whose extract file could not be deleted is skipped.
+        """
+        self._CollectTransforms(True)
+        self.AddPendingRasters()
+
+        # List all raster in the temp_workspace
+        rasters = self.backend.ListRasters(self.tempWorkspace)
+        for raster in rasters:
+            if os.path.basename(raster) in self.loadedNames:
+                continue
+            self.LoadRaster(raster)
+        del rasters
+
+    def LoadRaster(self, raster):
+        """
+        Extract and save a single raster (filename or full path within the temp workspace) to the final source folder
+        and queue it up to be added to the mosaic dataset.  With a transform pool, the extract/save runs in one of the
+        worker processes and the raster is queued once it is done.  The queued rasters are added in bulk by
+        AddPendingRasters() once 'add_BatchSize' of them are waiting (or when Finish() is called).
+        Returns True if the raster was saved (or handed to the transform pool).
+        """
+        rasterName = os.path.basename(raster)
+        if not os.path.isabs(raster):
+            raster = os.path.join(self.tempWorkspace, raster)
+        try:    # raster in rasters
+            logging.debug('\t\tProcessing file: {0}'.format(rasterName))
+
+            # (If this is a "Late" raster, the corresponding "Early" raster is removed from the mosaic and its physical
+            # file deleted for the whole batch at once, just before the batch is added - see AddPendingRasters().)
+
+            # Save the file to the final source folder, it is loaded into the mosaic dataset with the rest of the batch
+            transformItem = (raster, os.path.join(self.finalFolder, rasterName), self.inSQLClause,
+                             self.transformEngine, self.noDataValue, self.outputProfile, self.bPixelStats)
+            if self.transformPool is None:
+                self._TransformDone(TransformRaster(transformItem))
+            else:
+                self.pendingTransforms.append(self.transformPool.apply_async(TransformRaster, (transformItem,)))
+                self._CollectTransforms(False)
+
+        except:   # raster in rasters
+            err = capture_exception()
+            logging.warning('\t...Raster {0} not loaded into mosaic! Error = {1}'.format(rasterName, err))
+            return False
+
+        return True
+
+    def _CollectTransforms(self, bWait):
+        """
+        Pick up the results of the transforms that have finished in the worker processes (or, if bWait is True, wait
+        for all of them) and queue the saved rasters for the mosaic.
+        """
+        stillRunning = []
+        for asyncResult in self.pendingTransforms:
+            if bWait or asyncResult.ready():
+                self._TransformDone(asyncResult.get())
+            else:
+                stillRunning.append(asyncResult)
+        self.pendingTransforms = stillRunning
+
+    def _TransformDone(self, transformResult):
+        # Queue the saved raster to be added to the mosaic (and add the batch once it is full)
+        raster, finalRaster, bSuccess, err, stats, seconds = transformResult
+        # (The transform stage time is the sum of the per-file times, which may have run in parallel worker processes)
+        RecordFileTime("transform", seconds, True)
+        if not bSuccess:
+            logging.warning('\t...Raster {0} not loaded into mosaic! Error = {1}'.format(os.path.basename(raster), err))
+            return
+        self.pendingRasters.append((raster, finalRaster, stats))
+        if len(self.pendingRasters) >= self.addBatchSize:
+            self.AddPendingRasters()
+
+    def _AddRastersToMosaic(self, finalRasterList):
+        # One AddRastersToMosaicDataset call for all of the rasters in the list (see IMERG_30Min_Mosaic.py)
+        self.backend.AddRasters(finalRasterList)
+
+    def AddPendingRasters(self):
+        """
+        Add all of the queued rasters to the mosaic dataset with a single AddRastersToMosaicDataset call, then set their
+        attributes.  If the bulk add fails, fall back to adding the rasters one at a time.  "Late" rasters replace their
+        "Early" siblings, which are removed (and deleted) for the whole batch first.
+        """
+        if len(self.pendingRasters) == 0:
+            return
+
+        pendingRasters = self.pendingRasters
+        self.pendingRasters = []
+        if self.earlyOrLate == 'LATE':
+            ReplaceEarlyRasters([os.path.basename(raster) for raster, finalRaster, stats in pendingRasters],
+                                self.targetMosaic)
+        time_Add = get_NewStart_Time()
+        try:
+            self._AddRastersToMosaic([finalRaster for raster, finalRaster, stats in pendingRasters])
+            for raster, finalRaster, stats in pendingRasters:
+                self._RasterAdded(raster, stats)
+            logging.debug("\tAdded {0} rasters to the mosaic dataset in {1}".format(len(pendingRasters),
+                                                                                   timeElapsed(time_Add)))
+        except:
+            err = capture_exception()
+            logging.warning("\t...Bulk add of {0} rasters failed, adding them one at a time. Error = {1}".format(
+                            len(pendingRasters), err))
+            for raster, finalRaster, stats in pendingRasters:
+                try:
+                    self._AddRastersToMosaic([finalRaster])
+                    self._RasterAdded(raster, stats)
+                except:
+                    err = capture_exception()
+                    logging.warning('\t...Raster {0} not loaded into mosaic! Error = {1}'.format(
+                                    os.path.basename(raster), err))
+        RecordStageTime("add", time_Add)
+
+        self.StampAttributes()
+
+    def _RasterAdded(self, raster, stats=None):
+        """
+        The raster has been added to the mosaic and saved to its final source location, so remove it from the temp
+        extract folder, record its pixel statistics (if any) and work out its attributes (they are set for all of the
+        added rasters by StampAttributes()).
+        """
+        rasterName = os.path.basename(raster)
+        try:
+            self.backend.DeleteRaster(raster)
+        except:
+            err = capture_exception()
+            logging.warning("\t...Raster {0} not deleted from the extract folder. Error = {1}".format(rasterName, err))
+        self.loadedCount += 1
+        self.loadedNames.add(rasterName)
+        IncrementMetric("loaded_" + self.earlyOrLate.lower())
+        SetManifestStatus([rasterName], "loaded")
+        if stats is not None:
+            GetMosaicStatistics().AddRaster(os.path.splitext(rasterName)[0], stats)
+
+        try:    # Set Attributes
+            # Initialize and build attribute expression list
+            attrExprList = []
+
+            # Get the raster name minus the .tif extension
+            rasterName_minusExt = os.path.splitext(rasterName)[0]
+
+            # Get the start datetime stamp from the filename
+            dTimestamp = IMERG_30Min_Filename.GetStartDateTime(rasterName_minusExt)
+            attrExprList.append(dTimestamp)
+
+            dStartTime = dTimestamp - datetime.timedelta(minutes=15)
+            attrExprList.append(dStartTime)
+
+            dEndTime = dTimestamp + datetime.timedelta(minutes=15)
+            attrExprList.append(dEndTime)
+
+            attrExprList.append(self.earlyOrLate)
+
+            self.pendingAttributes[rasterName_minusExt] = attrExprList
+
+        except:  # Set Attributes
+            err = capture_exception()
+            logging.warning("\t...Raster attributes not set for raster {0}. Error = {1}".format(rasterName, err))
+
+    def StampAttributes(self):
+        """
+        Set the timestamp, start, end and Data_Age attributes on all of the rasters loaded since the last call.  The
+        rows are updated in one UpdateCursor pass per chunk of names (a "Name IN (...)" where clause) instead of one
+        cursor per raster.
+        """
+        if len(self.pendingAttributes) == 0:
+            return
+
+        time_Stamp = get_NewStart_Time()
+        names = sorted(self.pendingAttributes.keys())
+        stampedNames = set()
+        unstampedNames = []
+        for iStart in range(0, len(names), self.attributeBatchSize):
+            chunk = names[iStart:iStart + self.attributeBatchSize]
+            try:
+                stampedNames.update(self.backend.UpdateAttributes(
+                    dict((name, self.pendingAttributes[name]) for name in chunk)))
+            except:
+                err = capture_exception()
+                logging.warning("\t...Raster attributes not set for {0} rasters. Error = {1}".format(len(chunk), err))
+                unstampedNames.extend(chunk)
+
+        for name in names:
+            if name not in stampedNames and name not in unstampedNames:
+                logging.warning("\t...Raster attributes not set for raster {0}. (Not found in mosaic)".format(name))
+
+        # Keep the run's catalog of the mosaic contents in step (the rows whose attributes failed are still in there)
+        GetMosaicCatalog(self.targetMosaic).AddRasters(
+            [(name, self.pendingAttributes[name][0], self.pendingAttributes[name][3]) for name in stampedNames] +
+            [(name, None, None) for name in unstampedNames])
+
+        logging.debug("\tAttributes set for {0} rasters in {1}".format(len(stampedNames), timeElapsed(time_Stamp)))
+        RecordStageTime("attributes", time_Stamp)
+        self.pendingAttributes.clear()
+
+    def Finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.transformPool is not None:
+            try:
+                self._CollectTransforms(True)
+            finally:
+                self.transformPool.close()
+                self.transformPool.join()
+                self.transformPool = None
+        self.AddPendingRasters()
+        self.StampAttributes()
+        logging.info('{0} {1} files processed for the mosaic dataset.'.format(str(self.loadedCount), self.earlyOrLate))
+
+
 def setupArgs():
     # Setup the argparser to capture any arguments...
     parser = argparse.ArgumentParser(__file__,
@@ -94,6 +1276,17 @@ def setupArgs():
     parser.add_argument("-l", "--logging",
                         help="the logging level at which the script should report",
                         type=str, choices=['debug', 'DEBUG', 'info', 'INFO', 'warning', 'WARNING', 'error', 'ERROR'])
+    parser.add_argument("-b", "--backfill",
+                        help="instead of fetching the newest files, fetch only the half hour slots missing from the "
+                             "mosaic dataset within the days we keep rasters",
+                        action="store_true")
+    parser.add_argument("-d", "--daemon",
+                        help="keep running and poll for new files every 'daemon_PollSeconds' (instead of a single run)",
+                        action="store_true")
+    parser.add_argument("-p", "--plan", "--dry-run",
+                        help="only list the ftp folders and print what a run would download, load and delete "
+                             "(nothing is changed)",
+                        dest="plan", action="store_true")
     return parser.parse_args()
 
 
@@ -158,25 +1351,75 @@ def get_Elapsed_Time_As_String(timeInput):
     return timeElapsed(timeInput)
 
 
+def GetConfig():
+    """
+    Returns the settings dictionary, read from config.pkl the first time it is needed.
+    """
+    global myConfig
+    if myConfig is None:
+        pkl_file = open('config.pkl', 'rb')
+        myConfig = pickle.load(pkl_file)
+        pkl_file.close()
+    return myConfig
+
+
+def ImportArcpy():
+    """
+    Returns the arcpy module, importing it the first time it is needed.
+    """
+    global arcpy
+    if arcpy is None:
+        import arcpy
+    return arcpy
+
+
+def ImportTransform():
+    """
+    Returns the IMERG_30Min_Transform module, importing it the first time it is needed.
+    """
+    global IMERG_30Min_Transform
+    if IMERG_30Min_Transform is None:
+        import IMERG_30Min_Transform
+    return IMERG_30Min_Transform
+
+
 def GetConfigString(variable):
     try:
-        global myConfig
-        return myConfig[variable]
+        return GetConfig()[variable]
     except:
         logging.error("### ERROR ###: Config variable NOT FOUND: {0}".format(variable))
         return ""
 
 
+def GetConfigValue(variable, defaultValue):
+    """
+    Same as GetConfigString(), but returns the default value passed in (without logging an error) when the setting
+    is not in the config file.  Used for the optional tuning settings so an older config.pkl keeps working.
+    """
+    config = GetConfig()
+    if variable in config:
+        return config[variable]
+    return defaultValue
+
+
+def GetConfigFlag(variable, defaultValue):
+    """
+    Returns an optional True/False setting from the config file.  The value may be stored as a bool or as a string
+    such as 'True', 'Yes' or '1'.
+    """
+    value = GetConfigValue(variable, defaultValue)
+    if isinstance(value, basestring):
+        return value.strip().lower() in ("true", "yes", "y", "1")
+    return bool(value)
+
+
 def GetRasterDatasetCount(mosaicDS):
     """
-    Creates a memory table view of the raster mosaic dataset and retrieves/returns the record count.
+    Returns the record count of the raster mosaic dataset (from the run's catalog of the mosaic contents).
     Returns 0 if error.
     """
     try:
-        arcpy.MakeTableView_management(mosaicDS, "RasterView")
-        theCount = int(arcpy.GetCount_management("RasterView").getOutput(0))
-        arcpy.Delete_management("RasterView")
-        return theCount
+        return GetMosaicCatalog(mosaicDS).GetCount()
     except:
         err = capture_exception()
         logging.error(err)
@@ -268,6 +1511,7 @@ def UpdateServicesJsonFile(jFile, serviceName, odateUpdated):
         logging.error(err)
 
 
+# Not currently called (IMERG filenames are parsed by IMERG_30Min_Filename.py), but keep for future use...
 def Get_StartDateTime_FromString(theString, regExp_Pattern, source_dateFormat):
     """
     # Search a string (or filename) for a date by using the regular expression pattern passed in, then use the
@@ -299,27 +1543,13 @@ def GetLatest_EarlyOrLateDate_fromMosaicDataset(mosaicDS, early_or_late):
     datetime object, not a string! If there is an error/exception, None is returned.
     """
     try:
-        TimestampField = GetConfigString("rasterTimeProperty")
-        DataAgeField = GetConfigString("rasterDataAgeProperty")
         GDBDateFormat = GetConfigString("GDB_DateFormat")
 
-        # Query for the timestamp values from the GDB.
-        # SQLWhere = "NAME IS NOT NULL AND " + TimestampField + " IS NOT NULL AND " + \
-        #            DataAgeField + " = \'" + early_or_late + "\'"
-        SQLWhere = TimestampField + " IS NOT NULL AND " + \
-                   DataAgeField + " = \'" + early_or_late + "\'"
-        # Sort most recent date first (descending) so we can just grab the first row then break out of the for loop!
-        # Also, only request the Timestamp field as that is all we need and it should be faster.
-        # rows = arcpy.SearchCursor(mosaicDS, SQLWhere, '', fields="Name; " + TimestampField,
-        #                           sort_fields=TimestampField + " D")
-        rows = arcpy.SearchCursor(mosaicDS, SQLWhere, '', fields=TimestampField,
-                                  sort_fields=TimestampField + " D")
-
-        theDate = None
-        for r in rows:
-            theDate = r.getValue(TimestampField)
+        # The latest timestamp of the "early" or "late" rows, from the run's catalog of the mosaic contents (read
+        # from the GDB once, and kept up to date as rasters are added/removed).
+        theDate = GetMosaicCatalog(mosaicDS).GetLatest(early_or_late)
+        if theDate is not None:
             theDate = datetime.datetime.strptime(theDate.strftime(GDBDateFormat), GDBDateFormat)
-            break
 
         if theDate is None:
             # Set a default date
@@ -347,6 +1577,10 @@ def deleteOutOfDateRasters(mymosaicDS, sourceFolder):
     The "number of days to keep a raster" is read from the configuration file. A date query is used to remove
     rasters from the GDB, and the start date string from the source raster filenames is used to compare against
     the calculated keep date.
+    The files to delete are planned in one pass over the source folder (see IMERG_30Min_Retention.PlanRetention())
+    and deleted, with their sidecar files, by plain unlinks (see GetDeleteWorkers()).  Expired files whose
+    rows are still in the mosaic dataset (i.e. a row with no timestamp) are removed from it by name first, so no row is
+    left pointing at a deleted file.  Returns the RetentionReport of the run (or None on an error).
     """
     try:
 
@@ -355,53 +1589,63 @@ def deleteOutOfDateRasters(mymosaicDS, sourceFolder):
 
         # Calculate the latest "keep" date
         oKeepDate = datetime.datetime.now() - datetime.timedelta(days=numDays)
-        # Format the keep date into %Y-%m-%d format to get rid of the time portion!!!
-        oFormattedKeepDate = datetime.datetime.strptime(oKeepDate.strftime('%Y-%m-%d'), '%Y-%m-%d')
+        # Only the date portion of the keep date is used (no time portion!!!)
+        oFormattedKeepDate = oKeepDate.date()
 
         # Build the query string with the date - minus the time portion
         query = "timestamp < date '" + oKeepDate.strftime('%Y-%m-%d') + "'"
 
-        # Remove rasters based on date query
-        logging.info('Deleting out of date rasters from Mosaic DS where: ' + query)
-        arcpy.RemoveRastersFromMosaicDataset_management(mymosaicDS, query,
-                                                        "UPDATE_BOUNDARY", "MARK_OVERVIEW_ITEMS",
-                                                        "DELETE_OVERVIEW_IMAGES")
-
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
-
-        # Grab all raster files from the source folder.
-        # The resulting list includes the entire path and file name.
-        files = glob.glob(sourceFolder + "\*.tif")
-        # Build a list of the files to delete
-        rastersToDelete = []
-        for rfile in files:
-            # Get the name of the raster file from the entire path
-            theName = rfile.rsplit('\\', 1)[-1]
-
-            # Get the start date string from the file name.
-            oFileDate = Get_StartDateTime_FromString(rfile, RegEx_StartDatePattern, Filename_StartDateFormat)
-            if oFileDate is not None:
-
-                # Convert ofileDate into %Y-%m-%d format before doing the compare!!!
-                oFormattedFileDate = datetime.datetime.strptime(oFileDate.strftime('%Y-%m-%d'), '%Y-%m-%d')
-
-                if oFormattedFileDate < oFormattedKeepDate:
-                    # ... add the file to the delete list.
-                    rastersToDelete.append(theName)
-
-        # Delete the rasters files that are stored in the list.
-        arcpy.env.workspace = sourceFolder
-        for oldraster in rastersToDelete:
-            arcpy.Delete_management(oldraster)
-
-        # Report the number of files that got deleted...
-        logging.info("Deleted {0} physical raster files!".format(str(len(rastersToDelete))))
-        del rastersToDelete[:]
+        # Remove rasters based on date query (only if the catalog of the mosaic contents says there are any to remove)
+        catalog = GetMosaicCatalog(mymosaicDS)
+        backend = GetMosaicBackend(mymosaicDS)
+        outOfDateNames = catalog.GetNamesBefore(oFormattedKeepDate)
+        if len(outOfDateNames) > 0:
+            logging.info('Deleting out of date rasters from Mosaic DS where: ' + query)
+            backend.RemoveRastersBefore(oFormattedKeepDate)
+            catalog.RemoveRasters(outOfDateNames)
+        else:
+            logging.info('No out of date rasters in the Mosaic DS (timestamp before {0}).'.format(oFormattedKeepDate))
+
+        # Plan the files to delete: the rasters in the source folder whose start date (from the name) is before the
+        # keep date, along with their sidecar files
+        plan = IMERG_30Min_Retention.PlanRetention(sourceFolder, oFormattedKeepDate)
+        expiredNames = [os.path.splitext(raster)[0] for raster in plan.expired]
+
+        # Expired files that are still in the mosaic dataset are removed from it before their files are deleted
+        stillInMosaic = [name for name in expiredNames if catalog.Contains(name)]
+        if len(stillInMosaic) > 0:
+            logging.info("Removing {0} out of date rasters (by name) that the date query left in the Mosaic DS.".format(
+                         len(stillInMosaic)))
+            backend.RemoveRasters(stillInMosaic)
+            catalog.RemoveRasters(stillInMosaic)
+
+        # Delete the raster files (and their sidecars)
+        deleted, failures = IMERG_30Min_Retention.DeleteRasters(sourceFolder, plan.expired, GetDeleteWorkers())
+        for rasterFile, e in failures:
+            logging.warning("\t...Could not delete file {0}. Error = {1}".format(rasterFile, e))
+
+        # Report the number of files that got deleted, and how the mosaic and folder deletions line up
+        logging.info("Deleted {0} physical raster files!".format(str(len(deleted))))
+        report = RetentionReport(outOfDateNames, expiredNames, stillInMosaic, deleted, failures, plan)
+        report.Log()
+        IncrementMetric("retention_files_deleted", report.filesDeleted)
+        return report
 
     except:
         err = capture_exception()
         logging.error(err)
+        return None
+
+
+def GetDeleteWorkers():
+    """
+    Returns the number of threads used to delete raster files, read from the config file.  Defaults to 1 (the files
+    are deleted one at a time) and is never less than 1.
+    """
+    try:
+        return max(1, int(GetConfigValue("retention_DeleteWorkers", 1)))
+    except:
+        return 1
 
 
 #  --- NOTE! NOTE! NOTE! ---
@@ -410,7 +1654,7 @@ def deleteOutOfDateRasters(mymosaicDS, sourceFolder):
 # For this reason, we have implemented another "Proxy" function further below that uses URLLIB to retrieve the files
 # from the proxy location vs. this function that uses FTPLIB to retrieve the files from the ftp location.
 #  --- NOTE! NOTE! NOTE! ---
-def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime):
+def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime, loadFunction=None):
     """
     Connects to the FTP site (base folder) and based on today's date and the last LATE GDB Date passed in, processes
     through the FTP Late folder hierarchy (year and month) and retrieves a list of filenames from each folder.
@@ -426,22 +1670,25 @@ def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime):
     to keep/download by omitting any files that are dated prior to the last LATE Date passed in.  Also, we only want
     files that contain the letter "L" in position 7 of the name, and end in ".30min.tif".
     Once the list of files for each FTP folder is trimmed, the files are then downloaded to the proper extract location.
+    If a loadFunction is passed in ("pipeline" mode), each file is handed to it as soon as it has been downloaded.
+    If a folder can not be listed (see ListFolder()), the folders after it are left for the next run and True is still
+    returned, so the files downloaded up to that point are loaded.
     """
+    ftpPool = None
+    downloadPool = None
     try:
-        ftp_Host = GetConfigString("ftp_host")
         ftp_baseLateFolder = GetConfigString("ftp_baseLateFolder")
-        ftp_UserName = GetConfigString("ftp_user")
-        ftp_UserPass = GetConfigString("ftp_pswrd")
 
         # Grab a few settings we might need later.
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
         targetFolder = GetConfigString("extract_LateFolder")
 
-        bConnectionCreated = False
-        ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
-        # time.sleep(1)    # Don't believe this is needed...
-        bConnectionCreated = True
+        # A small pool of logged in FTP sessions (reconnected/retried if the server drops them) lets us RETR several
+        # files at once. Each download thread borrows one session at a time.
+        ftpPool = GetFTPSessionPool()
+        downloadPool = ThreadPool(ftpPool.size)
+        downloadFunction = functools.partial(DownloadFile_FromFTP, ftpPool)
+        dictStats = {"files": 0, "bytes": 0, "failed": 0}
+        time_Downloads = get_NewStart_Time()
 
         # Get the year and month from each date passed in
         oTodaysYear = oTodaysDateTime.year
@@ -451,6 +1698,7 @@ def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime):
 
         # Starting with the last Late Date passed in, loop through the years and months and get all of the
         # files from the corresponding FTP folders
+        bListingFailed = False
         while oFolderYear <= oTodaysYear:
             while oFolderMonth <= oTodaysMonth:
 
@@ -458,42 +1706,36 @@ def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime):
                 sYear = str(oFolderYear)
                 sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
                 ftpFolder = ftp_baseLateFolder + "/" + sYear + "/" + sMonth
-                ftp_Connection.cwd(ftpFolder)
 
-                # Initialize a list for names of ALL files that are in the FTP folder
-                tmpList = []
-                # Initialize a placeholder list for names of files that we ACTUALLY process/download
-                actualList = []
+                # Initialize a list of (ftp file, target) tuples for the download pool
+                downloadList = []
 
                 # Grab the list of ALL filenames from the current FTP folder...
-                line = ftp_Connection.retrlines("NLST", tmpList.append)
+                # If the folder can not be listed, stop here: the files downloaded so far are still loaded, and
+                # the next run carries on from them (going on to a later folder would leave a gap behind them).
+                tmpList = ListFolder(lambda: ftpPool.ListFiles(ftpFolder), ftpFolder)
+                if tmpList is None:
+                    bListingFailed = True
+                    break
 
-                # Loop through each item in the tmpList and verify if we want to keep/download it!
+                # Check the items in the tmpList and keep the ones we want to download (see SelectFilesToDownload()).
                 # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
                 # To keep a file, it must:
                 #   - contain an "L" at position 7 in the filename.
                 #   - be the proper type of file (contain the string ".30min.tif")
                 #   - have a start date/time that is greater than the oLastLateDateTime passed in from the GDB
-                for ftpFile in tmpList:
-                    # If it is a 30Min tif file
-                    if ".30min.tif" in ftpFile:
-                        # If the item is a "Late" entry
-                        if ftpFile[7] == 'L':
-                            # Ex. filename format: 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif
-                            # The start time (represented by "20150802-S083000") is used as the timestamp for each file.
-                            # If the item's timestamp is later than the oLastLateDateTime, we want to keep it.
-                            fileDate = Get_StartDateTime_FromString(ftpFile, RegEx_StartDatePattern, Filename_StartDateFormat)
-                            if (fileDate is not None) and (fileDate > oLastLateDateTime):
-                                # Download the ftpFile to the extract_LateFolder
-
-                                # Keep track of the files that we actually process...
-                                actualList.append(ftpFile)
-
-                                targetExtractFile = os.path.join(targetFolder, ftpFile)
-                                with open(targetExtractFile, "wb") as f:
-
-                                    ftp_Connection.retrbinary("RETR %s" % ftpFile, f.write)  # fully qualify ftpFile?
-                                    # time.sleep(1)  # Don't believe this is needed...
+                #   - have a start date/time that is not greater than the oTodaysDateTime passed in (the same
+                #     selection as the proxy, see ProcessLateFiles_FromProxy())
+                actualList = SelectFilesToDownload(ftpFolder, tmpList, "L", oLastLateDateTime, oTodaysDateTime)
+                for ftpFile in actualList:
+                    # Download the ftpFile to the extract_LateFolder
+                    targetExtractFile = os.path.join(targetFolder, ftpFile)
+                    downloadList.append((ftpFolder + "/" + ftpFile, targetExtractFile))
+
+                # Download the selected files from this folder concurrently (failed files are removed by the pool)
+                downloadedList = DownloadFiles(downloadPool, downloadFunction, downloadList, dictStats, loadFunction)
+                SetManifestStatus(downloadedList, "downloaded")
+                del downloadList[:]
 
                 # Delete the temp list of filenames before moving to a new FTP folder
                 del tmpList[:]
@@ -508,28 +1750,465 @@ def ProcessLateFiles(oTodaysDateTime, oLastLateDateTime):
                 # End of "month" while loop - Increment the month
                 oFolderMonth = oFolderMonth + 1
 
+            if bListingFailed:
+                break
+
             # End of "year" while loop - Increment the year
             oFolderYear = oFolderYear + 1
             # Also need to reset the month to January...
             oFolderMonth = 1
 
         # Disconnect from ftp
-        ftp_Connection.close()
+        downloadPool.close()
+        downloadPool.join()
+        ftpPool.close()
+        LogDownloadThroughput("LATE", dictStats, time_Downloads)
+        logging.debug("FTP sessions opened: {0}, reconnects: {1}".format(ftpPool.sessionsOpened, ftpPool.reconnects))
         return True
 
     except:
         err = capture_exception()
         logging.error(err)
-        if bConnectionCreated:
-            ftp_Connection.close()
+        if downloadPool is not None:
+            downloadPool.terminate()
+        if ftpPool is not None:
+            ftpPool.close()
         return False
 
 
+def GetProxySession():
+    """
+    Returns the shared ProxySession used for all proxy directory listings and file fetches, creating it on first use.
+    The proxy URL and the per-request timeout (seconds) are read from the config file.
+    """
+    global myProxySession
+    if myProxySession is None:
+        myProxySession = ProxySession(GetConfigValue("proxy_URL", "https://proxy.servirglobal.net/ProxyFTP.aspx"),
+                                      float(GetConfigValue("proxy_Timeout", 60)),
+                                      list_timeout=float(GetConfigValue("proxy_ListTimeout", 0)) or None)
+    return myProxySession
+
+
+def ReportProxySession():
+    """
+    Report the proxy connection counters (since the session was opened) and the fetch retries of the run.
+    """
+    if myProxySession is not None:
+        logging.info("\t=== PERFORMANCE ===>: Proxy requests: {0}, connections opened: {1}, connections reused: {2}"
+                     .format(myProxySession.requestCount, myProxySession.connectionsOpened,
+                             myProxySession.connectionsReused))
+    if myFetchPolicy is not None:
+        logging.info("\t=== PERFORMANCE ===>: Fetch retries: {0} (of a budget of {1}), folders not listed: {2}, "
+                     "circuits opened: {3}".format(myFetchPolicy.retriesUsed, myFetchPolicy.budget,
+                                                   myFetchPolicy.listingsFailed, myFetchPolicy.circuitsOpened))
+
+
+def CloseProxySession():
+    """
+    Report the proxy connection counters and close any idle keep-alive connections.
+    """
+    global myProxySession
+    ReportProxySession()
+    if myProxySession is not None:
+        myProxySession.close()
+        myProxySession = None
+
+
+def GetFetchPolicy():
+    """
+    Returns the shared FetchPolicy (created on first use from the 'fetch_*' settings in the config file).  It is kept
+    for the life of the process, so the circuits of the hosts carry over from one daemon cycle to the next.
+    """
+    global myFetchPolicy
+    if myFetchPolicy is None:
+        myFetchPolicy = FetchPolicy(int(GetConfigValue("fetch_Retries", 3)),
+                                    float(GetConfigValue("fetch_BackoffSeconds", 1)),
+                                    float(GetConfigValue("fetch_MaxBackoffSeconds", 30)),
+                                    int(GetConfigValue("fetch_RetryBudget", 20)),
+                                    int(GetConfigValue("fetch_BreakerFailures", 5)),
+                                    float(GetConfigValue("fetch_BreakerSeconds", 120)))
+    return myFetchPolicy
+
+
+def ListFolder(listFunction, ftpFolder):
+    """
+    Returns listFunction() - the list of ALL filenames in the FTP folder passed in - or None if the folder could not be
+    listed.  The listing has already been retried (see FetchPolicy), so the error is reported here instead of raised:
+    the caller can stop at this folder and still load the files downloaded so far, instead of losing the whole run.
+    """
+    try:
+        return listFunction()
+    except:
+        err = capture_exception()
+        logging.warning("Could not list folder: {0}. Error = {1}".format(ftpFolder, err))
+        GetFetchPolicy().RecordFailedListing()
+        IncrementMetric("list_failed")
+        return None
+
+
+def GetListingManifest():
+    """
+    Returns the shared ListingManifest (opened on first use), or None if the manifest is not in use - it is off unless
+    'manifest_File' is set in the config file.
+    """
+    global myListingManifest
+    if myListingManifest is None:
+        dbFile = GetConfigValue("manifest_File", "")
+        if len(dbFile) == 0:
+            return None
+        myListingManifest = ListingManifest(dbFile)
+    return myListingManifest
+
+
+def SetManifestStatus(names, status):
+    """
+    Record the new status ('downloaded' or 'loaded') for the filenames passed in, if the manifest is in use.
+    """
+    try:
+        manifest = GetListingManifest()
+        if manifest is not None and len(names) > 0:
+            manifest.SetStatus(names, status)
+    except:
+        err = capture_exception()
+        logging.warning("Listing manifest not updated. Error = {0}".format(err))
+
+
+def CloseListingManifest():
+    """
+    Prune entries for folders that are no longer listed (older than the days we keep rasters, plus two months) and
+    close the manifest.
+    """
+    global myListingManifest
+    if myListingManifest is not None:
+        try:
+            numDays = int(GetConfigString("DaysToKeepRasters")) + 62
+            iPruned = myListingManifest.Prune(datetime.datetime.now() - datetime.timedelta(days=numDays))
+            logging.debug("Pruned {0} old entries from the listing manifest.".format(iPruned))
+        except:
+            err = capture_exception()
+            logging.warning("Listing manifest not pruned. Error = {0}".format(err))
+        myListingManifest.close()
+        myListingManifest = None
+
+
+def SelectFilesToDownload(ftpFolder, tmpList, product, oAfterDateTime, oUpToDateTime=None):
+    """
+    From the list of ALL filenames in the FTP folder passed in, return the names we want to download.  To keep a file,
+    it must:
+      - contain the product letter passed in ("E" or "L") at position 7 in the filename.
+      - be the proper type of file (contain the string ".30min.tif")
+      - have a start date/time that is greater than the oAfterDateTime passed in (and, if oUpToDateTime is passed in,
+        not greater than oUpToDateTime).
+    When the listing manifest is in use, only the names that are new since the last listing of this folder are parsed;
+    the rest of the selection is answered from the manifest (which also picks up earlier failed downloads).
+    """
+    manifest = GetListingManifest()
+    if manifest is not None:
+        namesToCheck = manifest.GetNewNames(ftpFolder, tmpList)
+        logging.debug("{0} of {1} names in folder {2} are new.".format(len(namesToCheck), len(tmpList), ftpFolder))
+    else:
+        namesToCheck = tmpList
+
+    records, selectedList = ParseListedNames(namesToCheck, product, oAfterDateTime, oUpToDateTime)
+    if manifest is not None:
+        manifest.AddListed(ftpFolder, records)
+        selectedList = manifest.GetCandidates(ftpFolder, product, oAfterDateTime, oUpToDateTime)
+
+    return selectedList
+
+
+def ParseListedNames(names, product, oAfterDateTime, oUpToDateTime=None):
+    """
+    Returns a tuple of (a (name, product or None, start datetime or None) record for each of the names passed in, the
+    names selected as described in SelectFilesToDownload()).
+    """
+    records = []
+    selectedList = []
+    for ftpFile in names:
+        sProduct = None
+        fileDate = None
+        # If it is a 30Min tif file
+        if ".30min.tif" in ftpFile:
+            # Ex. filename format: 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif
+            # The start time (represented by "20150802-S083000") is used as the timestamp for each file.
+            oRecord = IMERG_30Min_Filename.ParseFilename(ftpFile)
+            if oRecord is not None:
+                sProduct = oRecord.product
+                fileDate = oRecord.start
+        records.append((ftpFile, sProduct, fileDate))
+
+        # If the item is the right product and its timestamp is later than oAfterDateTime, we want to keep it.
+        if sProduct == product and fileDate > oAfterDateTime and (oUpToDateTime is None or fileDate <= oUpToDateTime):
+            selectedList.append(ftpFile)
+    return records, selectedList
+
+
+def GetFTPSessionPool():
+    """
+    Returns a new FTPSessionPool for the PPS ftp site using the host/credentials from the config file.  The number of
+    sessions ('ftp_MaxSessions', default 2) is capped at FTP_MAX_SESSIONS by the pool itself.
+    """
+    return FTPSessionPool(GetConfigString("ftp_host"), GetConfigString("ftp_user"), GetConfigString("ftp_pswrd"),
+                          int(GetConfigValue("ftp_MaxSessions", 2)), int(GetConfigValue("ftp_Retries", 3)),
+                          float(GetConfigValue("ftp_Timeout", 60)), int(GetConfigValue("ftp_Port", 21)))
+
+
+def GetDownloadPoolSize():
+    """
+    Returns the number of concurrent proxy downloads to run, read from the config file.  Defaults to 4 and is
+    never less than 1 (1 = the old "one file after another" behavior).
+    """
+    try:
+        return max(1, int(GetConfigValue("download_MaxWorkers", 4)))
+    except:
+        return 4
+
+
+def GetFileChecksum(targetFile):
+    """
+    Returns the base64 encoded MD5 digest of the file passed in (the form of an HTTP Content-MD5 header).
+    """
+    md5 = hashlib.md5()
+    with open(targetFile, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest())
+
+
+def VerifyDownload(targetFile, iRemoteSize, sChecksum):
+    """
+    Raises IOError if the downloaded file passed in is not complete: its size must match the size of the remote file
+    (when the server gave it), its MD5 digest must match the checksum (when the server gave one), and it must start
+    like a TIFF (which also catches an HTML error page sent back as a file).
+    """
+    iSize = os.path.getsize(targetFile)
+    if iSize == 0 or (iRemoteSize is not None and iSize != iRemoteSize):
+        raise IOError("Download incomplete, {0} of {1} bytes: {2}".format(iSize, iRemoteSize, targetFile))
+    if sChecksum and GetFileChecksum(targetFile) != sChecksum:
+        raise IOError("Download checksum does not match: {0}".format(targetFile))
+    with open(targetFile, "rb") as f:
+        header = f.read(4)
+    if targetFile.lower().endswith(".tif") and header not in ("II*\x00", "MM\x00*"):
+        raise IOError("Download is not a TIFF file: {0}".format(targetFile))
+
+
+def RetrieveVerifiedFile(retrieveFunction, targetExtractFile, host):
+    """
+    Run retrieveFunction(iOffset) (i.e. ProxySession.RetrieveFile() for one file from the host passed in) until the
+    target file is complete, then verify it.  A transfer that breaks off, or ends short of the remote file size, is
+    resumed from the bytes already written (HTTP Range / ftp REST) instead of starting over - up to
+    'download_ResumeAttempts' attempts in all, and only as far as the FetchPolicy allows.  Returns a tuple of (size,
+    Last-Modified or None, checksum or None) of the verified file, raises IOError if it could not be completed.
+    """
+    fetchPolicy = GetFetchPolicy()
+    iAttempts = max(1, int(GetConfigValue("download_ResumeAttempts", 3)))
+    iOffset = 0
+    for attempt in range(1, iAttempts + 1):
+        fetchPolicy.Check(host)
+        try:
+            iSize, iRemoteSize, sModified, sChecksum = retrieveFunction(iOffset)
+        except Exception, e:
+            if not fetchPolicy.OnError(host, e, attempt, iAttempts):
+                raise
+            iOffset = os.path.getsize(targetExtractFile) if os.path.exists(targetExtractFile) else 0
+            logging.debug("\t\tDownload failed at {0} bytes, resuming (attempt {1} of {2}): {3}".format(
+                          iOffset, attempt + 1, iAttempts, os.path.basename(targetExtractFile)))
+            IncrementMetric("download_resumed")
+            continue
+
+        fetchPolicy.RecordSuccess(host)
+        if iRemoteSize is not None and iSize < iRemoteSize and attempt < iAttempts:
+            iOffset = iSize
+            logging.debug("\t\tDownload ended at {0} of {1} bytes, resuming (attempt {2} of {3}): {4}".format(
+                          iSize, iRemoteSize, attempt + 1, iAttempts, os.path.basename(targetExtractFile)))
+            IncrementMetric("download_resumed")
+            continue
+
+        VerifyDownload(targetExtractFile, iRemoteSize, sChecksum)
+        return iSize, sModified, sChecksum
+
+
+def DownloadFile_FromProxy(downloadItem):
+    """
+    Retrieve a single file from the proxy site.  This runs on one of the download pool threads, so it does not
+    raise - it returns a tuple of (targetExtractFile, bytes downloaded, True/False success, Last-Modified, checksum)
+    instead.  downloadItem is a (sourceExtractFile, targetExtractFile) tuple.  The download is verified (and resumed
+    if it breaks off) by RetrieveVerifiedFile().  If the download fails, the target file is removed so a partial/empty
+    file is never left behind in the extract folder.
+    """
+    sourceExtractFile, targetExtractFile = downloadItem
+    try:
+        timeStart = time.time()
+        proxySession = GetProxySession()
+        iBytes, sModified, sChecksum = RetrieveVerifiedFile(
+            lambda iOffset: proxySession.RetrieveFile(sourceExtractFile, targetExtractFile, iOffset), targetExtractFile,
+            proxySession.host)
+        os.chmod(targetExtractFile, 0777)
+        RecordFileTime("download", time.time() - timeStart)
+        return targetExtractFile, iBytes, True, sModified, sChecksum
+    except:
+        logging.info("Error retrieving file from proxy: {0}".format(sourceExtractFile))
+        try:
+            if os.path.exists(targetExtractFile):
+                os.remove(targetExtractFile)
+        except:
+            err = capture_exception()
+            logging.error(err)
+        return targetExtractFile, 0, False, None, None
+
+
+def DownloadFile_FromFTP(ftpPool, downloadItem):
+    """
+    Retrieve a single file over one of the pooled FTP sessions.  Same contract as DownloadFile_FromProxy(): it
+    does not raise, it returns a tuple of (targetExtractFile, bytes downloaded, True/False success, None, None) and
+    removes the target file on failure.  downloadItem is a (fully qualified ftp file, targetExtractFile) tuple.
+    """
+    ftpFile, targetExtractFile = downloadItem
+    try:
+        timeStart = time.time()
+        iBytes, sModified, sChecksum = RetrieveVerifiedFile(
+            lambda iOffset: ftpPool.RetrieveFile(ftpFile, targetExtractFile, iOffset), targetExtractFile, ftpPool.host)
+        RecordFileTime("download", time.time() - timeStart)
+        return targetExtractFile, iBytes, True, sModified, sChecksum
+    except:
+        logging.info("Error retrieving file from ftp: {0}".format(ftpFile))
+        try:
+            if os.path.exists(targetExtractFile):
+                os.remove(targetExtractFile)
+        except:
+            err = capture_exception()
+            logging.error(err)
+        return targetExtractFile, 0, False, None, None
+
+
+def SkipVerifiedDownloads(downloadList):
+    """
+    Check the list of (source, targetExtractFile) tuples passed in against the download cache (see ListingManifest) and
+    returns a tuple of (the items that still need to be downloaded, the target files already in the extract folder).
+    A file is not fetched again if its download was verified before and either:
+      - it is still in the extract folder with the verified size (it is treated as downloaded), or
+      - it is already in final_Folder and in the mosaic dataset (it has been loaded - there is nothing left to do).
+    A file that is in final_Folder but not in the mosaic dataset (i.e. its add failed) is downloaded again, so it goes
+    through the load again.  Without the listing manifest there is no cache, and everything is downloaded.
+    """
+    manifest = GetListingManifest()
+    if manifest is None:
+        return downloadList, []
+
+    verified = manifest.GetVerified(os.path.basename(target) for source, target in downloadList)
+    if len(verified) == 0:
+        return downloadList, []
+
+    finalFolder = GetConfigString("final_Folder")
+    catalog = None
+    toDownload = []
+    alreadyExtracted = []
+    for source, targetExtractFile in downloadList:
+        name = os.path.basename(targetExtractFile)
+        record = verified.get(name)
+        if record is not None and os.path.isfile(targetExtractFile) and os.path.getsize(targetExtractFile) == record[0]:
+            alreadyExtracted.append(targetExtractFile)
+            continue
+        if record is not None and os.path.isfile(os.path.join(finalFolder, name)):
+            if catalog is None:
+                catalog = GetMosaicCatalog(os.path.join(GetConfigString("GDBPath"), GetConfigString("mosaicDSName")))
+            if catalog.Contains(os.path.splitext(name)[0]):
+                logging.debug("\t\tAlready loaded, not downloaded again: {0}".format(name))
+                IncrementMetric("download_skipped")
+                continue
+            logging.debug("\t\tIn final_Folder but not in the mosaic dataset, downloading again: {0}".format(name))
+        toDownload.append((source, targetExtractFile))
+    return toDownload, alreadyExtracted
+
+
+def RecordVerifiedDownloads(records):
+    """
+    Add the (name, size, Last-Modified, checksum) records of verified downloads to the download cache, if the manifest
+    is in use.
+    """
+    try:
+        manifest = GetListingManifest()
+        if manifest is not None and len(records) > 0:
+            manifest.AddVerified(records)
+    except:
+        err = capture_exception()
+        logging.warning("Download cache not updated. Error = {0}".format(err))
+
+
+def DownloadFiles(downloadPool, downloadFunction, downloadList, dictStats, loadFunction=None):
+    """
+    Download the list of (source, targetExtractFile) tuples passed in by running downloadFunction (i.e.
+    DownloadFile_FromProxy) for each of them on the download pool (threads).  Files already downloaded and verified
+    by an earlier run are not fetched again (see SkipVerifiedDownloads()), and each new verified download is added to
+    the download cache.
+    The dictStats dictionary passed in is updated with the number of files/bytes downloaded and failed so the caller
+    can report the aggregate throughput.  Returns the list of filenames that were successfully downloaded.
+
+    If a loadFunction is passed in ("pipeline" mode), each file is handed to it (on this, the main thread) as soon as
+    it has finished downloading and passed its checks, while the pool keeps downloading the rest of the list.
+    """
+    downloadedList = []
+    if len(downloadList) == 0:
+        return downloadedList
+
+    time_Downloads = get_NewStart_Time()
+    downloadList, alreadyExtracted = SkipVerifiedDownloads(downloadList)
+    for targetExtractFile in alreadyExtracted:
+        logging.debug("\t\tAlready downloaded and verified: {0}".format(os.path.basename(targetExtractFile)))
+        downloadedList.append(os.path.basename(targetExtractFile))
+        IncrementMetric("download_skipped")
+        if loadFunction is not None:
+            loadFunction(targetExtractFile)
+
+    if loadFunction is None:
+        results = downloadPool.map(downloadFunction, downloadList)
+    else:
+        results = downloadPool.imap_unordered(downloadFunction, downloadList)
+
+    verifiedRecords = []
+    for targetExtractFile, iBytes, bSuccess, sModified, sChecksum in results:
+        if bSuccess and iBytes == 0:
+            # An empty file is not a raster - treat it as a failed download.
+            logging.info("Empty file downloaded, removing: {0}".format(targetExtractFile))
+            os.remove(targetExtractFile)
+            bSuccess = False
+
+        if bSuccess:
+            downloadedList.append(os.path.basename(targetExtractFile))
+            verifiedRecords.append((os.path.basename(targetExtractFile), iBytes, sModified, sChecksum))
+            dictStats["files"] += 1
+            dictStats["bytes"] += iBytes
+            IncrementMetric("download_files")
+            IncrementMetric("download_bytes", iBytes)
+            if loadFunction is not None:
+                loadFunction(targetExtractFile)
+        else:
+            dictStats["failed"] += 1
+            IncrementMetric("download_failed")
+
+    RecordVerifiedDownloads(verifiedRecords)
+    # (In pipeline mode this includes the loads done while the pool kept downloading)
+    RecordStageTime("download", time_Downloads)
+    return downloadedList
+
+
+def LogDownloadThroughput(early_or_late, dictStats, timeStart):
+    """
+    Report the aggregate download throughput (files/s and MB/s) for all of the files downloaded since timeStart.
+    """
+    seconds = max(time.time() - timeStart, 0.001)
+    megaBytes = dictStats["bytes"] / (1024.0 * 1024.0)
+    logging.info("\t=== PERFORMANCE ===>: {0} downloads: {1} files ({2:.2f} MB, {3} failed) in {4} "
+                 "- {5:.2f} files/s, {6:.2f} MB/s".format(early_or_late, dictStats["files"], megaBytes,
+                                                         dictStats["failed"], timeElapsed(timeStart),
+                                                         dictStats["files"] / seconds, megaBytes / seconds))
+
+
 #  --- NOTE! NOTE! NOTE! ---
 # This function is a replacement for ProcessLateFiles() above. We cannot rely on FTP functionality, so we
 # are using a proxy server that provides access to the needed ftp files via URLLIB functionality.
 #  --- NOTE! NOTE! NOTE! ---
-def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
+def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime, loadFunction=None):
     """
     Connects to the Proxy site (via URLLIB) and based on today's date and the last LATE GDB Date passed in, processes
     through the FTP Late folder hierarchy (year and month) and retrieves a list of filenames from each folder.
@@ -545,14 +2224,21 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
     to keep/download by omitting any files that are dated prior to the last LATE Date passed in.  Also, we only want
     files that contain the letter "L" in position 7 of the name, and end in ".30min.tif".
     Once the list of files for each FTP folder is trimmed, the files are then downloaded to the proper extract location.
+    If a loadFunction is passed in ("pipeline" mode), each file is handed to it as soon as it has been downloaded.
+    If a folder can not be listed (see ListFolder()), the folders after it are left for the next run and True is still
+    returned, so the files downloaded up to that point are loaded.
     """
+    downloadPool = None
     try:
         # Grab a few settings we need later.
         ftpHost = "ftp://" + GetConfigString("ftp_host")
         ftp_baseLateFolder = GetConfigString("ftp_baseLateFolder")
         targetFolder = GetConfigString("extract_LateFolder")
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
+
+        # The files selected in each FTP folder are downloaded concurrently by a bounded pool of worker threads.
+        downloadPool = ThreadPool(GetDownloadPoolSize())
+        dictStats = {"files": 0, "bytes": 0, "failed": 0}
+        time_Downloads = get_NewStart_Time()
 
         # bConnectionCreated = False
         # ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
@@ -566,6 +2252,7 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
 
         # Starting with the last Late Date passed in, loop through the years and months and get all of the
         # files from the corresponding FTP folders
+        bListingFailed = False
         while oFolderYear <= oTodaysYear:
             while oFolderMonth <= oTodaysMonth:
 
@@ -573,53 +2260,46 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
                 sYear = str(oFolderYear)
                 sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
                 ftpFolder = ftp_baseLateFolder + "/" + sYear + "/" + sMonth
-                proxyDir = "https://proxy.servirglobal.net/ProxyFTP.aspx?directory="
-                logging.debug("FTPProxy Directory URL = {0}".format(proxyDir + ftpHost + ftpFolder + "/"))
+                proxySession = GetProxySession()
+                logging.debug("FTPProxy Directory URL = {0}".format(proxySession.proxyURL + "?directory=" +
+                                                                    ftpHost + ftpFolder + "/"))
                 # ftp_Connection.cwd(ftpFolder)
-                req = urllib2.Request(proxyDir + ftpHost + ftpFolder + "/")  # last slash is required
-                response = urllib2.urlopen(req)
+                # (The last slash is required.)  If the folder can not be listed, stop here: the files downloaded so
+                # far are still loaded, and the next run carries on from them (going on to a later folder would leave
+                # a gap behind them).
+                sListing = ListFolder(lambda: proxySession.GetDirectoryListing(ftpHost + ftpFolder + "/"),
+                                      ftpHost + ftpFolder)
+                if sListing is None:
+                    bListingFailed = True
+                    break
 
-                # Initialize a placeholder list for names of files that we ACTUALLY process/download
-                actualList = []
+                # Initialize a list of (source, target) tuples for the download pool
+                downloadList = []
 
                 # Grab the list of ALL filenames from the current FTP folder...
                 # line = ftp_Connection.retrlines("NLST", tmpList.append)
-                tmpList = response.read().split(",")
+                tmpList = sListing.split(",")
 
-                # Loop through each item in the tmpList and verify if we want to keep/download it!
+                # Check the items in the tmpList and keep the ones we want to download (see SelectFilesToDownload()).
                 # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
                 # To keep a file, it must:
                 #   - contain an "L" at position 7 in the filename.
                 #   - be the proper type of file (contain the string ".30min.tif")
                 #   - have a start date/time that is greater than the oLastLateDateTime passed in from the GDB
-                for ftpFile in tmpList:
-                    # If it is a 30Min tif file
-                    if ".30min.tif" in ftpFile:
-                        # If the item is a "Late" entry
-                        if ftpFile[7] == 'L':
-                            # Ex. filename format: 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif
-                            # The start time (represented by "20150802-S083000") is used as the timestamp for each file.
-                            # If the item's timestamp is later than the oLastLateDateTime, we want to keep it.
-                            fileDate = Get_StartDateTime_FromString(ftpFile, RegEx_StartDatePattern, Filename_StartDateFormat)
-                            if (fileDate is not None) and (fileDate > oLastLateDateTime):
-                                # Download the ftpFile to the extract_LateFolder
-
-                                # Keep track of the files that we actually process...
-                                actualList.append(ftpFile)
-
-                                sourceExtractFile = ftpHost + os.path.join(ftpFolder, ftpFile)
-                                targetExtractFile = os.path.join(targetFolder, ftpFile)
-                                # with open(targetExtractFile, "wb") as f:
-                                #     ftp_Connection.retrbinary("RETR %s" % ftpFile, f.write)  # fully qualify ftpFile?
-                                fx = open(targetExtractFile, "wb")
-                                fx.close()
-                                os.chmod(targetExtractFile, 0777)
-                                try:
-                                    urllib.urlretrieve("https://proxy.servirglobal.net/ProxyFTP.aspx?url=" +
-                                                       sourceExtractFile, targetExtractFile)
-                                except:
-                                    logging.info("Error retrieving file from proxy: {0}".format(sourceExtractFile))
-                                    os.remove(targetExtractFile)
+                #   - have a start date/time that is not greater than the oTodaysDateTime passed in (the end of the
+                #     window in catch-up mode)
+                actualList = SelectFilesToDownload(ftpFolder, tmpList, "L", oLastLateDateTime, oTodaysDateTime)
+                for ftpFile in actualList:
+                    # Download the ftpFile to the extract_LateFolder
+                    sourceExtractFile = ftpHost + os.path.join(ftpFolder, ftpFile)
+                    targetExtractFile = os.path.join(targetFolder, ftpFile)
+                    downloadList.append((sourceExtractFile, targetExtractFile))
+
+                # Download the selected files from this folder concurrently (failed files are removed by the pool)
+                downloadedList = DownloadFiles(downloadPool, DownloadFile_FromProxy, downloadList, dictStats,
+                                               loadFunction)
+                SetManifestStatus(downloadedList, "downloaded")
+                del downloadList[:]
 
                 # Delete the temp list of filenames before moving to a new FTP folder
                 del tmpList[:]
@@ -634,6 +2314,9 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
                 # End of "month" while loop - Increment the month
                 oFolderMonth = oFolderMonth + 1
 
+            if bListingFailed:
+                break
+
             # End of "year" while loop - Increment the year
             oFolderYear = oFolderYear + 1
             # Also need to reset the month to January...
@@ -641,6 +2324,9 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
 
         # Disconnect from ftp
         # ftp_Connection.close()
+        downloadPool.close()
+        downloadPool.join()
+        LogDownloadThroughput("LATE", dictStats, time_Downloads)
         return True
 
     except:
@@ -648,6 +2334,8 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
         logging.error(err)
         # if bConnectionCreated:
         #     ftp_Connection.close()
+        if downloadPool is not None:
+            downloadPool.terminate()
         return False
 
 
@@ -657,7 +2345,7 @@ def ProcessLateFiles_FromProxy(oTodaysDateTime, oLastLateDateTime):
 # For this reason, we have implemented another "Proxy" function further below that uses URLLIB to retrieve the files
 # from the proxy location vs. this function that uses FTPLIB to retrieve the files from the ftp location.
 #  --- NOTE! NOTE! NOTE! ---
-def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
+def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime, loadFunction=None):
     """
     Connects to the FTP site (base folder) and based on today's date, the latest LATE and EARLY GDB Dates passed in,
     processes through the FTP Early folder hierarchy (year and month) and retrieves a list of filenames to process.
@@ -679,22 +2367,25 @@ def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
     last Early Date passed in.  Also, we only want files that contain the letter "E" in position 7 of the name, and
     end in ".30min.tif". Once the list of files for each FTP folder is trimmed, the files are then downloaded
     to the proper extract location.
+    If a loadFunction is passed in ("pipeline" mode), each file is handed to it as soon as it has been downloaded.
+    If a folder can not be listed (see ListFolder()), the folders after it are left for the next run and True is still
+    returned, so the files downloaded up to that point are loaded.
     """
+    ftpPool = None
+    downloadPool = None
     try:
-        ftp_Host = GetConfigString("ftp_host")
         ftp_baseEarlyFolder = GetConfigString("ftp_baseEarlyFolder")
-        ftp_UserName = GetConfigString("ftp_user")
-        ftp_UserPass = GetConfigString("ftp_pswrd")
 
         # Grab a few settings we might need later.
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
         targetFolder = GetConfigString("extract_EarlyFolder")
 
-        bConnectionCreated = False
-        ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
-        # time.sleep(1)   # Don't believe this is needed...
-        bConnectionCreated = True
+        # A small pool of logged in FTP sessions (reconnected/retried if the server drops them) lets us RETR several
+        # files at once. Each download thread borrows one session at a time.
+        ftpPool = GetFTPSessionPool()
+        downloadPool = ThreadPool(ftpPool.size)
+        downloadFunction = functools.partial(DownloadFile_FromFTP, ftpPool)
+        dictStats = {"files": 0, "bytes": 0, "failed": 0}
+        time_Downloads = get_NewStart_Time()
 
         # Get the year and month from each date passed in
         oTodaysYear = oTodaysDateTime.year
@@ -704,6 +2395,7 @@ def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
 
         # Starting with the last Early Date passed in, loop through the years and months and get all of the
         # files from the corresponding FTP folders
+        bListingFailed = False
         while oFolderYear <= oTodaysYear:
             while oFolderMonth <= oTodaysMonth:
 
@@ -711,44 +2403,38 @@ def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
                 sYear = str(oFolderYear)
                 sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
                 ftpFolder = ftp_baseEarlyFolder + "/" + sYear + "/" + sMonth
-                ftp_Connection.cwd(ftpFolder)
 
-                # Initialize a list for names of ALL files that are in the FTP folder
-                tmpList = []
-                # Initialize a placeholder list for names of files that we ACTUALLY process/download
-                actualList = []
+                # Initialize a list of (ftp file, target) tuples for the download pool
+                downloadList = []
 
                 # Grab the list of ALL filenames from the current FTP folder...
-                line = ftp_Connection.retrlines("NLST", tmpList.append)
+                # If the folder can not be listed, stop here: the files downloaded so far are still loaded, and
+                # the next run carries on from them (going on to a later folder would leave a gap behind them).
+                tmpList = ListFolder(lambda: ftpPool.ListFiles(ftpFolder), ftpFolder)
+                if tmpList is None:
+                    bListingFailed = True
+                    break
 
-                # Loop through each item in the tmpList and verify if we want to keep/download it!
+                # Check the items in the tmpList and keep the ones we want to download (see SelectFilesToDownload()).
                 # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
                 # To keep a file, it must:
                 #   - contain an "E" at position 7 in the filename.
                 #   - be the proper type of file (contain the string ".30min.tif")
                 #   - have a start date/time that is greater than the oLastLateDateTime passed in from the GDB
                 #   - have a start date/time that is greater than the oLastEarlyDateTime passed in from the GDB
-                for ftpFile in tmpList:
-                    # If it is a 30Min tif file
-                    if ".30min.tif" in ftpFile:
-                        # If the item is a "Late" entry
-                        if ftpFile[7] == 'E':
-                            # Ex. filename format: 3B-HHR-E.MS.MRG.3IMERG.20180801-S000000-E002959.0000.V05B.30min.tif
-                            # The start time (represented by "20180801-S000000") is used as the timestamp for each file.
-                            # If the item's timestamp is later than the oLastLateDateTime and the oLastEarlyDateTime,
-                            # we want to keep it.
-                            fileDate = Get_StartDateTime_FromString(ftpFile, RegEx_StartDatePattern, Filename_StartDateFormat)
-                            if (fileDate is not None) and (fileDate > oLastLateDateTime)and (fileDate > oLastEarlyDateTime):
-                                # Download the ftpFile to the extract_EarlyFolder
-
-                                # Keep track of the files that we actually process...
-                                actualList.append(ftpFile)
-
-                                targetExtractFile = os.path.join(targetFolder, ftpFile)
-                                with open(targetExtractFile, "wb") as f:
-
-                                    ftp_Connection.retrbinary("RETR %s" % ftpFile, f.write)  # fully qualify ftpFile?
-                                    # time.sleep(1)   # Don't believe this is needed...
+                #   - have a start date/time that is not greater than the oTodaysDateTime passed in (the same
+                #     selection as the proxy, see ProcessEarlyFiles_FromProxy())
+                actualList = SelectFilesToDownload(ftpFolder, tmpList, "E", max(oLastLateDateTime, oLastEarlyDateTime),
+                                                   oTodaysDateTime)
+                for ftpFile in actualList:
+                    # Download the ftpFile to the extract_EarlyFolder
+                    targetExtractFile = os.path.join(targetFolder, ftpFile)
+                    downloadList.append((ftpFolder + "/" + ftpFile, targetExtractFile))
+
+                # Download the selected files from this folder concurrently (failed files are removed by the pool)
+                downloadedList = DownloadFiles(downloadPool, downloadFunction, downloadList, dictStats, loadFunction)
+                SetManifestStatus(downloadedList, "downloaded")
+                del downloadList[:]
 
                 # Delete the temp list of filenames before moving to a new FTP folder
                 del tmpList[:]
@@ -763,20 +2449,29 @@ def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
                 # End of "month" while loop - Increment the month
                 oFolderMonth = oFolderMonth + 1
 
+            if bListingFailed:
+                break
+
             # End of "year" while loop - Increment the year
             oFolderYear = oFolderYear + 1
             # Also need to reset the month to January...
             oFolderMonth = 1
 
         # Disconnect from ftp
-        ftp_Connection.close()
+        downloadPool.close()
+        downloadPool.join()
+        ftpPool.close()
+        LogDownloadThroughput("EARLY", dictStats, time_Downloads)
+        logging.debug("FTP sessions opened: {0}, reconnects: {1}".format(ftpPool.sessionsOpened, ftpPool.reconnects))
         return True
 
     except:
         err = capture_exception()
         logging.error(err)
-        if bConnectionCreated:
-            ftp_Connection.close()
+        if downloadPool is not None:
+            downloadPool.terminate()
+        if ftpPool is not None:
+            ftpPool.close()
         return False
 
 
@@ -784,7 +2479,8 @@ def ProcessEarlyFiles(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
 # This function is a replacement for ProcessEarlyFiles() above. We cannot rely on FTP functionality, so we
 # are using a proxy server that provides access to the needed ftp files via URLLIB functionality.
 #  --- NOTE! NOTE! NOTE! ---
-def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime):
+def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDateTime,
+                                loadFunction=None):
     """
     Connects to the Proxy site (via URLLIB) and based on today's date, the latest LATE and EARLY GDB Dates passed in,
     processes through the FTP Early folder hierarchy (year and month) and retrieves a list of filenames to process.
@@ -806,14 +2502,21 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
     last Early Date passed in.  Also, we only want files that contain the letter "E" in position 7 of the name, and
     end in ".30min.tif". Once the list of files for each FTP folder is trimmed, the files are then downloaded
     to the proper extract location.
+    If a loadFunction is passed in ("pipeline" mode), each file is handed to it as soon as it has been downloaded.
+    If a folder can not be listed (see ListFolder()), the folders after it are left for the next run and True is still
+    returned, so the files downloaded up to that point are loaded.
     """
+    downloadPool = None
     try:
         # Grab a few settings we need later.
         ftpHost = "ftp://" + GetConfigString("ftp_host")
         ftp_baseEarlyFolder = GetConfigString("ftp_baseEarlyFolder")
         targetFolder = GetConfigString("extract_EarlyFolder")
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
+
+        # The files selected in each FTP folder are downloaded concurrently by a bounded pool of worker threads.
+        downloadPool = ThreadPool(GetDownloadPoolSize())
+        dictStats = {"files": 0, "bytes": 0, "failed": 0}
+        time_Downloads = get_NewStart_Time()
 
         # bConnectionCreated = False
         # ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
@@ -827,6 +2530,7 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
 
         # Starting with the last Early Date passed in, loop through the years and months and get all of the
         # files from the corresponding FTP folders
+        bListingFailed = False
         while oFolderYear <= oTodaysYear:
             while oFolderMonth <= oTodaysMonth:
 
@@ -834,55 +2538,48 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
                 sYear = str(oFolderYear)
                 sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
                 ftpFolder = ftp_baseEarlyFolder + "/" + sYear + "/" + sMonth
-                proxyDir = "https://proxy.servirglobal.net/ProxyFTP.aspx?directory="
-                logging.debug("FTPProxy Directory URL = {0}".format(proxyDir + ftpHost + ftpFolder + "/"))
+                proxySession = GetProxySession()
+                logging.debug("FTPProxy Directory URL = {0}".format(proxySession.proxyURL + "?directory=" +
+                                                                    ftpHost + ftpFolder + "/"))
                 # ftp_Connection.cwd(ftpFolder)
-                req = urllib2.Request(proxyDir + ftpHost + ftpFolder + "/")  # last slash is required
-                response = urllib2.urlopen(req)
+                # (The last slash is required.)  If the folder can not be listed, stop here: the files downloaded so
+                # far are still loaded, and the next run carries on from them (going on to a later folder would leave
+                # a gap behind them).
+                sListing = ListFolder(lambda: proxySession.GetDirectoryListing(ftpHost + ftpFolder + "/"),
+                                      ftpHost + ftpFolder)
+                if sListing is None:
+                    bListingFailed = True
+                    break
 
-                # Initialize a placeholder list for names of files that we ACTUALLY process/download
-                actualList = []
+                # Initialize a list of (source, target) tuples for the download pool
+                downloadList = []
 
                 # Grab the list of ALL filenames from the current FTP folder...
                 # line = ftp_Connection.retrlines("NLST", tmpList.append)
-                tmpList = response.read().split(",")
+                tmpList = sListing.split(",")
 
-                # Loop through each item in the tmpList and verify if we want to keep/download it!
+                # Check the items in the tmpList and keep the ones we want to download (see SelectFilesToDownload()).
                 # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
                 # To keep a file, it must:
                 #   - contain an "E" at position 7 in the filename.
                 #   - be the proper type of file (contain the string ".30min.tif")
                 #   - have a start date/time that is greater than the oLastLateDateTime passed in from the GDB
                 #   - have a start date/time that is greater than the oLastEarlyDateTime passed in from the GDB
-                for ftpFile in tmpList:
-                    # If it is a 30Min tif file
-                    if ".30min.tif" in ftpFile:
-                        # If the item is a "Late" entry
-                        if ftpFile[7] == 'E':
-                            # Ex. filename format: 3B-HHR-E.MS.MRG.3IMERG.20180801-S000000-E002959.0000.V05B.30min.tif
-                            # The start time (represented by "20180801-S000000") is used as the timestamp for each file.
-                            # If the item's timestamp is later than the oLastLateDateTime and the oLastEarlyDateTime,
-                            # we want to keep it.
-                            fileDate = Get_StartDateTime_FromString(ftpFile, RegEx_StartDatePattern, Filename_StartDateFormat)
-                            if (fileDate is not None) and (fileDate > oLastLateDateTime)and (fileDate > oLastEarlyDateTime):
-                                # Download the ftpFile to the extract_EarlyFolder
-
-                                # Keep track of the files that we actually process...
-                                actualList.append(ftpFile)
-
-                                sourceExtractFile = ftpHost + os.path.join(ftpFolder, ftpFile)
-                                targetExtractFile = os.path.join(targetFolder, ftpFile)
-                                # with open(targetExtractFile, "wb") as f:
-                                #     ftp_Connection.retrbinary("RETR %s" % ftpFile, f.write)  # fully qualify ftpFile?
-                                fx = open(targetExtractFile, "wb")
-                                fx.close()
-                                os.chmod(targetExtractFile, 0777)
-                                try:
-                                    urllib.urlretrieve("https://proxy.servirglobal.net/ProxyFTP.aspx?url=" +
-                                                       sourceExtractFile, targetExtractFile)
-                                except:
-                                    logging.info("Error retrieving latest 1Day file from proxy: {0}".format(sourceExtractFile))
-                                    os.remove(targetExtractFile)
+                #   - have a start date/time that is not greater than the oTodaysDateTime passed in (the end of the
+                #     window in catch-up mode)
+                actualList = SelectFilesToDownload(ftpFolder, tmpList, "E", max(oLastLateDateTime, oLastEarlyDateTime),
+                                                   oTodaysDateTime)
+                for ftpFile in actualList:
+                    # Download the ftpFile to the extract_EarlyFolder
+                    sourceExtractFile = ftpHost + os.path.join(ftpFolder, ftpFile)
+                    targetExtractFile = os.path.join(targetFolder, ftpFile)
+                    downloadList.append((sourceExtractFile, targetExtractFile))
+
+                # Download the selected files from this folder concurrently (failed files are removed by the pool)
+                downloadedList = DownloadFiles(downloadPool, DownloadFile_FromProxy, downloadList, dictStats,
+                                               loadFunction)
+                SetManifestStatus(downloadedList, "downloaded")
+                del downloadList[:]
 
                 # Delete the temp list of filenames before moving to a new FTP folder
                 del tmpList[:]
@@ -897,6 +2594,9 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
                 # End of "month" while loop - Increment the month
                 oFolderMonth = oFolderMonth + 1
 
+            if bListingFailed:
+                break
+
             # End of "year" while loop - Increment the year
             oFolderYear = oFolderYear + 1
             # Also need to reset the month to January...
@@ -904,6 +2604,9 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
 
         # Disconnect from ftp
         # ftp_Connection.close()
+        downloadPool.close()
+        downloadPool.join()
+        LogDownloadThroughput("EARLY", dictStats, time_Downloads)
         return True
 
     except:
@@ -911,47 +2614,382 @@ def ProcessEarlyFiles_FromProxy(oLastLateDateTime, oTodaysDateTime, oLastEarlyDa
         logging.error(err)
         # if bConnectionCreated:
         #     ftp_Connection.close()
+        if downloadPool is not None:
+            downloadPool.terminate()
         return False
 
 
+def CatchUpInWindows(early_or_late, oFromDateTime, oToDateTime, extractFolder, processFunction):
+    """
+    Catch-up mode ('catchup_Mode'): after an outage, work through the backlog of files between the two datetimes passed
+    in one bounded window ('catchup_WindowHours') at a time.  Each window is downloaded, transformed and loaded into
+    the mosaic dataset (see RasterLoader) before the next one starts, and the end of each completed window is
+    checkpointed to the "catchup" section of the state file, so a restarted run resumes from the last completed window
+    instead of starting over.  processFunction(oWindowStart, oWindowEnd, loadFunction) downloads the files of a window
+    (i.e. ProcessLateFiles_FromProxy()).
+    Stops once less than one window is left, and returns the datetime the regular processing should carry on from (or
+    None if a window failed).  The checkpoint is cleared once the backlog has been worked through.
+    """
+    if not GetConfigFlag("catchup_Mode", False):
+        return oFromDateTime
+
+    oWindow = datetime.timedelta(hours=float(GetConfigValue("catchup_WindowHours", 24)))
+    oWindowStart = oFromDateTime
+    checkpoint = LoadStateFile().get("catchup", {}).get(early_or_late)
+    if checkpoint is not None:
+        oCheckpoint = datetime.datetime.strptime(checkpoint, MosaicStatistics.DATE_FORMAT)
+        if oFromDateTime < oCheckpoint < oToDateTime:
+            logging.info("Resuming {0} catch-up from the checkpoint at {1}.".format(early_or_late, checkpoint))
+            oWindowStart = oCheckpoint
+    if oToDateTime - oWindowStart <= oWindow:
+        return oWindowStart
+
+    logging.info("Catching up on {0} files from {1} in {2} hour windows...".format(
+                 early_or_late, oWindowStart.strftime('%m/%d/%Y %I:%M:%S %p'), oWindow.total_seconds() / 3600.0))
+    while oToDateTime - oWindowStart > oWindow:
+        oWindowEnd = oWindowStart + oWindow
+        time_Window = get_NewStart_Time()
+        loader = RasterLoader(extractFolder, early_or_late)
+        iListingsFailed = GetFetchPolicy().listingsFailed
+        bGoodSoFar = processFunction(oWindowStart, oWindowEnd, loader.LoadRaster)
+        loader.LoadFolder()
+        loader.Finish()
+        # (A window with a folder that could not be listed is not complete, so it must not be checkpointed)
+        if not bGoodSoFar or GetFetchPolicy().listingsFailed > iListingsFailed:
+            logging.error("{0} catch-up window {1} - {2} failed.".format(early_or_late, oWindowStart, oWindowEnd))
+            return None
+
+        # Commit the window
+        state = LoadStateFile()
+        state.setdefault("catchup", {})[early_or_late] = oWindowEnd.strftime(MosaicStatistics.DATE_FORMAT)
+        SaveStateFile(state)
+        logging.info("\t{0} catch-up window up to {1} done in {2}".format(
+                     early_or_late, oWindowEnd.strftime('%m/%d/%Y %I:%M:%S %p'), timeElapsed(time_Window)))
+        oWindowStart = oWindowEnd
+
+    # Caught up - the rest is left to the regular processing, so the checkpoint is no longer needed
+    state = LoadStateFile()
+    state.get("catchup", {}).pop(early_or_late, None)
+    SaveStateFile(state)
+    return oWindowStart
+
+
+def FindMissingSlots(mosaicDS, oWindowStart):
+    """
+    Compare the grid of 48 half hour slots per day, from oWindowStart up to the newest raster in the mosaic dataset,
+    with what is in the mosaic dataset (see MosaicCatalog) and return a dictionary of the missing slot start datetimes
+    for each product:
+        "L" - slots up to the latest "Late" timestamp that have no "Late" raster (even if there is an "Early" one)
+        "E" - slots after the latest "Late" timestamp, up to the latest "Early" timestamp, that have no raster at all
+    Slots after the newest raster are left to the regular (non-backfill) run.
+    """
+    catalog = GetMosaicCatalog(mosaicDS)
+    filledSlots = {"LATE": set(), "EARLY": set()}
+    for oTimestamp, dataAge in zip(catalog.timestamps, catalog.dataAges):
+        if oTimestamp is not None and dataAge in filledSlots:
+            filledSlots[dataAge].add(oTimestamp.replace(second=0, microsecond=0))
+
+    missingSlots = {"L": [], "E": []}
+    oLatestLate = catalog.GetLatest("LATE")
+    oLatestEarly = catalog.GetLatest("EARLY")
+    oSlot = oWindowStart
+    oHalfHour = datetime.timedelta(minutes=30)
+    if oLatestLate is not None:
+        while oSlot <= oLatestLate:
+            if oSlot not in filledSlots["LATE"]:
+                missingSlots["L"].append(oSlot)
+            oSlot += oHalfHour
+    if oLatestEarly is not None:
+        while oSlot <= oLatestEarly:
+            if oSlot not in filledSlots["LATE"] and oSlot not in filledSlots["EARLY"]:
+                missingSlots["E"].append(oSlot)
+            oSlot += oHalfHour
+    return missingSlots
+
+
+def ProcessBackfill_FromProxy(missingSlots, product, loadFunction):
+    """
+    Download the files for the missing slots (start datetimes) of the product ("E" or "L") passed in from the Proxy
+    site.  The slots are grouped by year/month so each FTP folder is listed only once, and only the files whose start
+    datetime is one of the missing slots are downloaded.  Each downloaded file is handed to the loadFunction.
+    """
+    downloadPool = None
+    try:
+        ftpHost = "ftp://" + GetConfigString("ftp_host")
+        if product == "L":
+            ftp_baseFolder = GetConfigString("ftp_baseLateFolder")
+            targetFolder = GetConfigString("extract_LateFolder")
+        else:
+            ftp_baseFolder = GetConfigString("ftp_baseEarlyFolder")
+            targetFolder = GetConfigString("extract_EarlyFolder")
+
+        # Group the missing slots by their <baseFolder>/Year/Month FTP folder
+        folderSlots = {}
+        for oSlot in missingSlots:
+            folderSlots.setdefault((oSlot.year, oSlot.month), set()).add(oSlot)
+
+        downloadPool = ThreadPool(GetDownloadPoolSize())
+        dictStats = {"files": 0, "bytes": 0, "failed": 0}
+        time_Downloads = get_NewStart_Time()
+        for iYear, iMonth in sorted(folderSlots.keys()):
+            slots = folderSlots[(iYear, iMonth)]
+            ftpFolder = ftp_baseFolder + "/" + str(iYear) + "/" + str(iMonth).zfill(2)
+            # (The last slash is required.)  The slots are known, so a folder that can not be listed is just skipped.
+            sListing = ListFolder(lambda: GetProxySession().GetDirectoryListing(ftpHost + ftpFolder + "/"),
+                                  ftpHost + ftpFolder)
+            if sListing is None:
+                continue
+
+            downloadList = []
+            for ftpFile in sListing.split(","):
+                if ".30min.tif" not in ftpFile:
+                    continue
+                oRecord = IMERG_30Min_Filename.ParseFilename(ftpFile)
+                if oRecord is not None and oRecord.product == product and oRecord.start in slots:
+                    downloadList.append((ftpHost + os.path.join(ftpFolder, ftpFile), os.path.join(targetFolder,
+                                                                                                  ftpFile)))
+
+            downloadedList = DownloadFiles(downloadPool, DownloadFile_FromProxy, downloadList, dictStats, loadFunction)
+            SetManifestStatus(downloadedList, "downloaded")
+            logging.info("{0} of {1} missing {2} slots backfilled from folder: {3}.".format(
+                         len(downloadedList), len(slots), product, ftpHost + ftpFolder))
+
+        downloadPool.close()
+        downloadPool.join()
+        LogDownloadThroughput("BACKFILL " + product, dictStats, time_Downloads)
+        return True
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+        if downloadPool is not None:
+            downloadPool.terminate()
+        return False
+
+
+def Backfill(mosaicDS):
+    """
+    The --backfill run: find the half hour slots missing from the mosaic dataset within the days we keep rasters
+    (see FindMissingSlots()), then download and load only those, "Late" first so any "Early" files they replace are
+    removed.  Returns True if both products were processed.
+    """
+    numDays = int(GetConfigString("DaysToKeepRasters"))
+    oWindowStart = datetime.datetime.combine((datetime.datetime.now() - datetime.timedelta(days=numDays)).date(),
+                                             datetime.time())
+    missingSlots = FindMissingSlots(mosaicDS, oWindowStart)
+    bGoodSoFar = True
+    for product, early_or_late, extractFolder in (("L", "LATE", GetConfigString("extract_LateFolder")),
+                                                  ("E", "EARLY", GetConfigString("extract_EarlyFolder"))):
+        logging.info("{0} missing {1} slots since {2}.".format(len(missingSlots[product]), early_or_late,
+                                                               oWindowStart.strftime('%m/%d/%Y')))
+        if len(missingSlots[product]) == 0:
+            continue
+        if not create_folder(extractFolder):
+            logging.error("Could not create folder: {0}. Try to create manually and run again!".format(extractFolder))
+            return False
+        loader = RasterLoader(extractFolder, early_or_late)
+        bGoodSoFar = ProcessBackfill_FromProxy(missingSlots[product], product, loader.LoadRaster) and bGoodSoFar
+        loader.Finish()
+    return bGoodSoFar
+
+
+def GetTransformPoolSize():
+    """
+    Returns the number of worker processes used to extract/save rasters, read from the config file.  Defaults to 1,
+    which does the work on the main process (no pool).
+    """
+    try:
+        return max(1, int(GetConfigValue("transform_MaxWorkers", 1)))
+    except:
+        return 1
+
+
+def InitTransformWorker(outputProfile, engine="SA"):
+    """
+    Runs once in each transform worker process.  For the Spatial Analyst engine, each worker gets the extension, the
+    output profile environment settings and its own scratch folder so the temporary rasters written by the workers do
+    not collide.  (The NUMPY engine needs none of these, nor arcpy.)
+    """
+    if engine != "SA":
+        return
+    ImportArcpy()
+    arcpy.CheckOutExtension("Spatial")
+    arcpy.env.overwriteOutput = True
+    ApplyOutputProfile(outputProfile)
+    scratchFolder = os.path.join(tempfile.gettempdir(), "IMERG_Transform_" + str(os.getpid()))
+    create_folder(scratchFolder)
+    arcpy.env.scratchWorkspace = scratchFolder
+
+
+def GetOutputProfile():
+    """
+    Returns the output profile for the rasters written to the final folder, read from the config file:
+      'output_Compression': 'NONE', 'LZW' or 'DEFLATE'
+      'output_Predictor':   1 (none) or 2 (horizontal differencing)
+      'output_TileSize':    internal tile width/height in pixels (0 = not tiled)
+      'output_Overviews':   True/False - build overviews (pyramids)
+      'output_PixelType':   i.e. '16_BIT_UNSIGNED' ('' = keep the pixel type of the downloaded raster)
+    The defaults give the old layout (whatever the engine writes by default).
+    """
+    return {"compression": str(GetConfigValue("output_Compression", "NONE")).upper(),
+            "predictor": int(GetConfigValue("output_Predictor", 1)),
+            "tileSize": int(GetConfigValue("output_TileSize", 0)),
+            "overviews": GetConfigFlag("output_Overviews", False),
+            "pixelType": str(GetConfigValue("output_PixelType", "")).upper()}
+
+
+def ApplyOutputProfile(outputProfile):
+    """
+    Sets the arcpy environment for the output profile, used by the Spatial Analyst engine.  arcpy calls DEFLATE "LZ77",
+    has no predictor setting, and builds the overviews as pyramid (.ovr) files next to the raster.
+    """
+    arcpy.env.compression = {"DEFLATE": "LZ77"}.get(outputProfile["compression"], outputProfile["compression"])
+    if outputProfile["tileSize"]:
+        arcpy.env.tileSize = "{0} {0}".format(outputProfile["tileSize"])
+    if outputProfile["overviews"]:
+        arcpy.env.pyramid = "PYRAMIDS -1 NEAREST DEFAULT"
+    else:
+        arcpy.env.pyramid = "NONE"
+
+
+def GetTransformEngine():
+    """
+    Returns the transform engine to use, read from the config file: 'SA' (Spatial Analyst ExtractByAttributes, the
+    default) or 'NUMPY' (IMERG_30Min_Transform.py, needs GDAL and NumPy).  Falls back to 'SA' if GDAL/NumPy are missing.
+    """
+    engine = str(GetConfigValue("transform_Engine", "SA")).upper()
+    if engine == "NUMPY" and not ImportTransform().IsAvailable():
+        logging.warning("transform_Engine is NUMPY but GDAL/NumPy could not be imported - using Spatial Analyst.")
+        engine = "SA"
+    return engine
+
+
+def TransformRaster(transformItem):
+    """
+    Extract only the pixel values we want from a raster and save the result to its final location.  This may run in a
+    transform worker process, so it does not raise - it returns a tuple of (raster, finalRaster, True/False success,
+    error string, pixel statistics, seconds taken) instead.  transformItem is a (raster, finalRaster, SQL clause,
+    engine, NoData value, output profile, True/False pixel statistics) tuple, where the engine is 'SA' or 'NUMPY' (see
+    GetTransformEngine()), the output profile comes from GetOutputProfile() and the NoData value is only used by the
+    NUMPY engine.  The pixel statistics are None unless they were asked for (and could be calculated).
+    """
+    raster, finalRaster, inSQLClause, engine, noDataValue, outputProfile, bPixelStats = transformItem
+    timeStart = time.time()
+    try:
+        if engine == "NUMPY":
+            ImportTransform()
+            # Same pixels as the Spatial Analyst extract below, but no raster attribute table is created.
+            stats = IMERG_30Min_Transform.MaskRaster(
+                raster, finalRaster, noDataValue,
+                creationOptions=IMERG_30Min_Transform.BuildCreationOptions(outputProfile["compression"],
+                                                                           outputProfile["predictor"],
+                                                                           outputProfile["tileSize"]),
+                pixelType=outputProfile["pixelType"],
+                overviewLevels=IMERG_30Min_Transform.OVERVIEW_LEVELS if outputProfile["overviews"] else None)
+            return raster, finalRaster, True, "", tuple(stats) if bPixelStats else None, time.time() - timeStart
+
+        extract = arcpy.sa.ExtractByAttributes(raster, inSQLClause)
+        if outputProfile["pixelType"]:
+            # The compression/tiling/pyramids come from the arcpy environment (see ApplyOutputProfile())
+            arcpy.CopyRaster_management(extract, finalRaster, pixel_type=outputProfile["pixelType"])
+        else:
+            extract.save(finalRaster)
+        # ----------
+        #  For some reason, the extract is causing the raster attribute table (.tif.vat.dbf file) to be created
+        # which is being locked (with a ...tif.vat.dbf.lock file) as users access the WMS service. The problem
+        # is that the lock file is never released and future updates to the raster are failing. Therefore, here
+        # we will just try to delete the raster attribute table right after it is created.
+        arcpy.DeleteRasterAttributeTable_management(finalRaster)
+        # ----------
+        stats = None
+        if bPixelStats:
+            try:
+                stats = tuple(GetRasterPixelStats(finalRaster))
+            except:
+                # Not fatal - UpdateMosaicStatistics() fills in the statistics of rasters that have none
+                stats = None
+        return raster, finalRaster, True, "", stats, time.time() - timeStart
+    except:
+        return raster, finalRaster, False, capture_exception(), None, time.time() - timeStart
+
+
 def CheckEarlyRaster(sLateFile, mosaicDS):
     """
     Check the folder supporting the raster mosaic dataset to see if an "Early" raster corresponding to the "Late"
     raster passed in exists in the folder. If so, this indicates that we need to 1.) Remove the assoc. "Early"
     raster from the mosaic dataset, and 2.) Delete the "Early" physical file.
+    (Same as ReplaceEarlyRasters() for a single file.)
+    """
+    ReplaceEarlyRasters([sLateFile], mosaicDS)
+
+
+def ReplaceEarlyRasters(lateFileList, mosaicDS):
+    """
+    Find the "Early" rasters corresponding to all of the "Late" rasters passed in that exist in the folder supporting
+    the raster mosaic dataset, then 1.) Remove them from the mosaic dataset with one "Name IN (...)" query (and a single
+    boundary update), and 2.) Delete their physical files (see DeleteRasterFiles()).
     """
     try:
-        # Build the "Early" raster filename based on the "Late" raster filename passed in
+        time_Replace = get_NewStart_Time()
+        # Build the "Early" raster filenames based on the "Late" raster filenames passed in
         # (Basically update the 8th character in the filename from "L" to "E")
         # 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif
-        sEarlyFile_firstPart = sLateFile[:7]  # "3B-HHR-"
-        sEarlyFile_lastPart = sLateFile[8:]   # ".MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif"
-        sEarlyFile = sEarlyFile_firstPart + "E" + sEarlyFile_lastPart
-
-        # Get the folder supporting the raster mosaic dataset
         sourceFolder = GetConfigString('final_Folder')
-        # Build the full path string to the "Early" raster file
-        sFullPathEarlyRaster = os.path.join(sourceFolder, sEarlyFile)
-
-        # If the "Early" file exists...
-        if arcpy.Exists(sFullPathEarlyRaster):
-            logging.debug("\t\t\tRemoving/deleting corresponding Early raster file.")
-            # Get the name of the "Early" raster minus the .tif extension
-            sEarlyFile_minusExt = os.path.splitext(sEarlyFile)[0]
-
-            # Remove the "Early" raster from the mosaic dataset
-            query = "Name = '" + sEarlyFile_minusExt + "'"
-            arcpy.RemoveRastersFromMosaicDataset_management(mosaicDS, query,
-                                                            "UPDATE_BOUNDARY", "MARK_OVERVIEW_ITEMS",
-                                                            "DELETE_OVERVIEW_IMAGES")
-            # Delete the physical file
-            arcpy.Delete_management(sFullPathEarlyRaster)
+        earlyRasterList = []
+        for sLateFile in lateFileList:
+            oLateRecord = IMERG_30Min_Filename.ParseFilename(sLateFile)
+            if oLateRecord is None or oLateRecord.product != "L":
+                logging.warning("\t\t\tNot a Late IMERG filename, no Early raster to check: {0}".format(sLateFile))
+                continue
+            sFullPathEarlyRaster = os.path.join(sourceFolder, IMERG_30Min_Filename.GetSiblingName(sLateFile, "E"))
+            # Only the "Early" files that exist...
+            if os.path.exists(sFullPathEarlyRaster):
+                earlyRasterList.append(sFullPathEarlyRaster)
+
+        if len(earlyRasterList) == 0:
+            return
+
+        # Remove the "Early" rasters from the mosaic dataset (by name, minus the .tif extension) - only the ones the
+        # catalog of the mosaic contents says are in there
+        logging.debug("\t\t\tRemoving/deleting {0} corresponding Early raster files.".format(len(earlyRasterList)))
+        catalog = GetMosaicCatalog(mosaicDS)
+        earlyNames = [os.path.splitext(os.path.basename(earlyRaster))[0] for earlyRaster in earlyRasterList]
+        earlyNames = [name for name in earlyNames if catalog.Contains(name)]
+        if len(earlyNames) > 0:
+            GetMosaicBackend(mosaicDS).RemoveRasters(earlyNames)
+            catalog.RemoveRasters(earlyNames)
+        # Delete the physical files
+        DeleteRasterFiles(earlyRasterList)
+        IncrementMetric("replaced_early", len(earlyRasterList))
+        RecordStageTime("cleanup", time_Replace)
 
     except:
         err = capture_exception()
         logging.error(err)
 
 
+def DeleteRasterFiles(rasterList):
+    """
+    Delete the raster files (full paths) passed in along with their sidecar files (i.e. .tif.aux.xml, .tif.ovr,
+    .tif.vat.dbf, .tfw), straight from the file system.  Only for rasters that have already been removed from the mosaic
+    dataset.  Each folder is listed once to find the sidecars (see IMERG_30Min_Retention.GroupRasterFiles()) and the
+    files are deleted (see GetDeleteWorkers()).  Returns the number of rasters whose files were all deleted.
+    """
+    folderRasters = {}
+    for raster in rasterList:
+        folderRasters.setdefault(os.path.dirname(raster), []).append(os.path.basename(raster))
+
+    iDeleted = 0
+    for folder, rasterNames in folderRasters.items():
+        groups = IMERG_30Min_Retention.GroupRasterFiles(os.listdir(folder) if os.path.isdir(folder) else [])
+        deleted, failures = IMERG_30Min_Retention.DeleteRasters(
+            folder, dict((rasterName, groups.get(rasterName, [])) for rasterName in rasterNames), GetDeleteWorkers())
+        for rasterFile, e in failures:
+            logging.warning("\t...Could not delete file {0}. Error = {1}".format(rasterFile, e))
+        iDeleted += len(deleted)
+    return iDeleted
+
+
 def LoadEarlyOrLateRasters(temp_workspace, early_or_late):
     """
     This function accepts a temp workspace (folder) and:
@@ -960,107 +2998,332 @@ def LoadEarlyOrLateRasters(temp_workspace, early_or_late):
         3 - populates certain attributes on each raster after it is loaded to the mosaic dataset
         4 - before loading the raster into the mosaic, if it is a "Late" raster, ensure that it's corresponding
             "Early" raster is first removed from the mosaic dataset and deleted from the source folder.
+    (The actual work is done by the RasterLoader class, which is also used to load files as they are downloaded.)
     """
     try:
-        arcpy.CheckOutExtension("Spatial")
-        # We do not want the zero values and we also do not want the "NoData" value of 29999.
-        # So let's extract only the values above 0 and less than 29999.
-        inSQLClause = "VALUE > 0 AND VALUE < 29999"
-        arcpy.env.workspace = temp_workspace
-        arcpy.env.overwriteOutput = True
+        loader = RasterLoader(temp_workspace, early_or_late)
+        loader.LoadFolder()
+        loader.Finish()
 
-        # Grab some config settings that will be needed...
-        final_RasterSourceFolder = GetConfigString('final_Folder')
-        targetMosaic = os.path.join(GetConfigString('GDBPath'), GetConfigString('mosaicDSName'))
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
-        iCounter = 0
+    except:
+        err = capture_exception()
+        logging.error(err)
+
+
+def LoadStateFile():
+    """
+    Returns the contents of the JSON state file ('state_File' in the config file - information kept between runs, one
+    section per feature) as a dict.  Returns an empty dict if there is no state file yet or it can not be read.
+    """
+    stateFile = GetConfigValue("state_File", "IMERG_30Min_State.json")
+    if not os.path.exists(stateFile):
+        return {}
+    try:
+        with open(stateFile, "r") as f:
+            return json.load(f)
+    except:
+        err = capture_exception()
+        logging.warning("State file {0} could not be read, starting over. Error = {1}".format(stateFile, err))
+        return {}
+
+
+def SaveStateFile(state):
+    """
+    Write the state dict passed in to the JSON state file (via a temp file, so a failed write can not leave a
+    half-written state file behind).
+    """
+    stateFile = GetConfigValue("state_File", "IMERG_30Min_State.json")
+    tmpFile = stateFile + ".tmp"
+    with open(tmpFile, "w") as f:
+        json.dump(state, f)
+    if os.path.exists(stateFile):
+        os.remove(stateFile)
+    os.rename(tmpFile, stateFile)
 
-        # Build attribute name list for updates
+
+def GetMosaicBackend(mosaicDS):
+    """
+    Returns the backend for the operations on the mosaic dataset passed in, read from the config file:
+    'mosaic_Backend' is 'ARCPY' (the mosaic dataset in the GDB, the default) or 'LOCAL' (a SQLite stand-in, kept in
+    'mosaic_LocalFile', that needs no arcpy - for benchmarking the loads).  See IMERG_30Min_Mosaic.py.  The "Name IN
+    (...)" where clauses of the backend hold no more than 'attribute_BatchSize' names each.
+    """
+    global myMosaicBackend
+    if myMosaicBackend is None or myMosaicBackend.mosaicDS != mosaicDS:
         attrNameList = [GetConfigString('rasterTimeProperty'), GetConfigString('rasterStartTimeProperty'),
                         GetConfigString('rasterEndTimeProperty'), GetConfigString('rasterDataAgeProperty')]
+        iBatchSize = max(1, int(GetConfigValue("attribute_BatchSize", 500)))
+        if str(GetConfigValue("mosaic_Backend", "ARCPY")).upper() == "LOCAL":
+            myMosaicBackend = IMERG_30Min_Mosaic.LocalMosaicBackend(
+                mosaicDS, attrNameList, GetConfigValue("mosaic_LocalFile", "IMERG_30Min_LocalMosaic.sqlite"),
+                batch_size=iBatchSize)
+        else:
+            ImportArcpy()
+            myMosaicBackend = IMERG_30Min_Mosaic.ArcpyMosaicBackend(mosaicDS, attrNameList, iBatchSize)
+    return myMosaicBackend
 
-        # List all raster in the temp_workspace
-        rasters = arcpy.ListRasters()
-        for raster in rasters:
-            try:    # raster in rasters
-                logging.debug('\t\tProcessing file: {0}'.format(raster))
-
-                # If this is a "Late" raster, check the final source folder for a corresponding "Early" file.
-                # If found, the "Early" raster needs to be removed from mosaic and the physical file deleted before
-                # processing the "Late" raster.
-                if early_or_late == 'LATE':
-                    CheckEarlyRaster(raster, targetMosaic)
-
-                # Save the file to the final source folder and load it into the mosaic dataset
-                extract = arcpy.sa.ExtractByAttributes(raster, inSQLClause)
-                finalRaster = os.path.join(final_RasterSourceFolder, raster)
-                extract.save(finalRaster)
-                # ----------
-                #  For some reason, the extract is causing the raster attribute table (.tif.vat.dbf file) to be created
-                # which is being locked (with a ...tif.vat.dbf.lock file) as users access the WMS service. The problem
-                # is that the lock file is never released and future updates to the raster are failing. Therefore, here
-                # we will just try to delete the raster attribute table right after it is created.
-                arcpy.DeleteRasterAttributeTable_management(finalRaster)
-                # ----------
-                arcpy.AddRastersToMosaicDataset_management(targetMosaic, "Raster Dataset", finalRaster,
-                                                           "NO_CELL_SIZES", "NO_BOUNDARY", "NO_OVERVIEWS",
-                                                           "2", "#", "#", "#", "#", "NO_SUBFOLDERS",
-                                                           "OVERWRITE_DUPLICATES", "NO_PYRAMIDS",
-                                                           "NO_STATISTICS", "NO_THUMBNAILS",
-                                                           "Add Raster Datasets", "#")
-
-                # If we get here, we have successfully added the raster to the mosaic and saved it to its final
-                # source location, so lets go ahead and remove it from the temp extract folder now...
-                arcpy.Delete_management(raster)
-                iCounter += 1
-
-                try:    # Set Attributes
-                    # Update the attributes on the raster that was just added to the mosaic dataset
-
-                    # Initialize and build attribute expression list
-                    attrExprList = []
-
-                    # Get the raster name minus the .tif extension
-                    rasterName_minusExt = os.path.splitext(raster)[0]
-
-                    # Get the start datetime stamp from the filename
-                    dTimestamp = Get_StartDateTime_FromString(rasterName_minusExt, RegEx_StartDatePattern, Filename_StartDateFormat)
-                    attrExprList.append(dTimestamp)
-
-                    dStartTime = dTimestamp - datetime.timedelta(minutes=15)
-                    attrExprList.append(dStartTime)
-
-                    dEndTime = dTimestamp + datetime.timedelta(minutes=15)
-                    attrExprList.append(dEndTime)
-
-                    attrExprList.append(early_or_late)
-
-                    # wClause = arcpy.AddFieldDelimiters(targetMosaic, "Name") + " = '" + rasterName + "'"
-                    wClause = "Name = '" + rasterName_minusExt + "'"
-
-                    with arcpy.da.UpdateCursor(targetMosaic, attrNameList, wClause) as cursor:
-                        for row in cursor:
-                            for idx in range(len(attrNameList)):
-                                row[idx] = attrExprList[idx]
-                            cursor.updateRow(row)
-
-                    del cursor
-
-                except:  # Set Attributes
-                    err = capture_exception()
-                    logging.warning("\t...Raster attributes not set for raster {0}. Error = {1}".format(raster, err))
 
-            except:   # raster in rasters
-                err = capture_exception()
-                logging.warning('\t...Raster {0} not loaded into mosaic! Error = {1}'.format(raster, err))
+def GetMosaicCatalog(mosaicDS):
+    """
+    Returns the run's MosaicCatalog of the mosaic dataset passed in (read from the GDB on first use).
+    """
+    global myMosaicCatalog
+    if myMosaicCatalog is None or myMosaicCatalog.mosaicDS != mosaicDS:
+        time_Catalog = get_NewStart_Time()
+        myMosaicCatalog = MosaicCatalog(mosaicDS)
+        logging.debug("Read {0} mosaic dataset rows into the catalog in {1}".format(myMosaicCatalog.GetCount(),
+                                                                                   timeElapsed(time_Catalog)))
+    return myMosaicCatalog
+
+
+def GetMosaicStatistics():
+    """
+    Returns the shared MosaicStatistics, loaded from the state file on first use.
+    """
+    global myMosaicStatistics
+    if myMosaicStatistics is None:
+        myMosaicStatistics = MosaicStatistics(LoadStateFile().get("statistics"))
+    return myMosaicStatistics
 
-        del rasters
-        logging.info('{0} {1} files processed for the mosaic dataset.'.format(str(iCounter), early_or_late))
 
+def GetRunMetrics():
+    """
+    Returns the RunMetrics of the current run (created on first use).
+    """
+    global myRunMetrics
+    if myRunMetrics is None:
+        myRunMetrics = RunMetrics()
+    return myRunMetrics
+
+
+def RecordStageTime(stage, timeStart):
+    """
+    Add the time since timeStart (from get_NewStart_Time()) to the stage passed in (see RunMetrics.STAGES).
+    """
+    GetRunMetrics().AddStageTime(stage, time.time() - timeStart)
+
+
+def RecordFileTime(stage, seconds, bAddToStage=False):
+    """
+    Record the seconds one file (or folder listing) took in the stage passed in.  With bAddToStage, the seconds are also
+    added to the stage time (for the stages whose files are handled one after another).
+    """
+    metrics = GetRunMetrics()
+    metrics.AddFileTime(stage, seconds)
+    if bAddToStage:
+        metrics.AddStageTime(stage, seconds)
+
+
+def IncrementMetric(counter, value=1):
+    GetRunMetrics().Increment(counter, value)
+
+
+def WriteRunMetrics(mode, bSuccess):
+    """
+    If 'metrics_File' is set, append the current run's metrics to it (one JSON line per run) and, if 'metrics_PromFile'
+    is set, replace that file with the same metrics in the Prometheus text format (for the node exporter textfile
+    collector).  Both are off by default.  The next run starts with new metrics.
+    """
+    global myRunMetrics
+    metrics = GetRunMetrics()
+    myRunMetrics = None
+    try:
+        metricsFile = GetConfigValue("metrics_File", "")
+        if len(metricsFile) > 0:
+            with open(metricsFile, "a") as f:
+                f.write(json.dumps(metrics.ToRecord(mode, bSuccess), sort_keys=True) + "\n")
+
+        promFile = GetConfigValue("metrics_PromFile", "")
+        if len(promFile) > 0:
+            # Written to a temp file first so the collector never reads a half written file
+            with open(promFile + ".tmp", "w") as f:
+                f.write(metrics.ToPrometheus(mode, bSuccess))
+            if os.path.exists(promFile):
+                os.remove(promFile)
+            os.rename(promFile + ".tmp", promFile)
     except:
         err = capture_exception()
-        logging.error(err)
+        logging.warning("Run metrics not written. Error = {0}".format(err))
+
+
+def GetRasterPixelStats(raster):
+    """
+    Returns the IMERG_30Min_Transform.PixelStats of the valid (not NoData) pixels in the raster passed in.
+    """
+    noDataValue = arcpy.Raster(raster).noDataValue
+    array = arcpy.RasterToNumPyArray(raster, nodata_to_value=noDataValue)
+    return ImportTransform().GetPixelStats(array, noDataValue)
+
+
+def UpdateMosaicStatistics(mosaicDS):
+    """
+    Bring the statistics of the mosaic dataset up to date.  Unless 'stats_Incremental' is turned on, this is a full
+    CalculateStatistics (of the mosaicked image) on every run.  Otherwise the full recalculation only runs on a schedule
+    (every 'stats_FullRecalcHours') or when the data has drifted: the statistics recorded for each raster as it was
+    loaded (see MosaicStatistics) are merged, and compared with the merged statistics at the last recalculation.  When
+    the min, max, mean or std. dev. has moved by more than 'stats_MaxDrift' of the (min to max) range, the statistics
+    are recalculated.  The statistics set on the mosaic dataset are always the ones CalculateStatistics works out, so
+    the stretch of the service means the same thing from one run to the next.
+    Rasters loaded before the statistics were being recorded have theirs read from the source rasters, up to
+    'stats_SeedBatchSize' of them per run.  Until every raster has statistics there is no drift to measure, so only the
+    schedule applies.
+    """
+    if not GetConfigFlag("stats_Incremental", False) or ImportTransform().numpy is None:
+        logging.info("Calculating statistics...")
+        arcpy.CalculateStatistics_management(mosaicDS, "1", "1", "#", "OVERWRITE", "#")
+        return
+
+    mosaicStats = GetMosaicStatistics()
+    missingNames = mosaicStats.Reconcile(GetMosaicCatalog(mosaicDS).names)
+
+    # Fill in the statistics of rasters that were loaded before the statistics were being recorded (a batch per run)
+    iMissing = len(missingNames)
+    if iMissing > 0:
+        finalFolder = GetConfigString("final_Folder")
+        timeSeed = get_NewStart_Time()
+        for name in missingNames[:max(1, int(GetConfigValue("stats_SeedBatchSize", 200)))]:
+            try:
+                mosaicStats.AddRaster(name, GetRasterPixelStats(os.path.join(finalFolder, name + ".tif")))
+                iMissing -= 1
+            except:
+                err = capture_exception()
+                logging.warning("\t...No statistics for raster {0}. Error = {1}".format(name, err))
+        logging.info("Statistics read for {0} rasters loaded before they were recorded in {1}.".format(
+                     len(missingNames) - iMissing, timeElapsed(timeSeed)))
+
+    oNow = datetime.datetime.now()
+    summary = mosaicStats.GetSummary() if iMissing == 0 else None
+    hours = mosaicStats.GetHoursSinceRecalculated(oNow)
+    drift = mosaicStats.GetDrift(summary)
+    if hours is None or hours >= float(GetConfigValue("stats_FullRecalcHours", 24)):
+        reason = "scheduled"
+    elif summary is not None and drift is None:
+        reason = "no merged statistics to compare with"
+    elif drift is not None and drift > float(GetConfigValue("stats_MaxDrift", 0.1)):
+        reason = "drift of {0:.3f}".format(drift)
+    else:
+        reason = None
+
+    if reason is not None:
+        logging.info("Calculating statistics ({0})...".format(reason))
+        arcpy.CalculateStatistics_management(mosaicDS, "1", "1", "#", "OVERWRITE", "#")
+        mosaicStats.Recalculated(oNow, summary)
+    elif iMissing > 0:
+        logging.info("Statistics not recalculated ({0:.1f} hours since the last time) - {1} rasters still have no "
+                     "statistics recorded.".format(hours, iMissing))
+    else:
+        logging.info("Statistics not recalculated ({0:.1f} hours since the last time, drift of {1:.3f}).".format(
+                     hours, drift))
+
+    state = LoadStateFile()
+    state["statistics"] = mosaicStats.ToState()
+    SaveStateFile(state)
+
+
+def GetFolderSize(folder):
+    """
+    Returns the total size (in bytes) of all of the files in the folder passed in (i.e. a file geodatabase).
+    """
+    iSize = 0
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            try:
+                iSize += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass    # i.e. a lock file that has just gone away
+    return iSize
+
+
+def GetOffPeakWindow():
+    """
+    Returns the 'compact_OffPeakHours' window, a 'start-end' string of hours in the config file (i.e. '1-4' or '22-3'),
+    as a (start hour, end hour) tuple.  Returns None if it is not set, or if it is not a valid window (which is logged
+    as a warning, so a typo does not stop the run).
+    """
+    hourWindow = str(GetConfigValue("compact_OffPeakHours", "")).strip()
+    if len(hourWindow) == 0:
+        return None
+    try:
+        iStart, iEnd = [int(hour) for hour in hourWindow.split("-")]
+        if not (0 <= iStart <= 23 and 0 <= iEnd <= 24):
+            raise ValueError("hours must be between 0 and 24")
+    except ValueError:
+        err = capture_exception()
+        logging.warning("compact_OffPeakHours '{0}' is not a valid 'start-end' window of hours, so there is no "
+                        "off-peak window. Error = {1}".format(hourWindow, err))
+        return None
+    return iStart, iEnd
+
+
+def IsInHourWindow(hourWindow, iHour):
+    """
+    Returns True if the hour passed in (0-23) falls in the (start hour, end hour) window passed in (see
+    GetOffPeakWindow()), i.e. (1, 4) for 1:00 up to 4:00 or (22, 3) over midnight.  No window (None) is never matched.
+    """
+    if hourWindow is None:
+        return False
+    iStart, iEnd = hourWindow
+    if iStart <= iEnd:
+        return iStart <= iHour < iEnd
+    return iHour >= iStart or iHour < iEnd
+
+
+def CompactGeodatabase(gdbPath):
+    """
+    Compact the file geodatabase, if it is due.  Unless 'compact_Conditional' is turned on, it is compacted on every
+    run.  Otherwise it is only compacted when:
+        - its size has grown by more than 'compact_GrowthThreshold' (a fraction) since the last compact (or there has
+          never been one), or
+        - the run falls in the 'compact_OffPeakHours' window (i.e. '1-4'), the size has changed since the last compact
+          and it has not already been compacted within the last 'compact_MinHours'.
+    Each decision (with the sizes and how long the compact took) is recorded in the "compact" section of the state file.
+    """
+    if not GetConfigFlag("compact_Conditional", False):
+        logging.info("Compacting file geodatabase...")
+        arcpy.Compact_management(gdbPath)
+        return
+
+    offPeakWindow = GetOffPeakWindow()
+    state = LoadStateFile()
+    compactState = state.get("compact", {})
+    oNow = datetime.datetime.now()
+    iSize = GetFolderSize(gdbPath)
+    iSizeAfterCompact = compactState.get("sizeAfterCompact", 0)
+    growth = (iSize - iSizeAfterCompact) / float(iSizeAfterCompact) if iSizeAfterCompact > 0 else None
+    hoursSinceCompact = None
+    if len(compactState.get("lastCompact", "")) > 0:
+        oLast = datetime.datetime.strptime(compactState["lastCompact"], MosaicStatistics.DATE_FORMAT)
+        hoursSinceCompact = (oNow - oLast).total_seconds() / 3600.0
+
+    reason = None
+    if growth is None:
+        reason = "no compact on record"
+    elif growth > float(GetConfigValue("compact_GrowthThreshold", 0.2)):
+        reason = "size grew {0:.1%} since the last compact".format(growth)
+    elif IsInHourWindow(offPeakWindow, oNow.hour) and iSize != iSizeAfterCompact and \
+            (hoursSinceCompact is None or hoursSinceCompact >= float(GetConfigValue("compact_MinHours", 12))):
+        reason = "off-peak window"
+
+    decision = {"time": oNow.strftime(MosaicStatistics.DATE_FORMAT), "sizeBefore": iSize,
+                "growth": growth, "compacted": reason is not None, "reason": reason or "not due"}
+    if reason is not None:
+        logging.info("Compacting file geodatabase ({0})...".format(reason))
+        time_Compact = get_NewStart_Time()
+        arcpy.Compact_management(gdbPath)
+        decision["seconds"] = round(time.time() - time_Compact, 1)
+        decision["sizeAfter"] = GetFolderSize(gdbPath)
+        compactState["lastCompact"] = decision["time"]
+        compactState["sizeAfterCompact"] = decision["sizeAfter"]
+        logging.info("Compacted file geodatabase from {0:.1f} MB to {1:.1f} MB in {2} seconds.".format(
+                     iSize / 1048576.0, decision["sizeAfter"] / 1048576.0, decision["seconds"]))
+    else:
+        logging.info("Skipping the compact - not due (size {0:.1f} MB, {1:.1%} growth since the last compact).".format(
+                     iSize / 1048576.0, growth))
+
+    # Keep the most recent decisions, for checking how often the compact runs (and how long it takes)
+    compactState["history"] = (compactState.get("history", []) + [decision])[-50:]
+    state["compact"] = compactState
+    SaveStateFile(state)
 
 
 def refreshService(clsSvc):
@@ -1118,140 +3381,395 @@ def refreshService(clsSvc):
         logging.error("### ERROR ### - Start Service failed for " + clsSvc.svcName + ", System Error Message: " + str(e))
 
 
-def main():
+def GetMonthFolders(baseFolder, oFromDateTime, oToDateTime):
+    """
+    Returns the <baseFolder>/<year>/<month> FTP folders from the month of oFromDateTime up to the month of oToDateTime.
+    """
+    folders = []
+    iYear = oFromDateTime.year
+    iMonth = oFromDateTime.month
+    while (iYear, iMonth) <= (oToDateTime.year, oToDateTime.month):
+        folders.append(baseFolder + "/" + str(iYear) + "/" + str(iMonth).zfill(2))
+        iMonth += 1
+        if iMonth > 12:
+            iYear += 1
+            iMonth = 1
+    return folders
+
+
+def GetPlanManifest():
+    """
+    For --plan: returns the listing manifest opened read-only, or None if it has been turned off or does not exist yet
+    (opening it would create it).
+    """
+    dbFile = GetConfigValue("manifest_File", "")
+    if len(dbFile) == 0 or not os.path.isfile(dbFile):
+        return None
+    return ListingManifest(dbFile, True)
+
+
+def PlanFilesToDownload(manifest, ftpFolder, product, oAfterDateTime, oUpToDateTime, maxAgeSeconds):
+    """
+    For --plan: returns the names SelectFilesToDownload() would pick from the FTP folder passed in, or None if the
+    folder could not be listed.  If the (read-only) manifest has a listing of the folder that is no older than
+    maxAgeSeconds, the names come straight from the manifest (no request to the proxy site); otherwise the folder is
+    listed and its new names are picked along with the ones the manifest still has to download - without recording
+    anything in the manifest.
+    """
+    if manifest is not None:
+        listingAge = manifest.GetListingAge(ftpFolder)
+        if listingAge is not None and listingAge <= maxAgeSeconds:
+            return manifest.GetCandidates(ftpFolder, product, oAfterDateTime, oUpToDateTime)
+    ftpDirectory = "ftp://" + GetConfigString("ftp_host") + ftpFolder + "/"  # last slash is required
+    sListing = ListFolder(lambda: GetProxySession().GetDirectoryListing(ftpDirectory), ftpFolder)
+    if sListing is None:
+        return None
+    names = sListing.split(",")
+    if manifest is None:
+        return ParseListedNames(names, product, oAfterDateTime, oUpToDateTime)[1]
+    records, selectedList = ParseListedNames(manifest.GetNewNames(ftpFolder, names), product, oAfterDateTime,
+                                             oUpToDateTime)
+    return sorted(set(selectedList + manifest.GetCandidates(ftpFolder, product, oAfterDateTime, oUpToDateTime)))
+
+
+def PrintPlanList(title, names):
+    print("{0}: {1}".format(title, len(names)))
+    for name in names:
+        print("    " + name)
+
+
+def PlanRun():
+    """
+    --plan (--dry-run): only do the remote discovery, and print what a run would download, load and delete.  Nothing
+    is downloaded, loaded or deleted, and the listing manifest is only read.  arcpy is only imported if the manifest
+    does not know the latest Late/Early files loaded, and folders listed by a run less than 'plan_ListingMaxAgeSeconds'
+    ago are answered from the manifest, so a plan right after a run takes a fraction of a second.  A folder that can
+    not be listed is reported and the plan carries on with the others.
+    """
+    manifest = None
     try:
+        time_Plan = get_NewStart_Time()
+        DateTimeFormat = GetConfigString("GDB_DateFormat")
+        o_today_DateTime = datetime.datetime.strptime(datetime.datetime.now().strftime(DateTimeFormat), DateTimeFormat)
+        maxAgeSeconds = float(GetConfigValue("plan_ListingMaxAgeSeconds", 900))
+        GDB_mosaic = os.path.join(GetConfigString("GDBPath"), GetConfigString("mosaicDSName"))
+        sourceFolder = GetConfigString("final_Folder")
+        manifest = GetPlanManifest()
+
+        # The latest Late/Early files loaded - from the manifest if it has recorded any, otherwise from the GDB
+        latestDates = {}
+        for early_or_late in ("LATE", "EARLY"):
+            oLatest = manifest.GetLatestLoaded(early_or_late[0]) if manifest is not None else None
+            if oLatest is None:
+                oLatest = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, early_or_late)
+                if oLatest is None:
+                    logging.error("Plan: could not get the latest {0} date.".format(early_or_late))
+                    return
+            latestDates[early_or_late] = oLatest
+
+        # The files already in the extract folders (from a run that did not finish) are loaded along with the new ones
+        lateExtracted = sorted(os.path.basename(f) for f in
+                               glob.glob(os.path.join(GetConfigString("extract_LateFolder"), "*.tif")))
+        earlyExtracted = sorted(os.path.basename(f) for f in
+                                glob.glob(os.path.join(GetConfigString("extract_EarlyFolder"), "*.tif")))
+
+        # Late files newer than the latest Late file loaded
+        lateDownloads = []
+        unlistedFolders = []
+        for ftpFolder in GetMonthFolders(GetConfigString("ftp_baseLateFolder"), latestDates["LATE"],
+                                         o_today_DateTime):
+            names = PlanFilesToDownload(manifest, ftpFolder, "L", latestDates["LATE"], o_today_DateTime, maxAgeSeconds)
+            if names is None:
+                unlistedFolders.append(ftpFolder)
+            else:
+                lateDownloads += names
+
+        # Early files newer than both the latest Early file loaded and the latest Late file after the Late stage
+        oEarlyAfter = max(latestDates["LATE"], latestDates["EARLY"])
+        for lateFile in lateDownloads + lateExtracted:
+            oStart = IMERG_30Min_Filename.GetStartDateTime(lateFile)
+            if oStart is not None and oStart > oEarlyAfter:
+                oEarlyAfter = oStart
+        earlyDownloads = []
+        for ftpFolder in GetMonthFolders(GetConfigString("ftp_baseEarlyFolder"), oEarlyAfter, o_today_DateTime):
+            names = PlanFilesToDownload(manifest, ftpFolder, "E", oEarlyAfter, o_today_DateTime, maxAgeSeconds)
+            if names is None:
+                unlistedFolders.append(ftpFolder)
+            else:
+                earlyDownloads += names
+
+        # The Early rasters that the new Late rasters replace (see ReplaceEarlyRasters())
+        earlyReplaced = []
+        for lateFile in lateDownloads + lateExtracted:
+            sEarlyFile = IMERG_30Min_Filename.GetSiblingName(lateFile, "E")
+            if sEarlyFile is not None and os.path.exists(os.path.join(sourceFolder, sEarlyFile)):
+                earlyReplaced.append(sEarlyFile)
+
+        # The rasters older than the days we keep (see deleteOutOfDateRasters())
+        numDays = int(GetConfigString("DaysToKeepRasters"))
+        oKeepDate = (datetime.datetime.now() - datetime.timedelta(days=numDays)).date()
+        outOfDate = sorted(IMERG_30Min_Retention.PlanRetention(sourceFolder, oKeepDate).expired)
+
+        print("Plan (nothing has been changed) - latest Late: {0}, latest Early: {1}".format(latestDates["LATE"],
+                                                                                           latestDates["EARLY"]))
+        PrintPlanList("Late files to download", lateDownloads)
+        PrintPlanList("Early files to download", earlyDownloads)
+        PrintPlanList("Files already downloaded, to load", lateExtracted + earlyExtracted)
+        PrintPlanList("Early rasters to replace with their Late siblings", earlyReplaced)
+        PrintPlanList("Out of date rasters to delete (timestamp before {0})".format(oKeepDate), outOfDate)
+        if len(unlistedFolders) > 0:
+            PrintPlanList("Folders that could not be listed (their files are missing from this plan)", unlistedFolders)
+        logging.info("Plan: {0} Late and {1} Early files to download, {2} to load, {3} Early rasters to replace, "
+                     "{4} rasters to delete.".format(len(lateDownloads), len(earlyDownloads),
+                                                     len(lateExtracted) + len(earlyExtracted), len(earlyReplaced),
+                                                     len(outOfDate)))
+        logging.info("\t=== PERFORMANCE ===>: Plan took: " + get_Elapsed_Time_As_String(time_Plan))
 
-        # Setup any required and/or optional arguments to be passed in.
-        args = setupArgs()
+    except:
+        err = capture_exception()
+        logging.error(err)
+    finally:
+        CloseProxySession()
+        if manifest is not None:
+            manifest.close()
 
-        # Check if the user passed in a log level argument, either DEBUG, INFO, or WARNING. Otherwise, default to INFO.
-        if args.logging:
-            log_level = args.logging
-        else:
-            log_level = "INFO"    # Available values are: DEBUG, INFO, WARNING, ERROR
 
-        # Setup logfile
-        logDir = GetConfigString("logFileDir")
-        logPrefix = GetConfigString("logFilePrefix")
-        logFilename = logPrefix + "_" + datetime.date.today().strftime('%Y-%m-%d') + '.log'
-        FullLogFile = os.path.join(logDir, logFilename)
-        logging.basicConfig(filename=FullLogFile,
-                            level=log_level,
-                            format='%(asctime)s: %(levelname)s --- %(message)s',
-                            datefmt='%m/%d/%Y %I:%M:%S %p')
+def SetupLogFile(log_level):
+    """
+    Point the logging at today's log file.  The daemon calls this again whenever the date changes.
+    """
+    logDir = GetConfigString("logFileDir")
+    logPrefix = GetConfigString("logFilePrefix")
+    logFilename = logPrefix + "_" + datetime.date.today().strftime('%Y-%m-%d') + '.log'
+    FullLogFile = os.path.join(logDir, logFilename)
+    # (basicConfig() does nothing if the root logger already has a handler, so drop the previous day's file first)
+    rootLogger = logging.getLogger()
+    for handler in rootLogger.handlers[:]:
+        rootLogger.removeHandler(handler)
+        handler.close()
+    logging.basicConfig(filename=FullLogFile,
+                        level=log_level,
+                        format='%(asctime)s: %(levelname)s --- %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p')
+
+
+def RunDaemon(args, log_level):
+    """
+    Daemon/watch mode (--daemon): instead of a cold start from the scheduler for every run, keep this process (arcpy,
+    the config, the Spatial Analyst extension and the catalog of the mosaic contents) running and poll the ftp folders
+    every 'daemon_PollSeconds', plus or minus a random 'daemon_JitterSeconds' (so several servers do not poll in
+    step).  Cycles that find nothing new skip the maintenance and service refresh (see RunETL()).  The log file
+    rolls over, and the mosaic dataset is re-read, once a day.  The proxy session (and its keep-alive connections) is
+    kept from one cycle to the next and only closed when the loop exits.  Runs until the process is stopped.
+    """
+    global myMosaicCatalog
+    pollSeconds = float(GetConfigValue("daemon_PollSeconds", 300))
+    jitterSeconds = float(GetConfigValue("daemon_JitterSeconds", 30))
+    ImportArcpy()
+    arcpy.CheckOutExtension("Spatial")
+    logging.info("Daemon mode: polling every {0:.0f} (+/- {1:.0f}) seconds.".format(pollSeconds, jitterSeconds))
+
+    oLogDate = datetime.date.today()
+    try:
+        while True:
+            RunETL(args, True)
+
+            sleepSeconds = max(1.0, pollSeconds + random.uniform(-jitterSeconds, jitterSeconds))
+            logging.info("Daemon mode: next cycle in {0:.0f} seconds.".format(sleepSeconds))
+            time.sleep(sleepSeconds)
+
+            if datetime.date.today() != oLogDate:
+                oLogDate = datetime.date.today()
+                SetupLogFile(log_level)
+                # Pick up any changes made to the mosaic dataset outside of this process
+                myMosaicCatalog = None
+    finally:
+        CloseProxySession()
+
+
+def RunETL(args, bDaemonMode=False):
+    """
+    One run of the ETL: process the new Late and Early files (or the --backfill), remove the out of date rasters,
+    maintain the geodatabase and refresh the services.  In daemon mode, a run that did not add or remove any rasters
+    skips the maintenance and the service refresh.  The stage timings and counters are written by WriteRunMetrics().
+    Whichever way the run ends, the pipeline loaders are finished (so the rasters already downloaded are still added to
+    the mosaic, and their transform pools closed) and the proxy session and listing manifest are closed.
+    """
+    bSuccess = False
+    lateLoader = None
+    earlyLoader = None
+    try:
 
         logging.info('======================= SESSION START ==========================================================')
         logging.info("\t\t\t" + getScriptName())
 
         # Get a start time for the entire script run process.
         time_TotalScriptRun = get_NewStart_Time()
+        ImportArcpy()
+        GetFetchPolicy().StartRun()
 
         # Get datetime for right now
         GDB_mosaic = os.path.join(GetConfigString("GDBPath"), GetConfigString("mosaicDSName"))
         DateTimeFormat = GetConfigString("GDB_DateFormat")
         o_today_DateTime = datetime.datetime.strptime(datetime.datetime.now().strftime(DateTimeFormat), DateTimeFormat)
+        bPipelineMode = GetConfigFlag("pipeline_Mode", False)
+        iStartChangeCount = GetMosaicCatalog(GDB_mosaic).changeCount
 
         # ########################################################
-        # Process LATE Files
+        # Backfill mode - only fetch the slots missing from the mosaic (instead of the Late and Early processing)
         # ########################################################
-        logging.info("-----------------------------------------")
-        logging.info("Processing Late Files from FTP (proxy)...")
-        logging.info("-----------------------------------------")
-
-        # Grab a timer reference
-        time_LateProcess = get_NewStart_Time()
-
-        # -----------------
-        # Get date from GDB
-        # -----------------
-        # Get the "late" datetime values from rasters in the GDB
-        o_lastLate_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "LATE")
-
-        # Create the Late Extract folders
-        lateExtractFolder = GetConfigString("extract_LateFolder")
-        if not create_folder(lateExtractFolder):
-            logging.error("Could not create folder: {0}. Try to create manually and run again!".format(lateExtractFolder))
-            return
-
-        # ---------------
-        # Do the FTP work
-        # ---------------
-        # Find and process a list of "Late" 30 Min rasters available from the FTP site whose
-        # timestamp is later than the last "Late" Date from the GDB
-        logging.info("...between dates {0} and {1}".format(o_lastLate_DateTime.strftime('%m/%d/%Y %I:%M:%S %p'),
-                                                           o_today_DateTime.strftime('%m/%d/%Y %I:%M:%S %p')))
-        # bGoodSoFar = ProcessLateFiles(o_today_DateTime, o_lastLate_DateTime)
-        bGoodSoFar = ProcessLateFiles_FromProxy(o_today_DateTime, o_lastLate_DateTime)
-        if not bGoodSoFar:
-            logging.error("General Status: ProcessLateFiles_FromProxy() returned an invalid status code.")
-            return
-
-        # ----------------------
-        # Load Rasters to Mosaic
-        # ----------------------
-        # At this point, all "Late" raster files should be downloaded from the FTP site into the "Late" extract folder
-        # and be ready to load into the mosaic dataset.
-        logging.info("Loading any LATE rasters to the mosaic dataset...")
-        LoadEarlyOrLateRasters(lateExtractFolder, "LATE")
-        logging.info("\t=== PERFORMANCE ===>: ProcessingLateFiles took: " +
-                     get_Elapsed_Time_As_String(time_LateProcess))
-
-        # #########################################################
-        # Process EARLY Files
-        # #########################################################
-        # Note - We only want to add any Early rasters to the GDB that are dated "later" than the last "Late" entry in
-        # the GDB as it exists right now!
-        logging.info("------------------------------------------")
-        logging.info("Processing EARLY Files from FTP (proxy)...")
-        logging.info("------------------------------------------")
-
-        # Grab a timer reference
-        time_EarlyProcess = get_NewStart_Time()
-
-        # -----------------------------------
-        # Get the latest "Late" date from GDB ... AGAIN
-        # -----------------------------------
-        # Note that we just got through adding new "late" rasters to the GDB, so we
-        # need to grab the latest "Late" date again!!!
-        o_newestLastLate_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "LATE")
-
-        # ----------------------------------------------
-        # Also, get the latest "Early" date from the GDB
-        # ----------------------------------------------
-        # Note that we just got through adding new "late" rasters to the GDB, so we
-        # need to grab the latest "Late" date again!!!
-        o_lastEarly_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "EARLY")
-
-        # Create the Early Extract folders
-        earlyExtractFolder = GetConfigString("extract_EarlyFolder")
-        if not create_folder(earlyExtractFolder):
-            logging.error("Could not create folder: {0}. Try to create manually and run again!".format(
-                                                            earlyExtractFolder))
-            return
-
-        # ---------------
-        # Do the FTP work
-        # ---------------
-        # Find and process a list of "Early" 30 Min rasters available from the FTP site whose
-        # timestamp is later than the last "Late" Date from the GDB and has not already been processed into the GDB.
-        logging.info("...between dates {0} and {1} AND that have not already been added to the GDB.".format(
+        if args.backfill:
+            logging.info("---------------------------------------------")
+            logging.info("Backfilling missing slots from FTP (proxy)...")
+            logging.info("---------------------------------------------")
+            time_BackfillProcess = get_NewStart_Time()
+            if not Backfill(GDB_mosaic):
+                logging.error("General Status: Backfill() returned an invalid status code.")
+                return
+            logging.info("\t=== PERFORMANCE ===>: Backfill took: " + get_Elapsed_Time_As_String(time_BackfillProcess))
+
+        # The regular run - fetch the files newer than the latest Late/Early timestamps in the mosaic
+        if not args.backfill:
+            # ########################################################
+            # Process LATE Files
+            # ########################################################
+            logging.info("-----------------------------------------")
+            logging.info("Processing Late Files from FTP (proxy)...")
+            logging.info("-----------------------------------------")
+
+            # Grab a timer reference
+            time_LateProcess = get_NewStart_Time()
+
+            # -----------------
+            # Get date from GDB
+            # -----------------
+            # Get the "late" datetime values from rasters in the GDB
+            o_lastLate_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "LATE")
+
+            # Create the Late Extract folders
+            lateExtractFolder = GetConfigString("extract_LateFolder")
+            if not create_folder(lateExtractFolder):
+                logging.error("Could not create folder: {0}. Try to create manually and run again!".format(
+                                                                lateExtractFolder))
+                return
+
+            # After an outage, work through the backlog a window at a time first (only in catch-up mode)
+            o_lastLate_DateTime = CatchUpInWindows("LATE", o_lastLate_DateTime, o_today_DateTime, lateExtractFolder,
+                                                   lambda oStart, oEnd, loadFunction:
+                                                   ProcessLateFiles_FromProxy(oEnd, oStart, loadFunction))
+            if o_lastLate_DateTime is None:
+                logging.error("General Status: CatchUpInWindows() returned an invalid status code.")
+                return
+
+            # ---------------
+            # Do the FTP work
+            # ---------------
+            # Find and process a list of "Late" 30 Min rasters available from the FTP site whose
+            # timestamp is later than the last "Late" Date from the GDB
+            logging.info("...between dates {0} and {1}".format(o_lastLate_DateTime.strftime('%m/%d/%Y %I:%M:%S %p'),
+                                                               o_today_DateTime.strftime('%m/%d/%Y %I:%M:%S %p')))
+            # In "pipeline" mode, each file is loaded to the mosaic as soon as it has been downloaded (while the rest of
+            # the files are still downloading) instead of waiting for all of the downloads to finish.
+            if bPipelineMode:
+                logging.info("Pipeline mode: loading LATE rasters to the mosaic dataset as they are downloaded...")
+                lateLoader = RasterLoader(lateExtractFolder, "LATE")
+            # bGoodSoFar = ProcessLateFiles(o_today_DateTime, o_lastLate_DateTime)
+            bGoodSoFar = ProcessLateFiles_FromProxy(o_today_DateTime, o_lastLate_DateTime,
+                                                    lateLoader.LoadRaster if lateLoader is not None else None)
+            if not bGoodSoFar:
+                logging.error("General Status: ProcessLateFiles_FromProxy() returned an invalid status code.")
+                return
+
+            # ----------------------
+            # Load Rasters to Mosaic
+            # ----------------------
+            # At this point, all "Late" raster files should be downloaded from the FTP site into the "Late" extract
+            # folder and be ready to load into the mosaic dataset. (In pipeline mode, only files left over in the
+            # extract folder, i.e. from an earlier run, still need to be loaded.)
+            logging.info("Loading any LATE rasters to the mosaic dataset...")
+            if lateLoader is not None:
+                lateLoader.LoadFolder()
+                lateLoader.Finish()
+            else:
+                LoadEarlyOrLateRasters(lateExtractFolder, "LATE")
+            logging.info("\t=== PERFORMANCE ===>: ProcessingLateFiles took: " +
+                         get_Elapsed_Time_As_String(time_LateProcess))
+
+            # #########################################################
+            # Process EARLY Files
+            # #########################################################
+            # Note - We only want to add any Early rasters to the GDB that are dated "later" than the last "Late" entry
+            # in the GDB as it exists right now!
+            logging.info("------------------------------------------")
+            logging.info("Processing EARLY Files from FTP (proxy)...")
+            logging.info("------------------------------------------")
+
+            # Grab a timer reference
+            time_EarlyProcess = get_NewStart_Time()
+
+            # -----------------------------------
+            # Get the latest "Late" date from GDB ... AGAIN
+            # -----------------------------------
+            # Note that we just got through adding new "late" rasters to the GDB, so we
+            # need to grab the latest "Late" date again!!!
+            o_newestLastLate_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "LATE")
+
+            # ----------------------------------------------
+            # Also, get the latest "Early" date from the GDB
+            # ----------------------------------------------
+            # Note that we just got through adding new "late" rasters to the GDB, so we
+            # need to grab the latest "Late" date again!!!
+            o_lastEarly_DateTime = GetLatest_EarlyOrLateDate_fromMosaicDataset(GDB_mosaic, "EARLY")
+
+            # Create the Early Extract folders
+            earlyExtractFolder = GetConfigString("extract_EarlyFolder")
+            if not create_folder(earlyExtractFolder):
+                logging.error("Could not create folder: {0}. Try to create manually and run again!".format(
+                                                                earlyExtractFolder))
+                return
+
+            # After an outage, work through the backlog a window at a time first (only in catch-up mode).  No Early
+            # files earlier than the latest Late file, so each window is also the Late date for the Early selection.
+            o_lastEarly_DateTime = CatchUpInWindows("EARLY", max(o_newestLastLate_DateTime, o_lastEarly_DateTime),
+                                                    o_today_DateTime, earlyExtractFolder,
+                                                    lambda oStart, oEnd, loadFunction:
+                                                    ProcessEarlyFiles_FromProxy(oStart, oEnd, oStart, loadFunction))
+            if o_lastEarly_DateTime is None:
+                logging.error("General Status: CatchUpInWindows() returned an invalid status code.")
+                return
+
+            # ---------------
+            # Do the FTP work
+            # ---------------
+            # Find and process a list of "Early" 30 Min rasters available from the FTP site whose
+            # timestamp is later than the last "Late" Date from the GDB and has not already been processed into the GDB.
+            logging.info("...between dates {0} and {1} AND that have not already been added to the GDB.".format(
                                                             o_newestLastLate_DateTime.strftime('%m/%d/%Y %I:%M:%S %p'),
                                                             o_today_DateTime.strftime('%m/%d/%Y %I:%M:%S %p')))
-        # bGoodSoFar = ProcessEarlyFiles(o_newestLastLate_DateTime, o_today_DateTime, o_lastEarly_DateTime)
-        bGoodSoFar = ProcessEarlyFiles_FromProxy(o_newestLastLate_DateTime, o_today_DateTime, o_lastEarly_DateTime)
-        if not bGoodSoFar:
-            logging.error("General Status: ProcessEarlyFiles_FromProxy() returned an invalid status code.")
-            return
-
-        # ----------------------
-        # Load Rasters to Mosaic
-        # ----------------------
-        # At this point, all "Early" raster files should be downloaded from the FTP site into the "Early" extract folder
-        # and be ready to load into the mosaic dataset.
-        logging.info("Loading any EARLY rasters to the mosaic dataset...")
-        LoadEarlyOrLateRasters(earlyExtractFolder, "EARLY")
-        logging.info("\t=== PERFORMANCE ===>: ProcessingEarlyFiles took: " +
-                     get_Elapsed_Time_As_String(time_EarlyProcess))
+            if bPipelineMode:
+                logging.info("Pipeline mode: loading EARLY rasters to the mosaic dataset as they are downloaded...")
+                earlyLoader = RasterLoader(earlyExtractFolder, "EARLY")
+            # bGoodSoFar = ProcessEarlyFiles(o_newestLastLate_DateTime, o_today_DateTime, o_lastEarly_DateTime)
+            bGoodSoFar = ProcessEarlyFiles_FromProxy(o_newestLastLate_DateTime, o_today_DateTime, o_lastEarly_DateTime,
+                                                     earlyLoader.LoadRaster if earlyLoader is not None else None)
+            if not bGoodSoFar:
+                logging.error("General Status: ProcessEarlyFiles_FromProxy() returned an invalid status code.")
+                return
+
+            # ----------------------
+            # Load Rasters to Mosaic
+            # ----------------------
+            # At this point, all "Early" raster files should be downloaded from the FTP site into the "Early" extract
+            # folder and be ready to load into the mosaic dataset. (In pipeline mode, only left over files still need
+            # loading.)
+            logging.info("Loading any EARLY rasters to the mosaic dataset...")
+            if earlyLoader is not None:
+                earlyLoader.LoadFolder()
+                earlyLoader.Finish()
+            else:
+                LoadEarlyOrLateRasters(earlyExtractFolder, "EARLY")
+            logging.info("\t=== PERFORMANCE ===>: ProcessingEarlyFiles took: " +
+                         get_Elapsed_Time_As_String(time_EarlyProcess))
 
         # ###########################################################################
         # Remove rasters from the mosaic dataset that are older than we want to keep.
@@ -1270,6 +3788,8 @@ def main():
         initialCount = GetRasterDatasetCount(GDB_mosaic)
         deleteOutOfDateRasters(GDB_mosaic, mosaicSourceFolder)
         finalCount = GetRasterDatasetCount(GDB_mosaic)
+        RecordStageTime("cleanup", time_CleanupProcess)
+        IncrementMetric("removed_out_of_date", initialCount - finalCount)
 
         # Report the difference in the number of raster mosaic records!
         logging.info("Removed {0} raster entries from mosaic dataset!".format(str(initialCount - finalCount)))
@@ -1277,68 +3797,75 @@ def main():
         logging.info("\t=== PERFORMANCE ===>: DeleteOutOfDateRasters took: " +
                      get_Elapsed_Time_As_String(time_CleanupProcess))
 
-        # #########################################################################
-        # Perform maintenance on the file geodatabase. i.e. Calc stats and compact.
-        # #########################################################################
-        logging.info("-------------------------------------")
-        logging.info("Performing geodatabase maintenance...")
-        logging.info("-------------------------------------")
-
-        # Grab a timer reference
-        time_GDBMaintenanceProcess = get_NewStart_Time()
-
-        # Do some routine maintenance on the GDB mosaic...
-        logging.info("Calculating statistics...")
-        arcpy.CalculateStatistics_management(GDB_mosaic, "1", "1", "#", "OVERWRITE", "#")
-        logging.info("Compacting file geodatabase...")
-        arcpy.Compact_management(GetConfigString("GDBPath"))
-        logging.info("\t=== PERFORMANCE ===>: GDB Maintenance (Calc Stats and Compact) took: " +
-                     get_Elapsed_Time_As_String(time_GDBMaintenanceProcess))
-
-        # #######################################
-        # Refresh the service!
-        # #######################################
-        logging.info("-----------------------------")
-        logging.info("Refreshing the WMS service...")
-        logging.info("-----------------------------")
-
-        # Grab a timer reference
-        time_RefreshServiceProcess = get_NewStart_Time()
-
-        logging.info("Refreshing the services...")
-
-        imgSvc = MapService()
-        imgSvc.adminURL = GetConfigString('svc_adminURL')
-        imgSvc.username = GetConfigString('svc_username')
-        imgSvc.password = GetConfigString('svc_password')
-        imgSvc.folder = GetConfigString('svc_folder')
-        imgSvc.svcType = 'ImageServer'
-        imgSvc.svcName = GetConfigString('ImageSvc_Name')
-
-        mapSvc = MapService()
-        mapSvc.adminURL = GetConfigString('svc_adminURL')
-        mapSvc.username = GetConfigString('svc_username')
-        mapSvc.password = GetConfigString('svc_password')
-        mapSvc.folder = GetConfigString('svc_folder')
-        mapSvc.svcType = 'MapServer'
-        mapSvc.svcName = GetConfigString('MapSvc_Name')
-
-        # Note the arcpy.PublishingTools.RefreshService() call must only be available at ArcGIS 10.6 and later
-        # as it doesn't seem to work at 10.4
-        ### arcpy.ImportToolbox(r'C:\temp\arcgis_localhost_siteadmin_USE_THIS_ONE.ags;System/Publishing Tools')
-        ### arcpy.PublishingTools.RefreshService(imgSvc.svcName, imgSvc.svcType, imgSvc.folder, "#")
-        ### arcpy.PublishingTools.RefreshService(mapSvc.svcName, mapSvc.svcType, mapSvc.folder, "#")
-        # ToDo... Enable this call on the server...
-        # refreshService(imgSvc)
-        refreshService(mapSvc)
-
-        # Update the JSON file used to verify service updates...
-        jsonFile = GetConfigString('JSONFile_ServiceUpdates')
-        UpdateServicesJsonFile(jsonFile,  imgSvc.svcName, o_today_DateTime)
-        UpdateServicesJsonFile(jsonFile,  mapSvc.svcName, o_today_DateTime)
-
-        logging.info("\t=== PERFORMANCE ===>: RefreshServiceProcess took: " +
-                     get_Elapsed_Time_As_String(time_RefreshServiceProcess))
+        # In daemon mode, a cycle that did not add or remove any rasters has nothing to maintain or refresh
+        if bDaemonMode and GetMosaicCatalog(GDB_mosaic).changeCount == iStartChangeCount:
+            logging.info("No rasters added or removed - skipping the geodatabase maintenance and service refresh.")
+        else:
+            # #########################################################################
+            # Perform maintenance on the file geodatabase. i.e. Calc stats and compact.
+            # #########################################################################
+            logging.info("-------------------------------------")
+            logging.info("Performing geodatabase maintenance...")
+            logging.info("-------------------------------------")
+
+            # Grab a timer reference
+            time_GDBMaintenanceProcess = get_NewStart_Time()
+
+            # Do some routine maintenance on the GDB mosaic...
+            time_Stats = get_NewStart_Time()
+            UpdateMosaicStatistics(GDB_mosaic)
+            RecordStageTime("stats", time_Stats)
+            time_Compact = get_NewStart_Time()
+            CompactGeodatabase(GetConfigString("GDBPath"))
+            RecordStageTime("compact", time_Compact)
+            logging.info("\t=== PERFORMANCE ===>: GDB Maintenance (Calc Stats and Compact) took: " +
+                         get_Elapsed_Time_As_String(time_GDBMaintenanceProcess))
+
+            # #######################################
+            # Refresh the service!
+            # #######################################
+            logging.info("-----------------------------")
+            logging.info("Refreshing the WMS service...")
+            logging.info("-----------------------------")
+
+            # Grab a timer reference
+            time_RefreshServiceProcess = get_NewStart_Time()
+
+            logging.info("Refreshing the services...")
+
+            imgSvc = MapService()
+            imgSvc.adminURL = GetConfigString('svc_adminURL')
+            imgSvc.username = GetConfigString('svc_username')
+            imgSvc.password = GetConfigString('svc_password')
+            imgSvc.folder = GetConfigString('svc_folder')
+            imgSvc.svcType = 'ImageServer'
+            imgSvc.svcName = GetConfigString('ImageSvc_Name')
+
+            mapSvc = MapService()
+            mapSvc.adminURL = GetConfigString('svc_adminURL')
+            mapSvc.username = GetConfigString('svc_username')
+            mapSvc.password = GetConfigString('svc_password')
+            mapSvc.folder = GetConfigString('svc_folder')
+            mapSvc.svcType = 'MapServer'
+            mapSvc.svcName = GetConfigString('MapSvc_Name')
+
+            # Note the arcpy.PublishingTools.RefreshService() call must only be available at ArcGIS 10.6 and later
+            # as it doesn't seem to work at 10.4
+            ### arcpy.ImportToolbox(r'C:\temp\arcgis_localhost_siteadmin_USE_THIS_ONE.ags;System/Publishing Tools')
+            ### arcpy.PublishingTools.RefreshService(imgSvc.svcName, imgSvc.svcType, imgSvc.folder, "#")
+            ### arcpy.PublishingTools.RefreshService(mapSvc.svcName, mapSvc.svcType, mapSvc.folder, "#")
+            # ToDo... Enable this call on the server...
+            # refreshService(imgSvc)
+            refreshService(mapSvc)
+
+            # Update the JSON file used to verify service updates...
+            jsonFile = GetConfigString('JSONFile_ServiceUpdates')
+            UpdateServicesJsonFile(jsonFile,  imgSvc.svcName, o_today_DateTime)
+            UpdateServicesJsonFile(jsonFile,  mapSvc.svcName, o_today_DateTime)
+
+            RecordStageTime("refresh", time_RefreshServiceProcess)
+            logging.info("\t=== PERFORMANCE ===>: RefreshServiceProcess took: " +
+                         get_Elapsed_Time_As_String(time_RefreshServiceProcess))
 
         # Log the Grand total script execution time...
         logging.info("------------------------------------------------------------------------------------------------")
@@ -1349,13 +3876,61 @@ def main():
         # Add a few lines so we can tell sessions apart in the log more quickly
         logging.info("")
         logging.info("")
+        bSuccess = True
         # END
 
     except:
         err = capture_exception()
         logging.error(err)
+    finally:
+        # A run that stopped early still loads the rasters its pipeline loaders have queued (Finish() does nothing for
+        # a loader that has already finished)
+        for loader in (lateLoader, earlyLoader):
+            if loader is not None:
+                try:
+                    loader.Finish()
+                except:
+                    err = capture_exception()
+                    logging.error(err)
+        # Report the proxy connection reuse and close the shared proxy session (a daemon keeps it open for the next
+        # cycle, see RunDaemon())
+        if bDaemonMode:
+            ReportProxySession()
+        else:
+            CloseProxySession()
+        CloseListingManifest()
+        # The stage timings and counters of the run (including a run that stopped early on an error)
+        WriteRunMetrics("backfill" if args.backfill else ("daemon" if bDaemonMode else "run"), bSuccess)
+
+
+def main():
+    try:
+
+        # Setup any required and/or optional arguments to be passed in.
+        args = setupArgs()
+
+        # Check if the user passed in a log level argument, either DEBUG, INFO, or WARNING. Otherwise, default to INFO.
+        if args.logging:
+            log_level = args.logging
+        else:
+            log_level = "INFO"    # Available values are: DEBUG, INFO, WARNING, ERROR
+
+        # Setup logfile
+        SetupLogFile(log_level)
+
+        if args.plan:
+            PlanRun()
+        elif args.daemon:
+            RunDaemon(args, log_level)
+        else:
+            RunETL(args)
+
+    except:
+        err = capture_exception()
+        logging.error(err)
 
 
-# Call Main Function
-main()
+# Call Main Function (only when run as a script - the transform worker processes import this file)
+if __name__ == "__main__":
+    main()
 
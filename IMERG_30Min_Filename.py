@@ -0,0 +1,74 @@
+# -------------------------------------------------------------------------------
+# Name:        IMERG_30Min_Filename.py
+# Purpose:     Parse IMERG 30 Minute filenames in a single pass. i.e.
+#                   3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif
+#               gives product "L", start 2018-08-09 23:30:00, end 2018-08-09 23:59:59, sequence 1410, version "V05B"
+#               and duration 30 (minutes).
+#               The pattern is compiled once and the date/time digits are converted directly (no strptime), so this is
+#               much cheaper than the regular expression + strptime that used to be run for every listed file.
+#               Used by IMERG_30Min_ETL.py - it has no arcpy dependency so it can also be used/benchmarked on its own.
+#
+# Author:               SERVIR GIT Team       2018
+# Copyright:   (c) SERVIR 2018
+# -------------------------------------------------------------------------------
+
+import collections
+import datetime
+import re
+
+# The structured record returned for each filename
+IMERGFile = collections.namedtuple("IMERGFile", ["product", "start", "end", "sequence", "version", "duration"])
+
+# 3B-HHR-<product>.MS.MRG.3IMERG.<yyyymmdd>-S<hhmmss>-E<hhmmss>.<sequence>.<version>.<duration>[.tif]
+_FILENAME_PATTERN = re.compile(r"3B-HHR-([A-Z])\.MS\.MRG\.3IMERG\."
+                               r"(\d{4})([01]\d)([0-3]\d)-S([0-2]\d)([0-5]\d)([0-5]\d)-E([0-2]\d)([0-5]\d)([0-5]\d)\."
+                               r"(\d{4})\.([^.]+)\.([^.]+)")
+
+_ONE_DAY = datetime.timedelta(days=1)
+
+
+def ParseFilename(theString):
+    """
+    Parse an IMERG filename (or a full path, with or without the .tif extension) and return an IMERGFile record.
+    Returns None if the string is not an IMERG half hourly filename or holds an invalid date.
+    """
+    match = _FILENAME_PATTERN.search(theString)
+    if match is None:
+        return None
+    g = match.groups()
+    try:
+        year = int(g[1])
+        month = int(g[2])
+        day = int(g[3])
+        oStart = datetime.datetime(year, month, day, int(g[4]), int(g[5]), int(g[6]))
+        oEnd = datetime.datetime(year, month, day, int(g[7]), int(g[8]), int(g[9]))
+    except ValueError:
+        return None
+    if oEnd < oStart:
+        # The end time rolled over into the next day
+        oEnd += _ONE_DAY
+    # The end time is the last second of the period, i.e. S233000-E235959 is a 30 minute file
+    duration = ((oEnd - oStart).seconds + 1) // 60
+    return IMERGFile(g[0], oStart, oEnd, int(g[10]), g[11], duration)
+
+
+def GetStartDateTime(theString):
+    """
+    Returns just the start datetime from an IMERG filename, or None if it cannot be parsed.
+    """
+    record = ParseFilename(theString)
+    if record is None:
+        return None
+    return record.start
+
+
+def GetSiblingName(theString, product):
+    """
+    Returns the filename passed in with its product letter swapped for the one passed in.  i.e. the "Early" sibling of
+    3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif is
+    3B-HHR-E.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.30min.tif.  Returns None if it cannot be parsed.
+    """
+    match = _FILENAME_PATTERN.search(theString)
+    if match is None:
+        return None
+    return theString[:match.start(1)] + product + theString[match.end(1):]
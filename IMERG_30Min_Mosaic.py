@@ -0,0 +1,233 @@
+# -------------------------------------------------------------------------------
+# Name:        IMERG_30Min_Mosaic.py
+# Purpose:     The mosaic dataset operations used by IMERG_30Min_ETL.py to load, replace and retire rasters, behind
+#               one small interface so they can be run without arcpy:
+#                 ArcpyMosaicBackend - the raster mosaic dataset in the file geodatabase (the default).
+#                 LocalMosaicBackend - a stand-in that keeps the mosaic rows (name, path, timestamp, start, end and
+#                                      Data_Age) in a SQLite table and the rasters as plain files.  It needs no arcpy,
+#                                      so the batching/scheduling of the loads can be benchmarked on any machine.
+#               Selected in IMERG_30Min_ETL.py with the 'mosaic_Backend' setting ('ARCPY' or 'LOCAL').  Both backends
+#               have the same methods: Prepare(), ReadRows(), ListRasters(), AddRasters(), UpdateAttributes(),
+#               RemoveRasters(), RemoveRastersBefore() and DeleteRaster().  Each backend also counts the calls made to
+#               it (see 'calls'), so a benchmark can report how many round trips a change saves.
+#
+# Author:               SERVIR GIT Team       2018
+# Copyright:   (c) SERVIR 2018
+# -------------------------------------------------------------------------------
+
+import datetime
+import glob
+import os
+import sqlite3
+import time
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _GetRasterName(raster):
+    # The mosaic dataset row name of a raster file: the filename minus the .tif extension
+    return os.path.splitext(os.path.basename(raster))[0]
+
+
+def _GetChunks(names, batchSize):
+    # The (sorted) names passed in, in lists of no more than batchSize names
+    names = sorted(names)
+    return [names[iStart:iStart + batchSize] for iStart in range(0, len(names), batchSize)]
+
+
+class ArcpyMosaicBackend(object):
+    """
+        The raster mosaic dataset in the file geodatabase.  i.e.
+          'mosaic_ds':   'E:/SERVIR/DATA/Global/IMERG_30Min_SR3857.gdb/IMERG'
+          'attr_fields': ['timestamp', 'start_datetime', 'end_datetime', 'Data_Age']
+          'batch_size':  500   (the most names in one "Name IN (...)" where clause)
+    """
+
+    def __init__(self, mosaic_ds="", attr_fields=None, batch_size=500):
+        import arcpy
+        self.arcpy = arcpy
+        self.mosaicDS = mosaic_ds
+        self.attrFields = list(attr_fields or [])
+        self.batchSize = max(1, batch_size)
+        self.calls = {}
+
+    def _Count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def Prepare(self, workspace):
+        """
+        Get ready to load the rasters from the (temp extract) workspace passed in.
+        """
+        self.arcpy.CheckOutExtension("Spatial")
+        self.arcpy.env.workspace = workspace
+        self.arcpy.env.overwriteOutput = True
+
+    def ReadRows(self):
+        """
+        Returns the (Name, timestamp, Data_Age) of every row in the mosaic dataset.
+        """
+        self._Count("ReadRows")
+        fieldList = ["Name", self.attrFields[0], self.attrFields[3]]
+        with self.arcpy.da.SearchCursor(self.mosaicDS, fieldList) as cursor:
+            rows = [(row[0], row[1], row[2]) for row in cursor]
+        del cursor
+        return rows
+
+    def ListRasters(self, folder):
+        """
+        Returns the names of the rasters in the folder passed in.
+        """
+        self._Count("ListRasters")
+        self.arcpy.env.workspace = folder
+        return self.arcpy.ListRasters() or []
+
+    def AddRasters(self, rasterList):
+        """
+        Add the raster files (full paths) passed in with one AddRastersToMosaicDataset call.
+        """
+        self._Count("AddRasters")
+        self.arcpy.AddRastersToMosaicDataset_management(self.mosaicDS, "Raster Dataset", ";".join(rasterList),
+                                                        "NO_CELL_SIZES", "NO_BOUNDARY", "NO_OVERVIEWS",
+                                                        "2", "#", "#", "#", "#", "NO_SUBFOLDERS",
+                                                        "OVERWRITE_DUPLICATES", "NO_PYRAMIDS",
+                                                        "NO_STATISTICS", "NO_THUMBNAILS",
+                                                        "Add Raster Datasets", "#")
+
+    def UpdateAttributes(self, attributes):
+        """
+        Set the attr_fields of the rows named in the dictionary passed in (name -> list of values, in attr_fields
+        order) with one UpdateCursor pass per 'batch_size' names.  Returns the set of names that were found and updated.
+        """
+        updatedNames = set()
+        for chunk in _GetChunks(attributes, self.batchSize):
+            self._Count("UpdateAttributes")
+            wClause = "Name IN (" + ", ".join("'" + name + "'" for name in chunk) + ")"
+            with self.arcpy.da.UpdateCursor(self.mosaicDS, ["Name"] + self.attrFields, wClause) as cursor:
+                for row in cursor:
+                    values = attributes.get(row[0])
+                    if values is None:
+                        continue
+                    cursor.updateRow([row[0]] + list(values))
+                    updatedNames.add(row[0])
+            del cursor
+        return updatedNames
+
+    def _Remove(self, query):
+        self.arcpy.RemoveRastersFromMosaicDataset_management(self.mosaicDS, query,
+                                                             "UPDATE_BOUNDARY", "MARK_OVERVIEW_ITEMS",
+                                                             "DELETE_OVERVIEW_IMAGES")
+
+    def RemoveRasters(self, names):
+        """
+        Remove the rows named in the list passed in with one "Name IN (...)" query (and boundary update) per
+        'batch_size' names.
+        """
+        for chunk in _GetChunks(names, self.batchSize):
+            self._Count("RemoveRasters")
+            self._Remove("Name IN (" + ", ".join("'" + name + "'" for name in chunk) + ")")
+
+    def RemoveRastersBefore(self, oDate):
+        """
+        Remove the rows whose timestamp is before the date passed in.
+        """
+        self._Count("RemoveRastersBefore")
+        self._Remove(self.attrFields[0] + " < date '" + oDate.strftime('%Y-%m-%d') + "'")
+
+    def DeleteRaster(self, raster):
+        """
+        Delete the raster (full path) passed in, along with its sidecar files.
+        """
+        self._Count("DeleteRaster")
+        self.arcpy.Delete_management(raster)
+
+
+class LocalMosaicBackend(object):
+    """
+        A stand-in for the mosaic dataset that needs no arcpy.  i.e.
+          'mosaic_ds':   'E:/SERVIR/DATA/Global/IMERG_30Min_SR3857.gdb/IMERG'   (only used to tell mosaics apart)
+          'attr_fields': ['timestamp', 'start_datetime', 'end_datetime', 'Data_Age']
+          'db_file':     'IMERG_30Min_LocalMosaic.sqlite'
+          'call_latency': 0.0   (seconds added to every call, to stand in for the overhead of each geoprocessing tool)
+          'batch_size':  500   (names per call, as the "Name IN (...)" where clauses of the arcpy backend)
+        The rows are kept in a SQLite table (one per mosaic_ds) and the rasters stay where they are on disk.  Adding a
+        raster that does not exist raises IOError, like the geodatabase tool would fail.
+    """
+
+    def __init__(self, mosaic_ds="", attr_fields=None, db_file="", call_latency=0.0, batch_size=500):
+        self.mosaicDS = mosaic_ds
+        self.attrFields = list(attr_fields or [])
+        self.dbFile = db_file
+        self.callLatency = call_latency
+        self.batchSize = max(1, batch_size)
+        self.calls = {}
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rasters (mosaic TEXT NOT NULL, name TEXT NOT NULL, path TEXT, "
+                          "timestamp TEXT, start_datetime TEXT, end_datetime TEXT, data_age TEXT, "
+                          "PRIMARY KEY (mosaic, name))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_rasters_timestamp ON rasters (mosaic, timestamp)")
+        self.conn.commit()
+
+    def _Count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.callLatency > 0:
+            time.sleep(self.callLatency)
+
+    def Prepare(self, workspace):
+        pass
+
+    def ReadRows(self):
+        self._Count("ReadRows")
+        cursor = self.conn.execute("SELECT name, timestamp, data_age FROM rasters WHERE mosaic = ?", (self.mosaicDS,))
+        return [(str(name), datetime.datetime.strptime(sTimestamp, DATE_FORMAT) if sTimestamp else None,
+                 str(dataAge) if dataAge else None) for name, sTimestamp, dataAge in cursor]
+
+    def ListRasters(self, folder):
+        self._Count("ListRasters")
+        return sorted(os.path.basename(raster) for raster in glob.glob(os.path.join(folder, "*.tif")))
+
+    def AddRasters(self, rasterList):
+        self._Count("AddRasters")
+        for raster in rasterList:
+            if not os.path.exists(raster):
+                raise IOError("Raster not found: {0}".format(raster))
+        # OVERWRITE_DUPLICATES - a raster that is already in there gets a new row (with no attributes)
+        self.conn.executemany("INSERT OR REPLACE INTO rasters (mosaic, name, path) VALUES (?, ?, ?)",
+                              [(self.mosaicDS, _GetRasterName(raster), raster) for raster in rasterList])
+        self.conn.commit()
+
+    def UpdateAttributes(self, attributes):
+        updatedNames = set()
+        for chunk in _GetChunks(attributes, self.batchSize):
+            self._Count("UpdateAttributes")
+            for name in chunk:
+                oTimestamp, oStart, oEnd, dataAge = attributes[name]
+                cursor = self.conn.execute("UPDATE rasters SET timestamp = ?, start_datetime = ?, end_datetime = ?, "
+                                           "data_age = ? WHERE mosaic = ? AND name = ?",
+                                           (oTimestamp.strftime(DATE_FORMAT), oStart.strftime(DATE_FORMAT),
+                                            oEnd.strftime(DATE_FORMAT), dataAge, self.mosaicDS, name))
+                if cursor.rowcount > 0:
+                    updatedNames.add(name)
+            self.conn.commit()
+        return updatedNames
+
+    def RemoveRasters(self, names):
+        for chunk in _GetChunks(names, self.batchSize):
+            self._Count("RemoveRasters")
+            self.conn.executemany("DELETE FROM rasters WHERE mosaic = ? AND name = ?",
+                                  [(self.mosaicDS, name) for name in chunk])
+            self.conn.commit()
+
+    def RemoveRastersBefore(self, oDate):
+        self._Count("RemoveRastersBefore")
+        self.conn.execute("DELETE FROM rasters WHERE mosaic = ? AND timestamp < ?",
+                          (self.mosaicDS, oDate.strftime('%Y-%m-%d')))
+        self.conn.commit()
+
+    def DeleteRaster(self, raster):
+        # The raster itself plus anything named after it, i.e. <name>.tif.aux.xml or <name>.tfw
+        self._Count("DeleteRaster")
+        for rasterFile in glob.glob(os.path.splitext(raster)[0] + ".*"):
+            os.remove(rasterFile)
+
+    def close(self):
+        self.conn.close()
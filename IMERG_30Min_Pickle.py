@@ -26,7 +26,34 @@ mydict = {'extract_EarlyFolder': 'E:\ETLScratch\IMERG_Extract\Early',
           'svc_folder': 'Global',
           'ImageSvc_Name': 'IMERG_30Min_ImgSvc',
           'MapSvc_Name': 'IMERG_30Min',
-          'JSONFile_ServiceUpdates': 'E:\SERVIR\Data\Global\SERVIRservices.json'}
+          'JSONFile_ServiceUpdates': 'E:\SERVIR\Data\Global\SERVIRservices.json',
+          'download_MaxWorkers': '4',
+          'download_ResumeAttempts': '3',
+          'proxy_URL': 'https://proxy.servirglobal.net/ProxyFTP.aspx',
+          'proxy_Timeout': '60',
+          'proxy_ListTimeout': '30',
+          'ftp_MaxSessions': '2',
+          'ftp_Retries': '3',
+          'ftp_Timeout': '60',
+          'ftp_Port': '21',
+          'pipeline_Mode': 'False',
+          'attribute_BatchSize': '500',
+          'add_BatchSize': '100',
+          'transform_MaxWorkers': '1',
+          'transform_Engine': 'SA',
+          'state_File': 'IMERG_30Min_State.json',
+          'daemon_PollSeconds': '300',
+          'daemon_JitterSeconds': '30',
+          'plan_ListingMaxAgeSeconds': '900',
+          'mosaic_Backend': 'ARCPY',
+          'mosaic_LocalFile': 'IMERG_30Min_LocalMosaic.sqlite',
+          'fetch_Retries': '3',
+          'fetch_BackoffSeconds': '1',
+          'fetch_MaxBackoffSeconds': '30',
+          'fetch_RetryBudget': '20',
+          'fetch_BreakerFailures': '5',
+          'fetch_BreakerSeconds': '120',
+          'retention_DeleteWorkers': '1'}
 
 output = open('config.pkl', 'wb')
 pickle.dump(mydict, output)
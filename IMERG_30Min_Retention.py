@@ -0,0 +1,176 @@
+# -------------------------------------------------------------------------------
+# Name:        IMERG_30Min_Retention.py
+# Purpose:     Plan and carry out the deletion of the rasters that are past retention from the folder supporting the
+#               mosaic dataset (final_Folder), without arcpy:
+#                 PlanRetention()  - lists the folder once, groups each raster with its sidecar files (.tif.aux.xml,
+#                                    .tif.ovr, .tfw, ...), takes the start date of every raster from its name in one
+#                                    batch and selects the expired ones with a single vectorized comparison.
+#                 DeleteRasters()  - deletes the files of the rasters passed in with plain filesystem unlinks, one at
+#                                    a time unless more threads are asked for (only worth it on a slow network share).
+#               NumPy is optional - the dates are compared as a datetime64 array if it can be imported, otherwise as
+#               ISO date strings (which sort the same way).  It is only imported when the first dates are compared (see
+#               ImportNumPy()), so importing this module does not load NumPy.
+#               Used by IMERG_30Min_ETL.py (deleteOutOfDateRasters(), DeleteRasterFiles() and the --plan mode).
+#
+# Author:               SERVIR GIT Team       2018
+# Copyright:   (c) SERVIR 2018
+# -------------------------------------------------------------------------------
+
+import collections
+import datetime
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
+# The numpy module (None if it is not installed) - imported on first use by ImportNumPy()
+numpy = None
+bNumPyImported = False
+
+# The start date in an IMERG filename, i.e. 3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif
+_DATE_PATTERN = re.compile(r"3IMERG\.(\d{4})([01]\d)([0-3]\d)-S")
+
+# The rasters of a folder that are past retention.  i.e.
+#   'expired':  {raster filename (.tif): [the raster file and its sidecar files]}
+#   'kept':     number of rasters dated on or after the keep date
+#   'unparsed': the raster filenames with no IMERG start date (they are never deleted)
+RetentionPlan = collections.namedtuple("RetentionPlan", ["expired", "kept", "unparsed"])
+
+
+def ImportNumPy():
+    """
+    Returns the numpy module, importing it the first time it is needed, or None if it is not installed.
+    """
+    global numpy, bNumPyImported
+    if not bNumPyImported:
+        bNumPyImported = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+
+def GroupRasterFiles(fileNames):
+    """
+    Group the filenames of a folder by raster.  Returns a dictionary of raster filename (.tif) -> list of its files:
+    the raster itself plus anything named after it (i.e. <name>.tif.aux.xml, <name>.tif.ovr or <name>.tfw).
+    """
+    groups = {}
+    stems = {}
+    for fileName in fileNames:
+        if fileName.lower().endswith(".tif"):
+            groups[fileName] = [fileName]
+            stems[fileName[:-4]] = fileName
+    for fileName in fileNames:
+        if fileName in groups:
+            continue
+        # The longest stem the name starts with (the IMERG names have dots of their own)
+        i = fileName.rfind(".")
+        while i > 0:
+            raster = stems.get(fileName[:i])
+            if raster is not None:
+                groups[raster].append(fileName)
+                break
+            i = fileName.rfind(".", 0, i)
+    return groups
+
+
+def _IsValidDate(isoDate):
+    # True if the 'YYYY-MM-DD' string passed in is a date that exists
+    try:
+        datetime.date(*[int(part) for part in isoDate.split("-")])
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def GetStartDates(names):
+    """
+    Returns the start dates of the names passed in, taken from the names in one batch: a NumPy datetime64[D] array
+    (NaT where a name has no IMERG date) or, without NumPy, a list of 'YYYY-MM-DD' strings ('' where there is none).
+    """
+    isoDates = []
+    for name in names:
+        match = _DATE_PATTERN.search(name)
+        isoDates.append("-".join(match.groups()) if match is not None else "")
+    if ImportNumPy() is None:
+        # (An impossible date, i.e. month 13, would still sort as a string - leave that name without a date too)
+        return [isoDate if _IsValidDate(isoDate) else "" for isoDate in isoDates]
+    try:
+        return numpy.array([isoDate or "NaT" for isoDate in isoDates], dtype="datetime64[D]")
+    except ValueError:
+        # An impossible date (i.e. month 13) - convert them one at a time so only that name is left without a date
+        dates = numpy.empty(len(isoDates), dtype="datetime64[D]")
+        for i, isoDate in enumerate(isoDates):
+            try:
+                dates[i] = numpy.datetime64(isoDate or "NaT", "D")
+            except ValueError:
+                dates[i] = numpy.datetime64("NaT")
+        return dates
+
+
+def SelectExpired(names, oKeepDate):
+    """
+    Returns a tuple of (the names passed in whose start date is before oKeepDate (a datetime.date), the names with no
+    start date).  The dates are compared all at once.
+    """
+    names = list(names)
+    dates = GetStartDates(names)
+    sKeepDate = oKeepDate.strftime("%Y-%m-%d")
+    if ImportNumPy() is not None:
+        # NaT is stored as the smallest int64 (and older NumPy versions compare it as less than any date)
+        bUnparsed = dates.view("i8") == numpy.iinfo(numpy.int64).min
+        bExpired = (dates < numpy.datetime64(sKeepDate, "D")) & ~bUnparsed
+        return ([names[i] for i in numpy.flatnonzero(bExpired)], [names[i] for i in numpy.flatnonzero(bUnparsed)])
+    return ([name for name, isoDate in zip(names, dates) if isoDate and isoDate < sKeepDate],
+            [name for name, isoDate in zip(names, dates) if not isoDate])
+
+
+def PlanRetention(folder, oKeepDate, fileNames=None):
+    """
+    Returns the RetentionPlan of the folder passed in: the rasters dated before oKeepDate (a datetime.date) and their
+    files.  fileNames is the listing of the folder, if the caller already has it.
+    """
+    if fileNames is None:
+        fileNames = os.listdir(folder) if os.path.isdir(folder) else []
+    groups = GroupRasterFiles(fileNames)
+    expired, unparsed = SelectExpired(sorted(groups), oKeepDate)
+    return RetentionPlan(dict((raster, groups[raster]) for raster in expired),
+                         len(groups) - len(expired) - len(unparsed), unparsed)
+
+
+def _Unlink(path):
+    # Returns None, or the error if the file could not be deleted (a file that is already gone is not an error)
+    try:
+        os.remove(path)
+    except OSError as e:
+        if os.path.exists(path):
+            return e
+    return None
+
+
+def DeleteRasters(folder, rasterFiles, workers=1):
+    """
+    Delete the files of the rasters passed in (a dictionary of raster filename -> list of its files, as in a
+    RetentionPlan) from the folder, one file after the other, or on up to 'workers' threads if it is more than 1 (on a
+    local disk the threads only add overhead - see benchmarks/bench_retention.py).  Returns a tuple of (the rasters
+    whose files were all deleted, a list of (file path, error) for the files that could not be deleted).
+    """
+    paths = [os.path.join(folder, fileName) for raster in sorted(rasterFiles) for fileName in rasterFiles[raster]]
+    if len(paths) == 0:
+        return list(rasterFiles), []
+    if workers > 1 and len(paths) > 1:
+        pool = ThreadPool(min(workers, len(paths)))
+        try:
+            errors = pool.map(_Unlink, paths)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        errors = [_Unlink(path) for path in paths]
+
+    failures = [(path, err) for path, err in zip(paths, errors) if err is not None]
+    failedFiles = set(os.path.basename(path) for path, err in failures)
+    deleted = [raster for raster in sorted(rasterFiles)
+               if not any(fileName in failedFiles for fileName in rasterFiles[raster])]
+    return deleted, failures
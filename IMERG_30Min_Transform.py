@@ -0,0 +1,211 @@
+# -------------------------------------------------------------------------------
+# Name:        IMERG_30Min_Transform.py
+# Purpose:     NumPy/GDAL "fast path" for the only transform the ETL applies to the IMERG 30 Minute rasters: keep the
+#               pixels where 0 < value < 29999 and set everything else to NoData.
+#               This gives the same pixels as arcpy.sa.ExtractByAttributes(raster, "VALUE > 0 AND VALUE < 29999") but
+#               works block by block with vectorized NumPy, writes a tiled/compressed GeoTIFF directly and never creates
+#               a raster attribute table (so there is nothing to delete afterwards).
+#               Selected in IMERG_30Min_ETL.py with the 'transform_Engine' setting ('NUMPY').  GDAL (osgeo) and NumPy
+#               are optional - if they can not be imported, IsAvailable() returns False and the ETL keeps using the
+#               Spatial Analyst path.
+#               The layout of the output (tiling, compression, predictor, internal overviews and pixel type) comes from
+#               the 'output_...' settings - see BuildCreationOptions().
+#               MaskRaster() also returns the pixel statistics of the raster it writes (see GetPixelStats()), which the
+#               ETL merges into the mosaic dataset statistics instead of recalculating them on every run.
+#
+# Author:               SERVIR GIT Team       2018
+# Copyright:   (c) SERVIR 2018
+# -------------------------------------------------------------------------------
+
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+# The valid range of pixel values (exclusive), matching the "VALUE > 0 AND VALUE < 29999" Spatial Analyst clause.
+VALID_MIN = 0
+VALID_MAX = 29999
+
+# Tiled, DEFLATE compressed output (with horizontal differencing, which suits the integer precipitation values)
+DEFAULT_CREATION_OPTIONS = ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "COMPRESS=DEFLATE", "PREDICTOR=2"]
+
+# Internal overview (reduced resolution) levels built when overviews are turned on
+OVERVIEW_LEVELS = [2, 4, 8, 16]
+
+# The 'output_PixelType' names (the arcpy.CopyRaster_management pixel types) and the matching GDAL data type names
+PIXEL_TYPES = {"8_BIT_UNSIGNED": "Byte",
+               "16_BIT_UNSIGNED": "UInt16",
+               "16_BIT_SIGNED": "Int16",
+               "32_BIT_UNSIGNED": "UInt32",
+               "32_BIT_SIGNED": "Int32",
+               "32_BIT_FLOAT": "Float32"}
+
+# The statistics of the valid pixels in a raster - kept as sums so the statistics of many rasters can be merged
+PixelStats = collections.namedtuple("PixelStats", ["count", "total", "sumSquares", "minimum", "maximum"])
+
+
+def IsAvailable():
+    """
+    Returns True if GDAL and NumPy could be imported (the fast path can be used).
+    """
+    return gdal is not None and numpy is not None
+
+
+def GetPixelStats(array, noDataValue=None):
+    """
+    Returns the PixelStats of the values in the NumPy array passed in, leaving out the noDataValue pixels.  Only needs
+    NumPy (not GDAL).
+    """
+    values = array if noDataValue is None else array[array != noDataValue]
+    if values.size == 0:
+        return PixelStats(0, 0.0, 0.0, None, None)
+    values = values.astype(numpy.float64)
+    return PixelStats(int(values.size), float(values.sum()), float(numpy.dot(values, values)),
+                      float(values.min()), float(values.max()))
+
+
+def MergePixelStats(statsList):
+    """
+    Returns the PixelStats of all of the PixelStats (or (count, total, sumSquares, minimum, maximum) sequences) passed
+    in, as if they had been calculated over all of the pixels at once.
+    """
+    count = 0
+    total = 0.0
+    sumSquares = 0.0
+    minimum = None
+    maximum = None
+    for stats in statsList:
+        if stats[0] == 0:
+            continue
+        count += stats[0]
+        total += stats[1]
+        sumSquares += stats[2]
+        minimum = stats[3] if minimum is None else min(minimum, stats[3])
+        maximum = stats[4] if maximum is None else max(maximum, stats[4])
+    return PixelStats(count, total, sumSquares, minimum, maximum)
+
+
+def GetMeanAndStdDev(stats):
+    """
+    Returns the (mean, standard deviation) of the PixelStats passed in, or (None, None) if it holds no pixels.
+    """
+    if stats[0] == 0:
+        return None, None
+    mean = stats[1] / stats[0]
+    return mean, max(0.0, stats[2] / stats[0] - mean * mean) ** 0.5
+
+
+def BuildCreationOptions(compression="DEFLATE", predictor=2, tileSize=256):
+    """
+    Returns the GeoTIFF creation options for an output profile.  compression is 'NONE', 'LZW' or 'DEFLATE', predictor
+    is 1 (none) or 2 (horizontal differencing) and tileSize is the internal tile width/height in pixels (0 = stripped).
+    """
+    options = []
+    if tileSize:
+        options += ["TILED=YES", "BLOCKXSIZE={0}".format(tileSize), "BLOCKYSIZE={0}".format(tileSize)]
+    if compression and compression != "NONE":
+        options.append("COMPRESS={0}".format(compression))
+        if predictor and predictor > 1:
+            options.append("PREDICTOR={0}".format(predictor))
+    return options
+
+
+def _GetNumPyType(gdalDataType):
+    return numpy.dtype(gdal.GetDataTypeName(gdalDataType).lower().replace("byte", "uint8"))
+
+
+def GetDefaultNoData(gdalDataType):
+    """
+    Returns a NoData value for the GDAL data type passed in that can never be a valid (0 < value < 29999) pixel:
+    0 for unsigned integers, the smallest value for signed integers and -9999 for floating point.
+    """
+    dtype = _GetNumPyType(gdalDataType)
+    if dtype.kind == "u":
+        return 0
+    if dtype.kind == "i":
+        return int(numpy.iinfo(dtype).min)
+    return -9999.0
+
+
+def CheckPixelType(dtype, noDataValue=None):
+    """
+    Raises ValueError if the NumPy dtype passed in can not hold every valid pixel value (VALID_MIN < value < VALID_MAX)
+    and the noDataValue - casting the pixels to it would silently wrap them around into wrong precipitation values.
+    """
+    if dtype.kind not in "ui":
+        return
+    info = numpy.iinfo(dtype)
+    if info.min > VALID_MIN + 1 or info.max < VALID_MAX - 1:
+        raise ValueError("Pixel type {0} ({1} to {2}) can not hold the valid values {3} to {4}".format(
+                         dtype.name, info.min, info.max, VALID_MIN + 1, VALID_MAX - 1))
+    if noDataValue is not None and not info.min <= noDataValue <= info.max:
+        raise ValueError("Pixel type {0} ({1} to {2}) can not hold the NoData value {3}".format(
+                         dtype.name, info.min, info.max, noDataValue))
+
+
+def MaskRaster(raster, finalRaster, noDataValue=None, creationOptions=None, blockRows=512, pixelType=None,
+               overviewLevels=None):
+    """
+    Write a copy of the (single band) raster passed in to finalRaster, keeping only the pixels where
+    VALID_MIN < value < VALID_MAX and setting everything else to noDataValue (see GetDefaultNoData() if None).
+    The raster is processed in strips of blockRows rows so memory use stays small.  Pixels that are NoData in the source
+    raster stay NoData.  The output is written with the creationOptions (DEFAULT_CREATION_OPTIONS if None), as the
+    pixelType (a PIXEL_TYPES key, None/'' = the source type) and with internal overviews if overviewLevels is set.
+    Raises ValueError (see CheckPixelType()), before anything is written, if the output pixel type is too small.
+    Returns the PixelStats of the valid pixels written.
+    """
+    src = gdal.Open(raster, gdal.GA_ReadOnly)
+    if src is None:
+        raise IOError("Unable to open raster: {0}".format(raster))
+
+    srcBand = src.GetRasterBand(1)
+    gdalDataType = srcBand.DataType
+    if pixelType:
+        gdalDataType = gdal.GetDataTypeByName(PIXEL_TYPES[pixelType])
+    outType = _GetNumPyType(gdalDataType)
+    srcNoData = srcBand.GetNoDataValue()
+    if noDataValue is None:
+        noDataValue = GetDefaultNoData(gdalDataType)
+    CheckPixelType(outType, noDataValue)
+
+    xSize = src.RasterXSize
+    ySize = src.RasterYSize
+    dst = gdal.GetDriverByName("GTiff").Create(finalRaster, xSize, ySize, 1, gdalDataType,
+                                               creationOptions if creationOptions is not None else
+                                               DEFAULT_CREATION_OPTIONS)
+    if dst is None:
+        raise IOError("Unable to create raster: {0}".format(finalRaster))
+    dst.SetGeoTransform(src.GetGeoTransform())
+    dst.SetProjection(src.GetProjection())
+    dstBand = dst.GetRasterBand(1)
+    dstBand.SetNoDataValue(noDataValue)
+
+    # Read in whole strips of the source blocks
+    srcBlockRows = srcBand.GetBlockSize()[1]
+    blockRows = max(srcBlockRows, (blockRows // srcBlockRows) * srcBlockRows)
+
+    blockStats = []
+    for yOffset in range(0, ySize, blockRows):
+        iRows = min(blockRows, ySize - yOffset)
+        block = srcBand.ReadAsArray(0, yOffset, xSize, iRows)
+        keep = (block > VALID_MIN) & (block < VALID_MAX)
+        if srcNoData is not None:
+            keep &= (block != srcNoData)
+        dstBand.WriteArray(numpy.where(keep, block, noDataValue).astype(outType), 0, yOffset)
+        blockStats.append(GetPixelStats(block[keep]))
+
+    dstBand.FlushCache()
+    if overviewLevels:
+        # Nearest neighbour, so the overviews only ever hold real precipitation values (or NoData)
+        dst.BuildOverviews("NEAREST", list(overviewLevels))
+    dstBand = None
+    dst = None
+    srcBand = None
+    src = None
+    return MergePixelStats(blockStats)
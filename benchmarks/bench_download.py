@@ -0,0 +1,130 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_download.py
+# Purpose:     End-to-end benchmark of the ETL's "Late" discovery and downloads against the local stand-ins from
+#               mock_imerg_server.py (no proxy.servirglobal.net or PPS ftp site needed).  For each engine ('proxy' =
+#               ProcessLateFiles_FromProxy(), 'ftp' = ProcessLateFiles()) and each number of download workers, the
+#               real month folder loop, listing, file selection and concurrent downloads run into a temporary extract
+#               folder, and the run's metrics (see RunMetrics in IMERG_30Min_ETL.py) give files/s, MB/s and the
+#               p50/p95 per-file download and listing times.  With --truncate-rate, a fraction of the transfers break
+#               off halfway and are resumed (HTTP Range / ftp REST).
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7 - arcpy and config.pkl are not
+#               needed (the settings are passed in directly).
+#
+#               Usage:  python bench_download.py [--engine proxy|ftp|both] [--workers 1,4,8] [--files 480]
+#                                                [--latency-ms 50] [--bandwidth-kbps 0] [--failure-rate 0.0]
+#                                                [--truncate-rate 0.0]
+# -------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+import mock_imerg_server  # noqa: E402
+
+# A fixed "today", so every run lists the same two month folders
+TODAY = datetime.datetime(2018, 8, 10)
+
+
+def GetConfig(extractFolder, proxyServer, ftpServer, iWorkers):
+    # The settings the Late discovery and downloads read (see IMERG_30Min_Pickle.py)
+    return {"ftp_host": "127.0.0.1",
+            "ftp_Port": str(ftpServer.GetPort()),
+            "ftp_user": "anonymous",
+            "ftp_pswrd": "anonymous",
+            "ftp_baseLateFolder": mock_imerg_server.LATE_BASE_FOLDER,
+            "ftp_MaxSessions": str(iWorkers),
+            "ftp_Retries": "1",
+            "ftp_Timeout": "30",
+            "extract_LateFolder": extractFolder,
+            "final_Folder": extractFolder,
+            "proxy_URL": proxyServer.GetURL(),
+            "proxy_Timeout": "30",
+            "download_MaxWorkers": str(iWorkers),
+            "download_ResumeAttempts": "3",
+            # The simulated failures are random, not an outage - retry them all and never open the circuit breaker
+            "fetch_BackoffSeconds": "0.1",
+            "fetch_RetryBudget": "100000",
+            "fetch_BreakerFailures": "100000",
+            "manifest_File": "",
+            "metrics_File": ""}
+
+
+def RunEngine(engine, oLastLate):
+    # Returns (True/False success, seconds, RunMetrics) for one discovery + download run
+    IMERG_30Min_ETL.myRunMetrics = None
+    IMERG_30Min_ETL.myFetchPolicy = None
+    timeStart = time.time()
+    if engine == "proxy":
+        bSuccess = IMERG_30Min_ETL.ProcessLateFiles_FromProxy(TODAY, oLastLate)
+    else:
+        bSuccess = IMERG_30Min_ETL.ProcessLateFiles(TODAY, oLastLate)
+    seconds = time.time() - timeStart
+    IMERG_30Min_ETL.CloseProxySession()
+    return bSuccess, seconds, IMERG_30Min_ETL.GetRunMetrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Late discovery and downloads end to end.")
+    parser.add_argument("--engine", default="both", choices=["proxy", "ftp", "both"], help="download engine(s)")
+    parser.add_argument("--workers", default="1,4", help="comma separated numbers of download workers to compare")
+    parser.add_argument("--files", type=int, default=480, help="half hour slots to download (480 = 10 days)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="milliseconds added to every request")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="KB/s per file transfer (0 = not throttled)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of the file requests that fail")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of the transfers that break off")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    catalog = mock_imerg_server.MockCatalog(TODAY, args.files, mock_imerg_server.BuildSyntheticTiff())
+    options = mock_imerg_server.MockOptions(args.latency_ms / 1000.0, args.bandwidth_kbps * 1024, args.failure_rate,
+                                            args.truncate_rate)
+    proxyServer = mock_imerg_server.StartServer(mock_imerg_server.MockProxyServer(catalog, options))
+    ftpServer = mock_imerg_server.StartServer(mock_imerg_server.MockFTPServer(catalog, options))
+    # Everything after the last "loaded" Late file, which is just before the first slot served
+    oLastLate = catalog.oStartDateTime - datetime.timedelta(minutes=30)
+    print("{0} Late files of {1} KB in {2} folders, latency {3:.0f} ms, bandwidth {4}, failure rate {5:.0%}, "
+          "truncate rate {6:.0%}".format(args.files, len(catalog.content) // 1024, len(catalog.folders) // 2,
+                                         args.latency_ms, "{0:.0f} KB/s".format(args.bandwidth_kbps)
+                                         if args.bandwidth_kbps > 0 else "unlimited", args.failure_rate,
+                                         args.truncate_rate))
+    print("{0:<6} {1:>7} {2:>6} {3:>6} {4:>7} {5:>8} {6:>8} {7:>9} {8:>9} {9:>9}".format(
+          "engine", "workers", "files", "failed", "resumed", "files/s", "MB/s", "p50 (ms)", "p95 (ms)", "list (ms)"))
+
+    engines = ["proxy", "ftp"] if args.engine == "both" else [args.engine]
+    extractFolder = tempfile.mkdtemp(prefix="bench_download_")
+    try:
+        for engine in engines:
+            for iWorkers in [int(w) for w in args.workers.split(",")]:
+                IMERG_30Min_ETL.myConfig = GetConfig(extractFolder, proxyServer, ftpServer, iWorkers)
+                bSuccess, seconds, metrics = RunEngine(engine, oLastLate)
+                if not bSuccess:
+                    print("{0:<6} {1:>7}  run failed (see the errors above)".format(engine, iWorkers))
+                    continue
+
+                iFiles = metrics.counters.get("download_files", 0)
+                megaBytes = metrics.counters.get("download_bytes", 0) / (1024.0 * 1024.0)
+                downloads = metrics.GetFileSummary("download")
+                listings = metrics.GetFileSummary("list")
+                print("{0:<6} {1:>7} {2:>6} {3:>6} {4:>7} {5:>8.1f} {6:>8.2f} {7:>9.1f} {8:>9.1f} {9:>9.1f}".format(
+                      engine, iWorkers, iFiles, metrics.counters.get("download_failed", 0),
+                      metrics.counters.get("download_resumed", 0), iFiles / seconds, megaBytes / seconds,
+                      downloads.get("p50", 0) * 1000, downloads.get("p95", 0) * 1000, listings.get("p50", 0) * 1000))
+
+                # Start the next run with an empty extract folder
+                for name in os.listdir(extractFolder):
+                    os.remove(os.path.join(extractFolder, name))
+    finally:
+        shutil.rmtree(extractFolder, ignore_errors=True)
+        proxyServer.shutdown()
+        ftpServer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
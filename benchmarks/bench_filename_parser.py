@@ -0,0 +1,96 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_filename_parser.py
+# Purpose:     Micro-benchmark of IMERG_30Min_Filename.ParseFilename() against the original
+#               Get_StartDateTime_FromString() (re.findall with the config pattern + datetime.strptime).
+#               Builds a month's worth of "Early" and "Late" filenames (plus the other file types found in the ftp
+#               folders), checks that both parsers agree on every start date, then times each of them.
+#
+#               Usage:  python bench_filename_parser.py [-n repeats]
+# -------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Filename  # noqa: E402
+
+# The settings from IMERG_30Min_Pickle.py used by the original function
+RegEx_StartDateFilterString = r'\d{4}[01]\d[0-3]\d-S[0-2]\d{5}'
+Filename_StartDateFormat = '%Y%m%d-S%H%M%S'
+
+
+def Get_StartDateTime_FromString(theString, regExp_Pattern, source_dateFormat):
+    # Copy of the original function from IMERG_30Min_ETL.py (copied rather than imported, as the ETL is python 2.7
+    # only and this benchmark also runs under python 3)
+    try:
+        reItemsList = re.findall(regExp_Pattern, theString)
+        if len(reItemsList) == 0:
+            return None
+        else:
+            sExpStr = reItemsList[0]
+            dateObj = datetime.datetime.strptime(sExpStr, source_dateFormat)
+            return dateObj
+    except:
+        return None
+
+
+def BuildFilenames():
+    # One month of half hourly Early and Late files, plus the 3hr/1day/3day/7day files that share the folders
+    names = []
+    oStart = datetime.datetime(2018, 8, 1)
+    for iSlot in range(31 * 48):
+        oSlot = oStart + datetime.timedelta(minutes=30 * iSlot)
+        oEnd = oSlot + datetime.timedelta(minutes=29, seconds=59)
+        for product in ("E", "L"):
+            stem = "3B-HHR-{0}.MS.MRG.3IMERG.{1}-S{2}-E{3}.{4:04d}.V05B".format(
+                product, oSlot.strftime("%Y%m%d"), oSlot.strftime("%H%M%S"), oEnd.strftime("%H%M%S"),
+                (iSlot % 48) * 30)
+            names.append(stem + ".30min.tif")
+            if iSlot % 6 == 0:
+                names.append(stem + ".3hr.tif")
+            if iSlot % 48 == 0:
+                names.append(stem + ".1day.tif")
+                names.append(stem + ".3day.tif")
+                names.append(stem + ".7day.tif")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IMERG filename parsers.")
+    parser.add_argument("-n", "--repeats", type=int, default=5, help="number of timed passes over the names")
+    args = parser.parse_args()
+
+    names = BuildFilenames()
+
+    # Both parsers must agree before the timings mean anything
+    for name in names:
+        oOld = Get_StartDateTime_FromString(name, RegEx_StartDateFilterString, Filename_StartDateFormat)
+        oNew = IMERG_30Min_Filename.GetStartDateTime(name)
+        if oOld != oNew:
+            sys.exit("Parsers disagree for {0}: {1} vs {2}".format(name, oOld, oNew))
+
+    def runOld():
+        for name in names:
+            Get_StartDateTime_FromString(name, RegEx_StartDateFilterString, Filename_StartDateFormat)
+
+    def runNew():
+        for name in names:
+            IMERG_30Min_Filename.ParseFilename(name)
+
+    oldSeconds = min(timeit.repeat(runOld, number=1, repeat=args.repeats))
+    newSeconds = min(timeit.repeat(runNew, number=1, repeat=args.repeats))
+
+    print("{0} filenames, best of {1} passes".format(len(names), args.repeats))
+    print("  Get_StartDateTime_FromString:  {0:8.2f} ms  ({1:6.2f} us/name)".format(
+        oldSeconds * 1000, oldSeconds * 1e6 / len(names)))
+    print("  ParseFilename:                 {0:8.2f} ms  ({1:6.2f} us/name)".format(
+        newSeconds * 1000, newSeconds * 1e6 / len(names)))
+    print("  speedup:                       {0:8.2f}x".format(oldSeconds / newSeconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_mosaic_load.py
+# Purpose:     Benchmark of the mosaic side of a load (adding the rasters, setting their attributes and replacing the
+#               Early siblings of the Late rasters) at full scale, without arcpy: the ETL's RasterLoader runs against
+#               the 'LOCAL' mosaic backend (IMERG_30Min_Mosaic.LocalMosaicBackend).
+#               For each 'add_BatchSize', a mosaic of 90 days of Late and Early rasters (8,640 rows, with placeholder
+#               files) is seeded, then a day of new Late rasters (replacing the newest day of Early rasters) and a day
+#               of new Early rasters are loaded.  The report gives the stage times from the run metrics and the number
+#               of calls made to the backend.  --call-latency-ms adds a fixed cost to every backend call, to stand in
+#               for the overhead of each geoprocessing tool call on the real mosaic dataset.
+#               The transform is not part of this benchmark (see bench_transform.py) - the "transformed" rasters are
+#               handed straight to the loader.
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7.
+#
+#               Usage:  python bench_mosaic_load.py [--add-batch 1,10,100] [--attribute-batch 500] [--days 90]
+#                                                   [--call-latency-ms 0]
+# -------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+from mock_imerg_server import GetName  # noqa: E402
+
+# A fixed "today" - the new rasters are the day before it
+TODAY = datetime.datetime(2018, 8, 10)
+
+
+def GetConfig(workFolder, iAddBatch, iAttributeBatch):
+    # The settings the RasterLoader reads (see IMERG_30Min_Pickle.py)
+    return {"final_Folder": os.path.join(workFolder, "final"),
+            "GDBPath": os.path.join(workFolder, "bench.gdb"),
+            "mosaicDSName": "IMERG",
+            "rasterTimeProperty": "timestamp",
+            "rasterStartTimeProperty": "start_datetime",
+            "rasterEndTimeProperty": "end_datetime",
+            "rasterDataAgeProperty": "Data_Age",
+            "mosaic_Backend": "LOCAL",
+            "mosaic_LocalFile": os.path.join(workFolder, "mosaic.sqlite"),
+            "add_BatchSize": str(iAddBatch),
+            "attribute_BatchSize": str(iAttributeBatch),
+            "transform_MaxWorkers": "1",
+            "transform_Engine": "SA",
+            "stats_Incremental": "False",
+            "manifest_File": "",
+            "metrics_File": ""}
+
+
+def Touch(path):
+    open(path, "wb").close()
+
+
+def GetSlots(oFrom, iCount):
+    return [oFrom + datetime.timedelta(minutes=30 * i) for i in range(iCount)]
+
+
+def Seed(backend, finalFolder, iDays):
+    # iDays of Late and Early rasters, up to the day before the new rasters
+    oFrom = TODAY - datetime.timedelta(days=iDays + 1)
+    rasters = []
+    attributes = {}
+    for oStart in GetSlots(oFrom, iDays * 48):
+        for product, dataAge in (("L", "LATE"), ("E", "EARLY")):
+            raster = os.path.join(finalFolder, GetName(product, oStart))
+            Touch(raster)
+            rasters.append(raster)
+            attributes[os.path.splitext(os.path.basename(raster))[0]] = [
+                oStart, oStart - datetime.timedelta(minutes=15), oStart + datetime.timedelta(minutes=15), dataAge]
+    backend.AddRasters(rasters)
+    backend.UpdateAttributes(attributes)
+    # The newest day of Early rasters, which the new Late rasters replace
+    for oStart in GetSlots(TODAY - datetime.timedelta(days=1), 48):
+        raster = os.path.join(finalFolder, GetName("E", oStart))
+        Touch(raster)
+        backend.AddRasters([raster])
+        backend.UpdateAttributes({os.path.splitext(os.path.basename(raster))[0]: [oStart, oStart, oStart, "EARLY"]})
+    return len(rasters) + 48
+
+
+def Load(extractFolder, finalFolder, product, early_or_late):
+    # Hand a day of "transformed" rasters to a RasterLoader, as LoadRaster() does once the transform is done
+    loader = IMERG_30Min_ETL.RasterLoader(extractFolder, early_or_late)
+    oFrom = TODAY - datetime.timedelta(days=1) if product == "L" else TODAY
+    for oStart in GetSlots(oFrom, 48):
+        name = GetName(product, oStart)
+        raster = os.path.join(extractFolder, name)
+        finalRaster = os.path.join(finalFolder, name)
+        Touch(raster)
+        Touch(finalRaster)
+        loader._TransformDone((raster, finalRaster, True, "", None, 0.0))
+    loader.Finish()
+    return loader.loadedCount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mosaic side of the loads with the local backend.")
+    parser.add_argument("--add-batch", default="1,10,100", help="comma separated add_BatchSize values to compare")
+    parser.add_argument("--attribute-batch", type=int, default=500, help="attribute_BatchSize")
+    parser.add_argument("--days", type=int, default=90, help="days of Late and Early rasters already in the mosaic")
+    parser.add_argument("--call-latency-ms", type=float, default=0, help="milliseconds added to every backend call")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    print("{0:>9} {1:>7} {2:>8} {3:>8} {4:>8} {5:>8} {6:>5} {7:>7} {8:>7}".format(
+          "add batch", "loaded", "total s", "add s", "attr s", "clean s", "adds", "updates", "removes"))
+    for iAddBatch in [int(b) for b in args.add_batch.split(",")]:
+        workFolder = tempfile.mkdtemp(prefix="bench_mosaic_load_")
+        try:
+            extractFolder = os.path.join(workFolder, "extract")
+            os.mkdir(extractFolder)
+            os.mkdir(os.path.join(workFolder, "final"))
+            IMERG_30Min_ETL.myConfig = GetConfig(workFolder, iAddBatch, args.attribute_batch)
+            IMERG_30Min_ETL.myMosaicBackend = None
+            IMERG_30Min_ETL.myMosaicCatalog = None
+            mosaicDS = os.path.join(IMERG_30Min_ETL.GetConfigString("GDBPath"), "IMERG")
+            backend = IMERG_30Min_ETL.GetMosaicBackend(mosaicDS)
+            iSeeded = Seed(backend, IMERG_30Min_ETL.GetConfigString("final_Folder"), args.days)
+            IMERG_30Min_ETL.GetMosaicCatalog(mosaicDS)
+
+            # Only count (and slow down) the calls made by the loads
+            backend.calls.clear()
+            backend.callLatency = args.call_latency_ms / 1000.0
+            IMERG_30Min_ETL.myRunMetrics = None
+            timeStart = time.time()
+            iLoaded = Load(extractFolder, IMERG_30Min_ETL.GetConfigString("final_Folder"), "L", "LATE")
+            iLoaded += Load(extractFolder, IMERG_30Min_ETL.GetConfigString("final_Folder"), "E", "EARLY")
+            seconds = time.time() - timeStart
+
+            stages = IMERG_30Min_ETL.GetRunMetrics().stages
+            print("{0:>9} {1:>7} {2:>8.3f} {3:>8.3f} {4:>8.3f} {5:>8.3f} {6:>5} {7:>7} {8:>7}".format(
+                  iAddBatch, iLoaded, seconds, stages.get("add", [0])[0], stages.get("attributes", [0])[0],
+                  stages.get("cleanup", [0])[0], backend.calls.get("AddRasters", 0),
+                  backend.calls.get("UpdateAttributes", 0), backend.calls.get("RemoveRasters", 0)))
+            if iSeeded - 48 + iLoaded != len(backend.ReadRows()):
+                print("  unexpected number of mosaic rows: {0}".format(len(backend.ReadRows())))
+            backend.close()
+        finally:
+            shutil.rmtree(workFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
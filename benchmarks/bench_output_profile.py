@@ -0,0 +1,121 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_output_profile.py
+# Purpose:     Size and read-time report for the output profile of the rasters written to final_Folder (see the
+#               'output_...' settings).  Each raster is masked with IMERG_30Min_Transform.MaskRaster() twice: once
+#               with the old layout (stripped, uncompressed, source pixel type, no overviews) and once with the
+#               profile.  For each file, the report gives the size on disk (including any .ovr file) and the time to
+#               read it the way the image service does: the full raster, random 256 x 256 windows, and a zoomed-out
+#               (1/16 resolution) view.
+#               With no rasters passed in, a synthetic IMERG sized (3600 x 1800, 16 bit) raster is generated.
+#               The read times include the operating system file cache, so they are best compared against each other.
+#
+#               Usage:  python bench_output_profile.py [-n repeats] [--compression DEFLATE] [--predictor 2]
+#                                                      [--tile-size 256] [--pixel-type 16_BIT_UNSIGNED]
+#                                                      [--no-overviews] [raster.tif ...]
+# -------------------------------------------------------------------------------
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Transform  # noqa: E402
+from bench_transform import BuildSyntheticRaster  # noqa: E402
+
+WINDOW_SIZE = 256
+WINDOW_COUNT = 50
+
+
+def GetSize(raster):
+    # The raster plus its external overviews, if any
+    size = os.path.getsize(raster)
+    if os.path.exists(raster + ".ovr"):
+        size += os.path.getsize(raster + ".ovr")
+    return size
+
+
+def TimeReads(raster, repeats):
+    # Returns the best (full read, windowed reads, overview read) times in seconds
+    gdal = IMERG_30Min_Transform.gdal
+    windows = random.Random(2018)
+
+    def readFull():
+        gdal.Open(raster).GetRasterBand(1).ReadAsArray()
+
+    def readWindows():
+        ds = gdal.Open(raster)
+        band = ds.GetRasterBand(1)
+        for i in range(WINDOW_COUNT):
+            band.ReadAsArray(windows.randint(0, ds.RasterXSize - WINDOW_SIZE),
+                             windows.randint(0, ds.RasterYSize - WINDOW_SIZE), WINDOW_SIZE, WINDOW_SIZE)
+
+    def readOverview():
+        # Without overviews GDAL has to read (and decimate) the full resolution pixels
+        ds = gdal.Open(raster)
+        ds.GetRasterBand(1).ReadAsArray(buf_xsize=ds.RasterXSize // 16, buf_ysize=ds.RasterYSize // 16)
+
+    return tuple(min(timeit.repeat(function, number=1, repeat=repeats))
+                 for function in (readFull, readWindows, readOverview))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the size and read-time savings of the output profile.")
+    parser.add_argument("rasters", nargs="*", help="IMERG 30 minute .tif files (default: a synthetic raster)")
+    parser.add_argument("-n", "--repeats", type=int, default=3, help="number of timed reads per raster")
+    parser.add_argument("--compression", default="DEFLATE", help="NONE, LZW or DEFLATE")
+    parser.add_argument("--predictor", type=int, default=2, help="1 (none) or 2 (horizontal differencing)")
+    parser.add_argument("--tile-size", type=int, default=256, help="internal tile size (0 = not tiled)")
+    parser.add_argument("--pixel-type", default="16_BIT_UNSIGNED", help="output pixel type ('' = source type)")
+    parser.add_argument("--no-overviews", action="store_true", help="do not build internal overviews")
+    args = parser.parse_args()
+
+    if not IMERG_30Min_Transform.IsAvailable():
+        sys.exit("GDAL and NumPy are required for this benchmark.")
+
+    creationOptions = IMERG_30Min_Transform.BuildCreationOptions(args.compression.upper(), args.predictor,
+                                                                 args.tile_size)
+    overviewLevels = None if args.no_overviews else IMERG_30Min_Transform.OVERVIEW_LEVELS
+    print("profile: {0}, pixel type {1}, overviews {2}".format(" ".join(creationOptions) or "(none)",
+                                                               args.pixel_type or "(source)", overviewLevels))
+
+    outputFolder = tempfile.mkdtemp(prefix="bench_output_profile_")
+    rasters = args.rasters or [BuildSyntheticRaster(outputFolder)]
+    totals = [0, 0]
+    try:
+        for raster in rasters:
+            baseName = os.path.splitext(os.path.basename(raster))[0]
+            oldRaster = os.path.join(outputFolder, baseName + "_old.tif")
+            newRaster = os.path.join(outputFolder, baseName + "_profile.tif")
+            IMERG_30Min_Transform.MaskRaster(raster, oldRaster, creationOptions=[])
+            IMERG_30Min_Transform.MaskRaster(raster, newRaster, creationOptions=creationOptions,
+                                             pixelType=args.pixel_type.upper(), overviewLevels=overviewLevels)
+
+            oldSize = GetSize(oldRaster)
+            newSize = GetSize(newRaster)
+            totals[0] += oldSize
+            totals[1] += newSize
+            oldTimes = TimeReads(oldRaster, args.repeats)
+            newTimes = TimeReads(newRaster, args.repeats)
+
+            print(os.path.basename(raster))
+            print("  {0:<16} {1:>12} {2:>12} {3:>9}".format("", "old", "profile", "saving"))
+            print("  {0:<16} {1:>9.1f} KB {2:>9.1f} KB {3:>8.1f}%".format(
+                "size", oldSize / 1024.0, newSize / 1024.0, 100.0 * (oldSize - newSize) / oldSize))
+            for label, oldSeconds, newSeconds in zip(("full read", "window reads", "overview read"),
+                                                     oldTimes, newTimes):
+                print("  {0:<16} {1:>9.1f} ms {2:>9.1f} ms {3:>8.1f}%".format(
+                    label, oldSeconds * 1000, newSeconds * 1000, 100.0 * (oldSeconds - newSeconds) / oldSeconds))
+
+        if len(rasters) > 1:
+            print("total size: {0:.1f} KB -> {1:.1f} KB ({2:.1f}% saving)".format(
+                totals[0] / 1024.0, totals[1] / 1024.0, 100.0 * (totals[0] - totals[1]) / totals[0]))
+    finally:
+        shutil.rmtree(outputFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
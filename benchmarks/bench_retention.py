@@ -0,0 +1,105 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_retention.py
+# Purpose:     Benchmark of the retention cleanup of final_Folder: the original per-file loop of
+#               deleteOutOfDateRasters() (glob every .tif, parse each name, then glob and delete the sidecars of each
+#               expired raster one at a time) against IMERG_30Min_Retention (one listing, batch date comparison and
+#               plain unlinks), with the unlinks on 1 or more threads ('retention_DeleteWorkers').
+#               A temporary folder is filled with --days of Late and Early rasters, each with a .tif.aux.xml and a
+#               .tif.ovr sidecar (empty files), and the rasters older than --keep days are deleted.  The folder is
+#               rebuilt for each run, and both approaches must delete the same files.
+#
+#               Usage:  python bench_retention.py [--days 100] [--keep 90] [--workers 1,4,8]
+# -------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Filename  # noqa: E402
+import IMERG_30Min_Retention  # noqa: E402
+from mock_imerg_server import GetName  # noqa: E402
+
+# A fixed "today", so the number of expired rasters does not depend on the time of day
+TODAY = datetime.datetime(2018, 8, 10)
+SIDECARS = [".aux.xml", ".ovr"]
+
+
+def BuildFolder(folder, iDays):
+    # iDays of Late and Early rasters (48 half hour slots per day) up to TODAY, each with its sidecars
+    oFrom = TODAY - datetime.timedelta(days=iDays)
+    for i in range(iDays * 48):
+        oStart = oFrom + datetime.timedelta(minutes=30 * i)
+        for product in ("L", "E"):
+            raster = os.path.join(folder, GetName(product, oStart))
+            for fileName in [raster] + [raster + sidecar for sidecar in SIDECARS]:
+                open(fileName, "wb").close()
+
+
+def DeleteOriginal(folder, oKeepDate):
+    # The original loop (with the arcpy.Delete_management call of each raster replaced by deleting its files)
+    rastersToDelete = []
+    for rfile in glob.glob(os.path.join(folder, "*.tif")):
+        theName = os.path.basename(rfile)
+        oFileDate = IMERG_30Min_Filename.GetStartDateTime(theName)
+        if oFileDate is not None and oFileDate.date() < oKeepDate:
+            rastersToDelete.append(theName)
+    timePlanned = time.time()
+    for oldraster in rastersToDelete:
+        for rasterFile in glob.glob(os.path.splitext(os.path.join(folder, oldraster))[0] + ".*"):
+            os.remove(rasterFile)
+    return len(rastersToDelete), timePlanned
+
+
+def DeletePlanned(folder, oKeepDate, iWorkers):
+    plan = IMERG_30Min_Retention.PlanRetention(folder, oKeepDate)
+    timePlanned = time.time()
+    deleted, failures = IMERG_30Min_Retention.DeleteRasters(folder, plan.expired, iWorkers)
+    if len(failures) > 0:
+        print("  {0} files could not be deleted".format(len(failures)))
+    return len(deleted), timePlanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retention cleanup of the final folder.")
+    parser.add_argument("--days", type=int, default=100, help="days of Late and Early rasters in the folder")
+    parser.add_argument("--keep", type=int, default=90, help="days of rasters to keep (DaysToKeepRasters)")
+    parser.add_argument("--workers", default="1,4,8", help="comma separated numbers of delete threads to compare")
+    args = parser.parse_args()
+
+    oKeepDate = (TODAY - datetime.timedelta(days=args.keep)).date()
+    print("{0} rasters ({1} files), keeping {2} days, NumPy {3}".format(
+          args.days * 96, args.days * 96 * (1 + len(SIDECARS)), args.keep,
+          "available" if IMERG_30Min_Retention.ImportNumPy() is not None else "not available"))
+    print("{0:<16} {1:>8} {2:>8} {3:>9} {4:>8}".format("method", "rasters", "plan s", "delete s", "total s"))
+
+    runs = [("original", None)] + [("planner x{0}".format(w), int(w)) for w in args.workers.split(",")]
+    expected = None
+    for label, iWorkers in runs:
+        folder = tempfile.mkdtemp(prefix="bench_retention_")
+        try:
+            BuildFolder(folder, args.days)
+            timeStart = time.time()
+            if iWorkers is None:
+                iDeleted, timePlanned = DeleteOriginal(folder, oKeepDate)
+            else:
+                iDeleted, timePlanned = DeletePlanned(folder, oKeepDate, iWorkers)
+            timeEnd = time.time()
+            remaining = sorted(os.listdir(folder))
+            print("{0:<16} {1:>8} {2:>8.3f} {3:>9.3f} {4:>8.3f}".format(
+                  label, iDeleted, timePlanned - timeStart, timeEnd - timePlanned, timeEnd - timeStart))
+            if expected is None:
+                expected = remaining
+            elif remaining != expected:
+                print("  the files left behind differ from the original loop")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -------------------------------------------------------------------------------
+# Name:        bench_transform.py
+# Purpose:     Benchmark of the two transform engines used by IMERG_30Min_ETL.py to drop the zero/NoData pixels:
+#               'NUMPY' (IMERG_30Min_Transform.MaskRaster) and 'SA' (arcpy.sa.ExtractByAttributes + save).
+#               Each raster is run through the NUMPY engine and, if arcpy with a Spatial Analyst licence is available,
+#               through the SA engine too.  The two outputs are then compared pixel by pixel (same valid pixel mask and
+#               the same values) before the timings are reported.
+#               With no rasters passed in, a synthetic IMERG sized (3600 x 1800, 16 bit) raster is generated.
+#
+#               Usage:  python bench_transform.py [-n repeats] [-o outputFolder] [raster.tif ...]
+# -------------------------------------------------------------------------------
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Transform  # noqa: E402
+
+# Imported by main() (so bench_output_profile.py can use BuildSyntheticRaster() without arcpy)
+arcpy = None
+
+SQL_CLAUSE = "VALUE > 0 AND VALUE < 29999"
+
+
+def BuildSyntheticRaster(outputFolder):
+    # Mostly zero (no rain) with some rain cells and a band of 29999 (NoData) values, like the IMERG 30 minute files
+    numpy = IMERG_30Min_Transform.numpy
+    gdal = IMERG_30Min_Transform.gdal
+    raster = os.path.join(outputFolder, "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif")
+    random = numpy.random.RandomState(2018)
+    data = numpy.where(random.random_sample((1800, 3600)) < 0.15,
+                       random.randint(1, 2000, (1800, 3600)), 0).astype(numpy.int16)
+    data[:100, :] = 29999
+    ds = gdal.GetDriverByName("GTiff").Create(raster, 3600, 1800, 1, gdal.GDT_Int16)
+    ds.SetGeoTransform((-180.0, 0.1, 0.0, 90.0, 0.0, -0.1))
+    ds.GetRasterBand(1).WriteArray(data)
+    ds = None
+    return raster
+
+
+def ImportArcpy():
+    # Returns the arcpy module if it can be imported and Spatial Analyst is available, otherwise None
+    try:
+        import arcpy
+    except ImportError:
+        return None
+    if arcpy.CheckExtension("Spatial") != "Available":
+        return None
+    arcpy.CheckOutExtension("Spatial")
+    return arcpy
+
+
+def RunNumPy(raster, finalRaster):
+    IMERG_30Min_Transform.MaskRaster(raster, finalRaster)
+
+
+def RunSpatialAnalyst(raster, finalRaster):
+    extract = arcpy.sa.ExtractByAttributes(raster, SQL_CLAUSE)
+    extract.save(finalRaster)
+
+
+def ReadValid(raster):
+    # Returns (valid pixel mask, values) for the output raster
+    band = IMERG_30Min_Transform.gdal.Open(raster).GetRasterBand(1)
+    data = band.ReadAsArray()
+    noData = band.GetNoDataValue()
+    valid = IMERG_30Min_Transform.numpy.ones(data.shape, dtype=bool) if noData is None else (data != noData)
+    return valid, data
+
+
+def Time(function, raster, finalRaster, repeats):
+    def run():
+        if os.path.exists(finalRaster):
+            IMERG_30Min_Transform.gdal.GetDriverByName("GTiff").Delete(finalRaster)
+        function(raster, finalRaster)
+    return min(timeit.repeat(run, number=1, repeat=repeats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IMERG transform engines.")
+    parser.add_argument("rasters", nargs="*", help="IMERG 30 minute .tif files (default: a synthetic raster)")
+    parser.add_argument("-n", "--repeats", type=int, default=3, help="number of timed runs per raster")
+    parser.add_argument("-o", "--output", help="folder for the output rasters (default: a temporary folder)")
+    args = parser.parse_args()
+
+    if not IMERG_30Min_Transform.IsAvailable():
+        sys.exit("GDAL and NumPy are required for this benchmark.")
+    global arcpy
+    arcpy = ImportArcpy()
+    if arcpy is None:
+        print("arcpy/Spatial Analyst not available - timing the NUMPY engine only.")
+
+    outputFolder = args.output or tempfile.mkdtemp(prefix="bench_transform_")
+    rasters = args.rasters or [BuildSyntheticRaster(outputFolder)]
+    try:
+        for raster in rasters:
+            baseName = os.path.splitext(os.path.basename(raster))[0]
+            numpyRaster = os.path.join(outputFolder, baseName + "_numpy.tif")
+            numpySeconds = Time(RunNumPy, raster, numpyRaster, args.repeats)
+            print("{0}  (best of {1} runs)".format(os.path.basename(raster), args.repeats))
+            print("  NUMPY:  {0:8.1f} ms".format(numpySeconds * 1000))
+            if arcpy is None:
+                continue
+
+            saRaster = os.path.join(outputFolder, baseName + "_sa.tif")
+            saSeconds = Time(RunSpatialAnalyst, raster, saRaster, args.repeats)
+            print("  SA:     {0:8.1f} ms".format(saSeconds * 1000))
+            print("  speedup:{0:8.2f}x".format(saSeconds / numpySeconds))
+
+            # The outputs must hold the same pixels for the timings to mean anything
+            numpyValid, numpyData = ReadValid(numpyRaster)
+            saValid, saData = ReadValid(saRaster)
+            if not (numpyValid == saValid).all():
+                sys.exit("Valid pixel masks differ for {0}".format(raster))
+            if not (numpyData[numpyValid] == saData[saValid]).all():
+                sys.exit("Pixel values differ for {0}".format(raster))
+            print("  outputs are pixel-identical ({0} valid pixels)".format(int(numpyValid.sum())))
+    finally:
+        if args.output is None:
+            shutil.rmtree(outputFolder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+# -------------------------------------------------------------------------------
+# Name:        mock_imerg_server.py
+# Purpose:     Local stand-ins for the two remote sites the ETL downloads from, so discovery and downloads can be
+#               measured without touching proxy.servirglobal.net or jsimpson.pps.eosdis.nasa.gov:
+#                 MockProxyServer - the ProxyFTP.aspx page: '?directory=ftp://host/<folder>/' returns the comma
+#                                   separated listing of the folder and '?url=ftp://host/<folder>/<file>' returns the file
+#                                   (with Range requests, Last-Modified and Content-MD5).
+#                 MockFTPServer   - a minimal (passive mode only) ftp server: USER/PASS, CWD, PWD, TYPE, PASV, NLST, SIZE,
+#                                   REST, RETR.
+#               Both serve the same MockCatalog: the <base>/<year>/<month> folders of "Late" and "Early" IMERG names
+#               (plus the other file types found in the real folders), each file being the same small synthetic
+#               16 bit GeoTIFF.  Each listing/file request can be slowed down by a fixed latency, the file transfers
+#               throttled to a bandwidth, and a fraction of the file requests made to fail or to break off halfway.
+#               Used by bench_download.py, or run on its own to point a test config at:
+#
+#               Usage:  python mock_imerg_server.py [--proxy-port 8080] [--ftp-port 2121] [--latency-ms 50]
+#                                                   [--bandwidth-kbps 0] [--failure-rate 0.0] [--truncate-rate 0.0]
+#                                                   [--files 480]
+# -------------------------------------------------------------------------------
+
+import argparse
+import array
+import base64
+import datetime
+import hashlib
+import posixpath
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+try:
+    import BaseHTTPServer as httpserver
+    import SocketServer as socketserver
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    import http.server as httpserver
+    import socketserver
+    from urllib.parse import urlparse, parse_qs
+
+LATE_BASE_FOLDER = "/data/imerg/gis"
+EARLY_BASE_FOLDER = "/data/imerg/gis/early"
+
+# The chunk size used when throttling the file transfers
+CHUNK_SIZE = 16384
+
+
+def BuildSyntheticTiff(width=720, height=360, seed=2018):
+    # A small uncompressed, georeferenced (WGS84) 16 bit GeoTIFF, mostly zero (no rain) with some rain cells, built
+    # with struct so the server does not need GDAL
+    rng = random.Random(seed)
+    pixels = array.array("h", (rng.randint(1, 2000) if rng.random() < 0.15 else 0 for i in range(width * height)))
+    if sys.byteorder != "little":
+        pixels.byteswap()
+    data = pixels.tobytes() if hasattr(pixels, "tobytes") else pixels.tostring()
+
+    pixelScale = struct.pack("<3d", 360.0 / width, 180.0 / height, 0.0)
+    tiePoint = struct.pack("<6d", 0.0, 0.0, 0.0, -180.0, 90.0, 0.0)
+    # GTModelType = geographic, GTRasterType = pixel is area, GeographicType = WGS84
+    geoKeys = struct.pack("<16H", 1, 1, 0, 3, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326)
+
+    # (tag, type, count, value) - type 3 = SHORT, 4 = LONG, 12 = DOUBLE; the DOUBLE/SHORT arrays are stored after
+    # the IFD and pointed to by offset
+    iTags = 13
+    extraOffset = 8 + 2 + iTags * 12 + 4
+    dataOffset = extraOffset + len(pixelScale) + len(tiePoint) + len(geoKeys)
+    tags = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 16), (259, 3, 1, 1), (262, 3, 1, 1),
+            (273, 4, 1, dataOffset), (277, 3, 1, 1), (278, 4, 1, height), (279, 4, 1, len(data)), (339, 3, 1, 2),
+            (33550, 12, 3, extraOffset), (33922, 12, 6, extraOffset + len(pixelScale)),
+            (34735, 3, 16, extraOffset + len(pixelScale) + len(tiePoint))]
+
+    ifd = [struct.pack("<2sHI", b"II", 42, 8), struct.pack("<H", iTags)]
+    for tag, tagType, count, value in tags:
+        if tagType == 3 and count == 1:
+            ifd.append(struct.pack("<HHIHH", tag, tagType, count, value, 0))
+        else:
+            ifd.append(struct.pack("<HHII", tag, tagType, count, value))
+    ifd.append(struct.pack("<I", 0))
+    return b"".join(ifd) + pixelScale + tiePoint + geoKeys + data
+
+
+def GetName(product, oStart, fileType="30min.tif"):
+    # i.e. 3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif
+    oEnd = oStart + datetime.timedelta(minutes=29, seconds=59)
+    iMinutes = oStart.hour * 60 + oStart.minute
+    return "3B-HHR-{0}.MS.MRG.3IMERG.{1}-S{2}-E{3}.{4:04d}.V05B.{5}".format(
+        product, oStart.strftime("%Y%m%d"), oStart.strftime("%H%M%S"), oEnd.strftime("%H%M%S"), iMinutes, fileType)
+
+
+class MockCatalog(object):
+    """
+        The folders and files served by the mock servers.  i.e.
+          'oEndDateTime': datetime.datetime(2018, 8, 10)   (the last half hour slot starts 30 minutes before this)
+          'iFiles':       480   (half hour slots of each product, counting back from oEndDateTime)
+          'content':      the bytes of every file (see BuildSyntheticTiff())
+        Each slot also gets a .tfw file, and every 3 hours/day the 3hr/1day files, like the real ftp folders.
+    """
+
+    def __init__(self, oEndDateTime, iFiles=480, content=b""):
+        self.oEndDateTime = oEndDateTime
+        self.oStartDateTime = oEndDateTime - datetime.timedelta(minutes=30 * iFiles)
+        self.content = content
+        self.checksum = base64.b64encode(hashlib.md5(content).digest()).decode("ascii")
+        self.folders = {}
+        for i in range(iFiles):
+            oStart = self.oStartDateTime + datetime.timedelta(minutes=30 * i)
+            for product, baseFolder in (("L", LATE_BASE_FOLDER), ("E", EARLY_BASE_FOLDER)):
+                folder = "{0}/{1}/{2:02d}".format(baseFolder, oStart.year, oStart.month)
+                names = self.folders.setdefault(folder, [])
+                names += [GetName(product, oStart), GetName(product, oStart, "30min.tfw")]
+                if i % 6 == 0:
+                    names += [GetName(product, oStart, "3hr.tif"), GetName(product, oStart, "3hr.tfw")]
+                if i % 48 == 0:
+                    names += [GetName(product, oStart, "1day.tif"), GetName(product, oStart, "1day.tfw")]
+        self.files = set(folder + "/" + name for folder, names in self.folders.items() for name in names)
+
+    def GetListing(self, folder):
+        # None if the folder does not exist
+        return self.folders.get(folder.rstrip("/"))
+
+    def HasFile(self, path):
+        return path in self.files
+
+    def IsFolder(self, path):
+        path = path.rstrip("/") or "/"
+        return path == "/" or any(folder == path or folder.startswith(path + "/") for folder in self.folders)
+
+
+class MockOptions(object):
+    """
+        How the mock servers misbehave.  i.e.
+          'latency':     0.05   (seconds added to every listing/file request)
+          'bandwidth':   0      (bytes per second for each file transfer, 0 = not throttled)
+          'failureRate': 0.0    (fraction of the file requests that fail)
+          'truncateRate': 0.0   (fraction of the file transfers that break off halfway)
+    """
+
+    def __init__(self, latency=0.0, bandwidth=0, failureRate=0.0, truncateRate=0.0, seed=2018):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failureRate = failureRate
+        self.truncateRate = truncateRate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def Wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def IsFailure(self):
+        with self._lock:
+            return self._random.random() < self.failureRate
+
+    def IsTruncated(self):
+        with self._lock:
+            return self._random.random() < self.truncateRate
+
+    def Send(self, write, content):
+        # Write the content in chunks, sleeping between them to keep to the bandwidth
+        for iStart in range(0, len(content), CHUNK_SIZE):
+            chunk = content[iStart:iStart + CHUNK_SIZE]
+            write(chunk)
+            if self.bandwidth > 0:
+                time.sleep(len(chunk) / float(self.bandwidth))
+
+
+def GetFTPPath(ftpUrl):
+    # 'ftp://host/data/imerg/gis/2018/08/name.tif' -> '/data/imerg/gis/2018/08/name.tif'
+    return urlparse(ftpUrl).path
+
+
+class _ProxyHandler(httpserver.BaseHTTPRequestHandler):
+    # HTTP/1.1 so the ETL's ProxySession can keep its connections alive
+    protocol_version = "HTTP/1.1"
+    # (Otherwise the small replies are held back by the client's delayed ACKs, adding ~40 ms to each request)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        catalog = self.server.catalog
+        options = self.server.options
+        options.Wait()
+        if "directory" in query:
+            names = catalog.GetListing(GetFTPPath(query["directory"][0]))
+            if names is None:
+                return self._Reply(404, b"Folder not found")
+            return self._Reply(200, ",".join(names).encode("ascii"))
+        if "url" in query:
+            if not catalog.HasFile(GetFTPPath(query["url"][0])):
+                return self._Reply(404, b"File not found")
+            if options.IsFailure():
+                return self._Reply(500, b"Simulated failure")
+            return self._SendFile(catalog, options)
+        return self._Reply(400, b"Expected ?directory= or ?url=")
+
+    def _SendFile(self, catalog, options):
+        # The whole file, or from the byte asked for with 'Range: bytes=<start>-'
+        content = catalog.content
+        iStart = 0
+        sRange = self.headers.get("Range", "")
+        if sRange.startswith("bytes=") and sRange[6:].rstrip("-").isdigit():
+            iStart = int(sRange[6:].rstrip("-"))
+            if iStart >= len(content):
+                return self._Reply(416, b"Range not satisfiable")
+        self.send_response(206 if iStart > 0 else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(content) - iStart))
+        if iStart > 0:
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(iStart, len(content) - 1, len(content)))
+        self.send_header("Last-Modified", "Fri, 10 Aug 2018 00:00:00 GMT")
+        self.send_header("Content-MD5", catalog.checksum)
+        self.end_headers()
+        if options.IsTruncated():
+            # Send half of it and drop the connection
+            options.Send(self.wfile.write, content[iStart:iStart + (len(content) - iStart) // 2])
+            self.close_connection = True
+            return
+        options.Send(self.wfile.write, content[iStart:])
+
+    def _Reply(self, iStatus, body):
+        self.send_response(iStatus)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockProxyServer(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+    """
+        The ProxyFTP.aspx stand-in.  The ETL's 'proxy_URL' is GetURL() (any path is accepted).
+    """
+    daemon_threads = True
+
+    def __init__(self, catalog, options, port=0):
+        httpserver.HTTPServer.__init__(self, ("127.0.0.1", port), _ProxyHandler)
+        self.catalog = catalog
+        self.options = options
+
+    def handle_error(self, request, client_address):
+        # A client dropping its idle keep-alive connection is not worth a traceback
+        if not isinstance(sys.exc_info()[1], socket.error):
+            httpserver.HTTPServer.handle_error(self, request, client_address)
+
+    def GetURL(self):
+        return "http://127.0.0.1:{0}/ProxyFTP.aspx".format(self.server_address[1])
+
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.cwd = "/"
+        self.dataListener = None
+        self.restart = 0
+        self._Reply("220 Mock IMERG ftp server ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command, _, argument = line.decode("latin-1").rstrip("\r\n").partition(" ")
+            command = command.upper()
+            if command == "QUIT":
+                self._Reply("221 Goodbye")
+                break
+            handler = getattr(self, "_" + command, None)
+            if handler is None:
+                self._Reply("502 Command not implemented")
+            else:
+                handler(argument)
+        if self.dataListener is not None:
+            self.dataListener.close()
+
+    def _Reply(self, text):
+        self.wfile.write((text + "\r\n").encode("latin-1"))
+        self.wfile.flush()
+
+    def _GetPath(self, argument):
+        return posixpath.normpath(posixpath.join(self.cwd, argument)) if argument else self.cwd
+
+    def _USER(self, argument):
+        self._Reply("331 Password required")
+
+    def _PASS(self, argument):
+        self._Reply("230 Logged in")
+
+    def _TYPE(self, argument):
+        self._Reply("200 Type set to " + argument)
+
+    def _NOOP(self, argument):
+        self._Reply("200 OK")
+
+    def _PWD(self, argument):
+        self._Reply('257 "{0}" is the current directory'.format(self.cwd))
+
+    def _CWD(self, argument):
+        path = self._GetPath(argument)
+        if not self.server.catalog.IsFolder(path):
+            return self._Reply("550 No such directory")
+        self.cwd = path
+        self._Reply("250 Directory changed")
+
+    def _PASV(self, argument):
+        if self.dataListener is not None:
+            self.dataListener.close()
+        self.dataListener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.dataListener.bind(("127.0.0.1", 0))
+        self.dataListener.listen(1)
+        iPort = self.dataListener.getsockname()[1]
+        self._Reply("227 Entering Passive Mode (127,0,0,1,{0},{1})".format(iPort // 256, iPort % 256))
+
+    def _SendData(self, content, options=None, bTruncate=False):
+        if self.dataListener is None:
+            return self._Reply("425 Use PASV first")
+        self._Reply("150 Opening data connection")
+        conn = self.dataListener.accept()[0]
+        self.dataListener.close()
+        self.dataListener = None
+        try:
+            if options is None:
+                conn.sendall(content)
+            elif bTruncate:
+                options.Send(conn.sendall, content[:len(content) // 2])
+            else:
+                options.Send(conn.sendall, content)
+        finally:
+            conn.close()
+        if bTruncate:
+            return self._Reply("426 Connection closed; transfer aborted")
+        self._Reply("226 Transfer complete")
+
+    def _NLST(self, argument):
+        self.server.options.Wait()
+        names = self.server.catalog.GetListing(self._GetPath(argument))
+        if names is None:
+            return self._Reply("550 No such directory")
+        self._SendData("".join(name + "\r\n" for name in names).encode("ascii"))
+
+    def _SIZE(self, argument):
+        if not self.server.catalog.HasFile(self._GetPath(argument)):
+            return self._Reply("550 No such file")
+        self._Reply("213 {0}".format(len(self.server.catalog.content)))
+
+    def _REST(self, argument):
+        if not argument.isdigit():
+            return self._Reply("501 Expected a byte offset")
+        self.restart = int(argument)
+        self._Reply("350 Restarting at {0}".format(self.restart))
+
+    def _RETR(self, argument):
+        options = self.server.options
+        options.Wait()
+        iStart, self.restart = self.restart, 0
+        if not self.server.catalog.HasFile(self._GetPath(argument)):
+            return self._Reply("550 No such file")
+        if options.IsFailure():
+            return self._Reply("451 Simulated failure")
+        self._SendData(self.server.catalog.content[iStart:], options, options.IsTruncated())
+
+
+class MockFTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+        The PPS ftp site stand-in (passive mode only, any user/password).  The ETL's 'ftp_host' is 127.0.0.1 and
+        'ftp_Port' is GetPort().
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, catalog, options, port=0):
+        socketserver.TCPServer.__init__(self, ("127.0.0.1", port), _FTPHandler)
+        self.catalog = catalog
+        self.options = options
+
+    def GetPort(self):
+        return self.server_address[1]
+
+
+def StartServer(server):
+    # Serve on a background (daemon) thread and return the server
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock IMERG proxy and ftp sites.")
+    parser.add_argument("--proxy-port", type=int, default=8080, help="port of the ProxyFTP.aspx stand-in")
+    parser.add_argument("--ftp-port", type=int, default=2121, help="port of the ftp stand-in")
+    parser.add_argument("--latency-ms", type=float, default=50, help="milliseconds added to every request")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="KB/s per file transfer (0 = not throttled)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of the file requests that fail")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of the transfers that break off")
+    parser.add_argument("--files", type=int, default=480, help="half hour slots of each product, ending today")
+    args = parser.parse_args()
+
+    oToday = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    catalog = MockCatalog(oToday, args.files, BuildSyntheticTiff())
+    options = MockOptions(args.latency_ms / 1000.0, args.bandwidth_kbps * 1024, args.failure_rate, args.truncate_rate)
+    proxyServer = StartServer(MockProxyServer(catalog, options, args.proxy_port))
+    ftpServer = StartServer(MockFTPServer(catalog, options, args.ftp_port))
+    print("proxy_URL: {0}".format(proxyServer.GetURL()))
+    print("ftp_host:  127.0.0.1  ftp_Port: {0}".format(ftpServer.GetPort()))
+    print("{0} folders, {1} files of {2} bytes.  Ctrl+C to stop.".format(len(catalog.folders), len(catalog.files),
+                                                                         len(catalog.content)))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
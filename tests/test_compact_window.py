@@ -0,0 +1,58 @@
+# -------------------------------------------------------------------------------
+# Name:        test_compact_window.py
+# Purpose:     Checks the 'compact_OffPeakHours' window of the conditional geodatabase compact: how it is parsed
+#               (GetOffPeakWindow(), which must not fail the run on a bad value) and which hours fall in it
+#               (IsInHourWindow()).
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7 (arcpy is not needed).
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+
+
+class OffPeakWindowTest(unittest.TestCase):
+
+    def tearDown(self):
+        IMERG_30Min_ETL.myConfig = None
+
+    def GetWindow(self, value):
+        IMERG_30Min_ETL.myConfig = {"compact_OffPeakHours": value}
+        return IMERG_30Min_ETL.GetOffPeakWindow()
+
+    def GetHours(self, window):
+        return [iHour for iHour in range(24) if IMERG_30Min_ETL.IsInHourWindow(window, iHour)]
+
+    def test_window_within_a_day(self):
+        self.assertEqual(self.GetWindow("1-4"), (1, 4))
+        self.assertEqual(self.GetHours((1, 4)), [1, 2, 3])
+        self.assertEqual(self.GetHours((20, 24)), [20, 21, 22, 23])
+
+    def test_window_over_midnight(self):
+        self.assertEqual(self.GetWindow(" 22-3 "), (22, 3))
+        self.assertEqual(self.GetHours((22, 3)), [0, 1, 2, 22, 23])
+
+    def test_no_window(self):
+        IMERG_30Min_ETL.myConfig = {}
+        self.assertEqual(IMERG_30Min_ETL.GetOffPeakWindow(), None)
+        self.assertEqual(self.GetWindow(""), None)
+        self.assertEqual(self.GetHours(None), [])
+        self.assertEqual(self.GetHours((3, 3)), [])
+
+    def test_invalid_window_is_no_window(self):
+        logging.disable(logging.WARNING)
+        try:
+            for value in ("1to4", "1-4-5", "25-3", "1-", "-4", 7):
+                self.assertEqual(self.GetWindow(value), None, value)
+        finally:
+            logging.disable(logging.NOTSET)
+
+
+if __name__ == "__main__":
+    unittest.main()
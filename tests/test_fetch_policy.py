@@ -0,0 +1,197 @@
+# -------------------------------------------------------------------------------
+# Name:        test_fetch_policy.py
+# Purpose:     Checks the FetchPolicy: the backoff between the retries, the retry budget of a run, which errors are
+#               retried and the circuit breaker.  Also checks that an ftp download is retried (and its failures counted
+#               by the circuit breaker) once per attempt - by RetrieveVerifiedFile() only, not again inside
+#               FTPSessionPool.
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7 (arcpy is not needed).
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import ftplib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+
+HOST = "ftp.example.invalid"
+# A small "raster": the TIFF header VerifyDownload() checks for, padded out
+DATA = b"II*\x00" + b"\x00" * 96
+
+
+class FakeFTP(object):
+    # Stands in for an ftplib.FTP session; each RETR sends half of the file and then drops, until 'good' is reached
+    def __init__(self, script):
+        self.script = script
+
+    def voidcmd(self, cmd):
+        pass
+
+    def size(self, ftpFile):
+        return len(DATA)
+
+    def retrbinary(self, cmd, callback, rest=None):
+        iStart = rest or 0
+        self.script["retr"] += 1
+        if self.script["retr"] < self.script["good"]:
+            callback(DATA[iStart:iStart + 20])
+            raise ftplib.error_temp("421 Connection dropped")
+        callback(DATA[iStart:])
+
+    def close(self):
+        pass
+
+
+class FakeSessionPool(IMERG_30Min_ETL.FTPSessionPool):
+    def __init__(self, script, retries):
+        IMERG_30Min_ETL.FTPSessionPool.__init__(self, HOST, retries=retries)
+        self.script = script
+
+    def _acquire(self):
+        return FakeFTP(self.script)
+
+
+class Failing(object):
+    # A request that raises the error passed in the first 'failures' times it is called, then returns "ok"
+    def __init__(self, err, failures=99):
+        self.err = err
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.err
+        return "ok"
+
+
+class FetchPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        IMERG_30Min_ETL.myRunMetrics = None
+        self.waits = []
+        self.sleep = IMERG_30Min_ETL.time.sleep
+        IMERG_30Min_ETL.time.sleep = self.waits.append
+
+    def tearDown(self):
+        IMERG_30Min_ETL.time.sleep = self.sleep
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        policy = IMERG_30Min_ETL.FetchPolicy(retries=5, backoff=1.0, max_backoff=3.0, budget=100, break_after=99)
+        request = Failing(IOError("timed out"))
+        self.assertRaises(IOError, policy.Call, HOST, request)
+        self.assertEqual(request.calls, 5)
+        # Half of the backoff (1, 2, 4 -> 3, 3) plus a random part of the other half
+        self.assertEqual(len(self.waits), 4)
+        for seconds, backoff in zip(self.waits, [1.0, 2.0, 3.0, 3.0]):
+            self.assertTrue(backoff / 2.0 <= seconds <= backoff, (seconds, backoff))
+
+    def test_success_after_a_retry(self):
+        policy = IMERG_30Min_ETL.FetchPolicy(retries=3, backoff=0, budget=100)
+        request = Failing(IMERG_30Min_ETL.HTTPStatusError(503, "Service Unavailable"), failures=1)
+        self.assertEqual(policy.Call(HOST, request), "ok")
+        self.assertEqual(request.calls, 2)
+        self.assertEqual(policy.retriesUsed, 1)
+        self.assertEqual(policy._hosts, {})
+
+    def test_budget_is_shared_by_the_requests_of_a_run(self):
+        policy = IMERG_30Min_ETL.FetchPolicy(retries=5, backoff=0, budget=2, break_after=99)
+        first = Failing(IOError("timed out"))
+        self.assertRaises(IOError, policy.Call, HOST, first)
+        self.assertEqual(first.calls, 3)
+        # The budget is spent, so the next request is not retried at all ...
+        second = Failing(IOError("timed out"), failures=1)
+        self.assertRaises(IOError, policy.Call, HOST, second)
+        self.assertEqual(second.calls, 1)
+        # ... until the next run
+        policy.StartRun()
+        third = Failing(IOError("timed out"), failures=1)
+        self.assertEqual(policy.Call(HOST, third), "ok")
+        self.assertEqual(policy.retriesUsed, 1)
+
+    def test_errors_that_will_not_go_away_are_not_retried(self):
+        policy = IMERG_30Min_ETL.FetchPolicy(retries=3, backoff=0, budget=100)
+        for err in (IMERG_30Min_ETL.HTTPStatusError(404, "Not Found"), ftplib.error_perm("550 No such file"),
+                    ValueError("not a network error")):
+            request = Failing(err)
+            self.assertRaises(type(err), policy.Call, HOST, request)
+            self.assertEqual(request.calls, 1)
+        self.assertEqual(policy.retriesUsed, 0)
+        self.assertEqual(policy._hosts, {})
+
+    def test_circuit_opens_and_lets_one_request_through_later(self):
+        policy = IMERG_30Min_ETL.FetchPolicy(retries=1, backoff=0, budget=100, break_after=2, break_seconds=60)
+        for i in range(2):
+            self.assertRaises(IOError, policy.Call, HOST, Failing(IOError("connection reset")))
+        self.assertEqual(policy.circuitsOpened, 1)
+        request = Failing(IOError("connection reset"), failures=0)
+        self.assertRaises(IMERG_30Min_ETL.CircuitOpenError, policy.Call, HOST, request)
+        self.assertEqual(request.calls, 0)
+        # (Another host is not held back)
+        self.assertEqual(policy.Call("other.example.invalid", request), "ok")
+
+        # Once break_seconds have passed, a request is let through and its success closes the circuit
+        policy._hosts[HOST][1] -= 61
+        self.assertEqual(policy.Call(HOST, request), "ok")
+        self.assertEqual(policy._hosts, {})
+
+
+class RetrieveVerifiedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_fetch_policy_")
+        self.target = os.path.join(self.folder, "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif")
+        IMERG_30Min_ETL.myConfig = {"download_ResumeAttempts": "3"}
+        IMERG_30Min_ETL.myRunMetrics = None
+        IMERG_30Min_ETL.myFetchPolicy = IMERG_30Min_ETL.FetchPolicy(retries=3, backoff=0, max_backoff=0, budget=100,
+                                                                    break_after=5, break_seconds=120)
+
+    def tearDown(self):
+        IMERG_30Min_ETL.myConfig = None
+        IMERG_30Min_ETL.myFetchPolicy = None
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def Retrieve(self, pool):
+        return IMERG_30Min_ETL.RetrieveVerifiedFile(lambda iOffset: pool.RetrieveFile("/f.tif", self.target, iOffset),
+                                                    self.target, HOST)
+
+    def GetFailuresInARow(self):
+        return IMERG_30Min_ETL.myFetchPolicy._hosts.get(HOST, [0, None])[0]
+
+    def test_failed_attempt_is_counted_once(self):
+        # One attempt that fails: one failure for the breaker, whatever 'ftp_Retries' is
+        IMERG_30Min_ETL.myConfig["download_ResumeAttempts"] = "1"
+        script = {"retr": 0, "good": 99}
+        self.assertRaises(ftplib.error_temp, self.Retrieve, FakeSessionPool(script, retries=3))
+        self.assertEqual(script["retr"], 1)
+        self.assertEqual(self.GetFailuresInARow(), 1)
+        self.assertEqual(IMERG_30Min_ETL.myFetchPolicy.retriesUsed, 0)
+
+    def test_failed_file_does_not_open_the_circuit(self):
+        # A file that fails all of its 3 attempts: 3 failures, under the 5 that open the circuit
+        script = {"retr": 0, "good": 99}
+        self.assertRaises(ftplib.error_temp, self.Retrieve, FakeSessionPool(script, retries=3))
+        self.assertEqual(script["retr"], 3)
+        self.assertEqual(self.GetFailuresInARow(), 3)
+        self.assertEqual(IMERG_30Min_ETL.myFetchPolicy.retriesUsed, 2)
+        self.assertEqual(IMERG_30Min_ETL.myFetchPolicy.circuitsOpened, 0)
+
+    def test_dropped_transfer_is_resumed(self):
+        # The first RETR drops part way; the second picks up from the bytes written and the failure is cleared
+        script = {"retr": 0, "good": 2}
+        iSize, sModified, sChecksum = self.Retrieve(FakeSessionPool(script, retries=3))
+        self.assertEqual(script["retr"], 2)
+        self.assertEqual(iSize, len(DATA))
+        with open(self.target, "rb") as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(self.GetFailuresInARow(), 0)
+        self.assertEqual(IMERG_30Min_ETL.myFetchPolicy.retriesUsed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# -------------------------------------------------------------------------------
+# Name:        test_filename.py
+# Purpose:     Checks the IMERG filename parser (IMERG_30Min_Filename.py): the fields of the names it accepts and the
+#               names it rejects.  Runs under python 2.7 or 3.
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Filename  # noqa: E402
+
+LATE = "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif"
+
+
+class ParseFilenameTest(unittest.TestCase):
+
+    def test_fields_of_a_late_file(self):
+        record = IMERG_30Min_Filename.ParseFilename(LATE)
+        self.assertEqual(record.product, "L")
+        self.assertEqual(record.start, datetime.datetime(2018, 8, 9, 23, 30, 0))
+        self.assertEqual(record.end, datetime.datetime(2018, 8, 9, 23, 59, 59))
+        self.assertEqual(record.sequence, 1410)
+        self.assertEqual(record.version, "V05B")
+        self.assertEqual(record.duration, 30)
+
+    def test_path_and_name_without_extension(self):
+        # The mosaic dataset row names have no .tif, and the extract files are full paths
+        self.assertEqual(IMERG_30Min_Filename.ParseFilename(os.path.splitext(LATE)[0]),
+                         IMERG_30Min_Filename.ParseFilename(LATE))
+        self.assertEqual(IMERG_30Min_Filename.ParseFilename(os.path.join("E:", "IMERG_Extract", "Late", LATE)),
+                         IMERG_30Min_Filename.ParseFilename(LATE))
+
+    def test_early_file_at_midnight(self):
+        record = IMERG_30Min_Filename.ParseFilename(
+            "3B-HHR-E.MS.MRG.3IMERG.20180810-S000000-E002959.0000.V05B.30min.tif")
+        self.assertEqual(record.product, "E")
+        self.assertEqual(record.start, datetime.datetime(2018, 8, 10))
+        self.assertEqual(record.sequence, 0)
+
+    def test_end_time_rolls_over_to_the_next_day(self):
+        record = IMERG_30Min_Filename.ParseFilename(
+            "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E002959.1410.V05B.60min.tif")
+        self.assertEqual(record.end, datetime.datetime(2018, 8, 10, 0, 29, 59))
+        self.assertEqual(record.duration, 60)
+
+    def test_rejected_names(self):
+        for name in ["",
+                     "readme.txt",
+                     "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000.1410.V05B.30min.tif",      # no end time
+                     "3B-HHR-L.MS.MRG.3IMERG.2018089-S233000-E235959.1410.V05B.30min.tif",  # short date
+                     "3B-HHR-L.MS.MRG.3IMERG.20181309-S233000-E235959.1410.V05B.30min.tif",  # month 13
+                     "3B-HHR-L.MS.MRG.3IMERG.20180230-S233000-E235959.1410.V05B.30min.tif",  # 30 February
+                     "3B-HHR-L.MS.MRG.3IMERG.20180809-S236000-E235959.1410.V05B.30min.tif",  # minute 60
+                     "3B-HHR-l.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif"]:  # lower case product
+            self.assertEqual(IMERG_30Min_Filename.ParseFilename(name), None, name)
+            self.assertEqual(IMERG_30Min_Filename.GetStartDateTime(name), None, name)
+
+    def test_start_datetime(self):
+        self.assertEqual(IMERG_30Min_Filename.GetStartDateTime(LATE), datetime.datetime(2018, 8, 9, 23, 30))
+
+
+class GetSiblingNameTest(unittest.TestCase):
+
+    def test_late_to_early(self):
+        self.assertEqual(IMERG_30Min_Filename.GetSiblingName(LATE, "E"),
+                         "3B-HHR-E.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif")
+
+    def test_only_the_product_letter_changes(self):
+        # The "L" and "E" letters elsewhere in the name are left alone
+        path = os.path.join("LATE", LATE)
+        self.assertEqual(IMERG_30Min_Filename.GetSiblingName(path, "E"),
+                         os.path.join("LATE", "3B-HHR-E.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif"))
+
+    def test_not_an_imerg_name(self):
+        self.assertEqual(IMERG_30Min_Filename.GetSiblingName("readme.txt", "E"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
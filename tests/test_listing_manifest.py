@@ -0,0 +1,119 @@
+# -------------------------------------------------------------------------------
+# Name:        test_listing_manifest.py
+# Purpose:     Checks the ListingManifest (the SQLite index of the remote folder listings, see 'manifest_File'): which
+#               names are new, which are selected for download, the status transitions and the pruning.
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7 (arcpy is not needed).
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+
+FOLDER = "/data/imerg/gis/2018/08"
+
+
+def GetName(product, oStart):
+    # The name of the 30 minute file of the product ("E" or "L") starting at oStart
+    oEnd = oStart + datetime.timedelta(minutes=29, seconds=59)
+    return "3B-HHR-{0}.MS.MRG.3IMERG.{1}-S{2}-E{3}.{4:04d}.V05B.30min.tif".format(
+        product, oStart.strftime("%Y%m%d"), oStart.strftime("%H%M%S"), oEnd.strftime("%H%M%S"),
+        oStart.hour * 60 + oStart.minute)
+
+
+def GetRecord(product, oStart):
+    return GetName(product, oStart), product, oStart
+
+
+class ListingManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_listing_manifest_")
+        self.manifest = IMERG_30Min_ETL.ListingManifest(os.path.join(self.folder, "manifest.sqlite"))
+        self.slots = [datetime.datetime(2018, 8, 9, 22, 0) + datetime.timedelta(minutes=30 * i) for i in range(4)]
+        self.manifest.AddListed(FOLDER, [GetRecord(product, oStart) for oStart in self.slots for product in "EL"] +
+                                [("3B-HHR-L.MS.MRG.3IMERG.20180809-S220000-E222959.1320.V05B.1day.tif", None, None)])
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_only_unlisted_names_are_new(self):
+        names = [GetName("L", oStart) for oStart in self.slots]
+        newName = GetName("L", self.slots[-1] + datetime.timedelta(minutes=30))
+        self.assertEqual(self.manifest.GetNewNames(FOLDER, names + [newName, ""]), [newName])
+        # The same names listed in another folder are new there
+        self.assertEqual(self.manifest.GetNewNames("/data/imerg/gis/2018/07", names), names)
+
+    def test_candidates_are_the_product_within_the_dates(self):
+        # After the first slot (not inclusive) and up to the third (inclusive), oldest first, no 'ignored' names
+        self.assertEqual(self.manifest.GetCandidates(FOLDER, "L", self.slots[0], self.slots[2]),
+                         [GetName("L", self.slots[1]), GetName("L", self.slots[2])])
+        self.assertEqual(self.manifest.GetCandidates(FOLDER, "E", self.slots[1]),
+                         [GetName("E", self.slots[2]), GetName("E", self.slots[3])])
+        self.assertEqual(self.manifest.GetCandidates("/data/imerg/gis/2018/07", "L", self.slots[0]), [])
+
+    def test_downloaded_and_loaded_names_are_not_candidates(self):
+        downloaded = GetName("L", self.slots[1])
+        loaded = GetName("L", self.slots[2])
+        self.manifest.SetStatus([downloaded], "downloaded")
+        self.manifest.SetStatus([loaded], "loaded")
+        self.assertEqual(self.manifest.GetCandidates(FOLDER, "L", self.slots[0]), [GetName("L", self.slots[3])])
+        self.assertEqual(self.manifest.GetLatestLoaded("L"), self.slots[2])
+        self.assertEqual(self.manifest.GetLatestLoaded("E"), None)
+
+    def test_loaded_name_is_not_moved_back_to_downloaded(self):
+        # In pipeline mode a file can be loaded before its download is recorded
+        name = GetName("L", self.slots[3])
+        self.manifest.SetStatus([name], "loaded")
+        self.manifest.SetStatus([name], "downloaded")
+        self.assertEqual(self.manifest.GetLatestLoaded("L"), self.slots[3])
+
+    def test_listing_again_keeps_the_status(self):
+        name = GetName("L", self.slots[1])
+        self.manifest.SetStatus([name], "downloaded")
+        self.manifest.AddListed(FOLDER, [GetRecord("L", self.slots[1])])
+        self.assertNotIn(name, self.manifest.GetCandidates(FOLDER, "L", self.slots[0]))
+
+    def test_prune_removes_the_entries_before_the_date(self):
+        self.manifest.AddVerified([(GetName("L", self.slots[0]), 100, None, None)])
+        # Everything dated before the third slot goes; the 'ignored' name and the download record were only just
+        # listed/verified, so they stay
+        self.assertEqual(self.manifest.Prune(self.slots[2]), 4)
+        self.assertEqual(self.manifest.GetCandidates(FOLDER, "L", self.slots[0] - datetime.timedelta(days=1)),
+                         [GetName("L", self.slots[2]), GetName("L", self.slots[3])])
+        self.assertEqual(list(self.manifest.GetVerified([GetName("L", self.slots[0])])), [GetName("L", self.slots[0])])
+        # ... until the listing/verified date is past too
+        self.assertEqual(self.manifest.Prune(datetime.datetime.now() + datetime.timedelta(days=1)), 5)
+        self.assertEqual(self.manifest.GetVerified([GetName("L", self.slots[0])]), {})
+
+    def test_read_only_manifest_cannot_be_changed(self):
+        readOnly = IMERG_30Min_ETL.ListingManifest(self.manifest.dbFile, True)
+        try:
+            self.assertEqual(len(readOnly.GetCandidates(FOLDER, "L", self.slots[0])), 3)
+            self.assertRaises(Exception, readOnly.SetStatus, [GetName("L", self.slots[1])], "loaded")
+        finally:
+            readOnly.close()
+
+
+class ManifestSettingTest(unittest.TestCase):
+
+    def tearDown(self):
+        IMERG_30Min_ETL.myConfig = None
+        IMERG_30Min_ETL.myListingManifest = None
+
+    def test_manifest_is_off_by_default(self):
+        IMERG_30Min_ETL.myConfig = {}
+        IMERG_30Min_ETL.myListingManifest = None
+        self.assertEqual(IMERG_30Min_ETL.GetListingManifest(), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+# -------------------------------------------------------------------------------
+# Name:        test_mosaic.py
+# Purpose:     Checks the arcpy-free mosaic backend (IMERG_30Min_Mosaic.LocalMosaicBackend) and, through the ETL, the
+#               MosaicCatalog kept in step with it - including a Late raster replacing its Early sibling.
+#               The catalog tests import IMERG_30Min_ETL.py, so they only run under the ETL's python 2.7 (arcpy is not
+#               needed).
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Mosaic  # noqa: E402
+try:
+    import IMERG_30Min_ETL  # noqa: E402
+except SyntaxError:
+    # (python 3 - the ETL is python 2.7 only)
+    IMERG_30Min_ETL = None
+
+ATTR_FIELDS = ["timestamp", "start_datetime", "end_datetime", "Data_Age"]
+SLOT = datetime.datetime(2018, 8, 9, 23, 30)
+LATE = "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif"
+EARLY = "3B-HHR-E.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif"
+OLDER_EARLY = "3B-HHR-E.MS.MRG.3IMERG.20180809-S230000-E232959.1380.V05B.30min.tif"
+
+
+def GetAttributes(oTimestamp, dataAge):
+    return [oTimestamp, oTimestamp - datetime.timedelta(minutes=15), oTimestamp + datetime.timedelta(minutes=15),
+            dataAge]
+
+
+class LocalMosaicBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_mosaic_")
+        self.backend = IMERG_30Min_Mosaic.LocalMosaicBackend("IMERG", ATTR_FIELDS,
+                                                             os.path.join(self.folder, "mosaic.sqlite"), batch_size=2)
+        self.rasters = []
+        for name in (EARLY, OLDER_EARLY, LATE):
+            self.rasters.append(os.path.join(self.folder, name))
+            open(self.rasters[-1], "wb").close()
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_added_rasters_have_no_attributes_until_they_are_set(self):
+        self.backend.AddRasters(self.rasters)
+        self.assertEqual(sorted(self.backend.ReadRows()),
+                         sorted((os.path.splitext(name)[0], None, None) for name in (EARLY, OLDER_EARLY, LATE)))
+        updated = self.backend.UpdateAttributes({os.path.splitext(LATE)[0]: GetAttributes(SLOT, "LATE"),
+                                                 "not in the mosaic": GetAttributes(SLOT, "LATE")})
+        self.assertEqual(updated, set([os.path.splitext(LATE)[0]]))
+        self.assertIn((os.path.splitext(LATE)[0], SLOT, "LATE"), self.backend.ReadRows())
+
+    def test_missing_raster_is_not_added(self):
+        self.assertRaises(IOError, self.backend.AddRasters, [os.path.join(self.folder, "missing.tif")])
+
+    def test_removes_by_name_and_by_date(self):
+        self.backend.AddRasters(self.rasters)
+        self.backend.UpdateAttributes({os.path.splitext(OLDER_EARLY)[0]: GetAttributes(datetime.datetime(2018, 5, 1),
+                                                                                       "EARLY")})
+        self.backend.RemoveRastersBefore(datetime.date(2018, 5, 2))
+        self.assertEqual(len(self.backend.ReadRows()), 2)
+        self.backend.RemoveRasters([os.path.splitext(EARLY)[0], os.path.splitext(LATE)[0]])
+        self.assertEqual(self.backend.ReadRows(), [])
+
+    def test_calls_are_counted_per_batch_of_names(self):
+        self.backend.AddRasters(self.rasters)
+        self.backend.UpdateAttributes(dict((os.path.splitext(os.path.basename(raster))[0], GetAttributes(SLOT, "LATE"))
+                                           for raster in self.rasters))
+        self.backend.RemoveRasters([os.path.splitext(os.path.basename(raster))[0] for raster in self.rasters])
+        self.assertEqual(self.backend.calls, {"AddRasters": 1, "UpdateAttributes": 2, "RemoveRasters": 2})
+
+    def test_delete_raster_removes_its_sidecars(self):
+        open(self.rasters[0] + ".aux.xml", "wb").close()
+        self.backend.DeleteRaster(self.rasters[0])
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted([OLDER_EARLY, LATE, "mosaic.sqlite"]))
+
+
+@unittest.skipIf(IMERG_30Min_ETL is None, "IMERG_30Min_ETL.py needs python 2.7")
+class MosaicCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_mosaic_catalog_")
+        self.finalFolder = os.path.join(self.folder, "final")
+        os.mkdir(self.finalFolder)
+        self.mosaicDS = os.path.join(self.folder, "test.gdb", "IMERG")
+        IMERG_30Min_ETL.myConfig = {"final_Folder": self.finalFolder,
+                                    "GDBPath": os.path.join(self.folder, "test.gdb"),
+                                    "mosaicDSName": "IMERG",
+                                    "rasterTimeProperty": "timestamp",
+                                    "rasterStartTimeProperty": "start_datetime",
+                                    "rasterEndTimeProperty": "end_datetime",
+                                    "rasterDataAgeProperty": "Data_Age",
+                                    "mosaic_Backend": "LOCAL",
+                                    "mosaic_LocalFile": os.path.join(self.folder, "mosaic.sqlite")}
+        IMERG_30Min_ETL.myMosaicBackend = None
+        IMERG_30Min_ETL.myMosaicCatalog = None
+        IMERG_30Min_ETL.myRunMetrics = None
+        # An Early raster (with a sidecar) already in the mosaic, and an older one
+        backend = IMERG_30Min_ETL.GetMosaicBackend(self.mosaicDS)
+        for name, oTimestamp in ((EARLY, SLOT), (OLDER_EARLY, SLOT - datetime.timedelta(minutes=30))):
+            raster = os.path.join(self.finalFolder, name)
+            open(raster, "wb").close()
+            backend.AddRasters([raster])
+            backend.UpdateAttributes({os.path.splitext(name)[0]: GetAttributes(oTimestamp, "EARLY")})
+        open(os.path.join(self.finalFolder, EARLY + ".aux.xml"), "wb").close()
+
+    def tearDown(self):
+        if IMERG_30Min_ETL.myMosaicBackend is not None:
+            IMERG_30Min_ETL.myMosaicBackend.close()
+        IMERG_30Min_ETL.myMosaicBackend = None
+        IMERG_30Min_ETL.myMosaicCatalog = None
+        IMERG_30Min_ETL.myConfig = None
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_catalog_is_read_from_the_mosaic(self):
+        catalog = IMERG_30Min_ETL.GetMosaicCatalog(self.mosaicDS)
+        self.assertEqual(catalog.GetCount(), 2)
+        self.assertTrue(catalog.Contains(os.path.splitext(EARLY)[0]))
+        self.assertEqual(catalog.GetLatest("EARLY"), SLOT)
+        self.assertEqual(catalog.GetLatest("LATE"), None)
+        self.assertEqual(catalog.GetNamesBefore(SLOT.date()), [])
+        self.assertEqual(sorted(catalog.GetNamesBefore(SLOT.date() + datetime.timedelta(days=1))),
+                         sorted(os.path.splitext(name)[0] for name in (EARLY, OLDER_EARLY)))
+
+    def test_late_raster_replaces_its_early_sibling(self):
+        catalog = IMERG_30Min_ETL.GetMosaicCatalog(self.mosaicDS)
+        IMERG_30Min_ETL.ReplaceEarlyRasters([LATE], self.mosaicDS)
+        # The Early row and files are gone, the older Early raster (no Late sibling) is left alone
+        self.assertFalse(catalog.Contains(os.path.splitext(EARLY)[0]))
+        self.assertTrue(catalog.Contains(os.path.splitext(OLDER_EARLY)[0]))
+        self.assertEqual([row[0] for row in IMERG_30Min_ETL.myMosaicBackend.ReadRows()],
+                         [os.path.splitext(OLDER_EARLY)[0]])
+        self.assertEqual(os.listdir(self.finalFolder), [OLDER_EARLY])
+        self.assertEqual(catalog.changeCount, 1)
+
+        # ... and the Late raster takes its place
+        catalog.AddRasters([(os.path.splitext(LATE)[0], SLOT, "LATE")])
+        self.assertEqual(catalog.GetLatest("LATE"), SLOT)
+        self.assertEqual(catalog.GetLatest("EARLY"), SLOT - datetime.timedelta(minutes=30))
+        self.assertEqual(catalog.GetCount(), 2)
+
+    def test_nothing_to_replace(self):
+        catalog = IMERG_30Min_ETL.GetMosaicCatalog(self.mosaicDS)
+        IMERG_30Min_ETL.ReplaceEarlyRasters(["3B-HHR-L.MS.MRG.3IMERG.20180809-S220000-E222959.1320.V05B.30min.tif",
+                                             EARLY], self.mosaicDS)
+        self.assertEqual(catalog.GetCount(), 2)
+        self.assertEqual(catalog.changeCount, 0)
+        self.assertEqual(IMERG_30Min_ETL.myMosaicBackend.calls.get("RemoveRasters", 0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
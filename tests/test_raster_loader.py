@@ -0,0 +1,117 @@
+# -------------------------------------------------------------------------------
+# Name:        test_raster_loader.py
+# Purpose:     Checks that a pipeline RasterLoader (LoadRaster() for each downloaded file, then LoadFolder() and
+#               Finish()) transforms and adds each raster once, against the 'LOCAL' mosaic backend with a stand-in
+#               transform that copies the file.
+#               It imports IMERG_30Min_ETL.py, so it runs under the ETL's python 2.7 (arcpy is not needed).
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_ETL  # noqa: E402
+import IMERG_30Min_Mosaic  # noqa: E402
+
+NAMES = ["3B-HHR-E.MS.MRG.3IMERG.20180809-S{0}-E{1}.{2}.V05B.30min.tif".format(sStart, sEnd, sMinutes)
+         for sStart, sEnd, sMinutes in (("220000", "222959", "1320"), ("223000", "225959", "1350"),
+                                        ("230000", "232959", "1380"))]
+
+
+class KeepExtractBackend(IMERG_30Min_Mosaic.LocalMosaicBackend):
+    # A backend that cannot delete the extract files (i.e. they are locked)
+    def DeleteRaster(self, raster):
+        raise IOError("Raster is locked: {0}".format(raster))
+
+
+class RasterLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_raster_loader_")
+        self.extractFolder = os.path.join(self.folder, "extract")
+        os.mkdir(self.extractFolder)
+        os.mkdir(os.path.join(self.folder, "final"))
+        IMERG_30Min_ETL.myConfig = {"final_Folder": os.path.join(self.folder, "final"),
+                                    "GDBPath": os.path.join(self.folder, "test.gdb"),
+                                    "mosaicDSName": "IMERG",
+                                    "rasterTimeProperty": "timestamp",
+                                    "rasterStartTimeProperty": "start_datetime",
+                                    "rasterEndTimeProperty": "end_datetime",
+                                    "rasterDataAgeProperty": "Data_Age",
+                                    "mosaic_Backend": "LOCAL",
+                                    "mosaic_LocalFile": os.path.join(self.folder, "mosaic.sqlite"),
+                                    "manifest_File": ""}
+        IMERG_30Min_ETL.myMosaicBackend = None
+        IMERG_30Min_ETL.myMosaicCatalog = None
+        IMERG_30Min_ETL.myRunMetrics = None
+        self.transformed = []
+        self.transformRaster = IMERG_30Min_ETL.TransformRaster
+        IMERG_30Min_ETL.TransformRaster = self.CopyRaster
+        for name in NAMES:
+            with open(os.path.join(self.extractFolder, name), "wb") as f:
+                f.write(b"II*\x00")
+
+    def tearDown(self):
+        IMERG_30Min_ETL.TransformRaster = self.transformRaster
+        if IMERG_30Min_ETL.myMosaicBackend is not None:
+            IMERG_30Min_ETL.myMosaicBackend.close()
+        IMERG_30Min_ETL.myMosaicBackend = None
+        IMERG_30Min_ETL.myMosaicCatalog = None
+        IMERG_30Min_ETL.myConfig = None
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def CopyRaster(self, transformItem):
+        # Stands in for the extract/save of TransformRaster()
+        raster, finalRaster = transformItem[0], transformItem[1]
+        self.transformed.append(os.path.basename(raster))
+        shutil.copy(raster, finalRaster)
+        return raster, finalRaster, True, "", None, 0.0
+
+    def GetMosaicNames(self):
+        return sorted(name for name, oTimestamp, dataAge in IMERG_30Min_ETL.myMosaicBackend.ReadRows())
+
+    def LoadAsDownloaded(self):
+        # Pipeline mode: each file is loaded as it is downloaded, then the folder is swept for left over files
+        loader = IMERG_30Min_ETL.RasterLoader(self.extractFolder, "EARLY")
+        for name in NAMES:
+            loader.LoadRaster(name)
+        loader.LoadFolder()
+        loader.Finish()
+        return loader
+
+    def test_pipeline_loads_each_raster_once(self):
+        loader = self.LoadAsDownloaded()
+        self.assertEqual(sorted(self.transformed), NAMES)
+        self.assertEqual(loader.loadedCount, len(NAMES))
+        self.assertEqual(self.GetMosaicNames(), [os.path.splitext(name)[0] for name in NAMES])
+        self.assertEqual(os.listdir(self.extractFolder), [])
+
+    def test_undeleted_extract_file_is_not_loaded_again(self):
+        IMERG_30Min_ETL.myMosaicBackend = KeepExtractBackend(
+            os.path.join(self.folder, "test.gdb", "IMERG"), ["timestamp", "start_datetime", "end_datetime", "Data_Age"],
+            os.path.join(self.folder, "mosaic.sqlite"))
+        loader = self.LoadAsDownloaded()
+        self.assertEqual(sorted(self.transformed), NAMES)
+        self.assertEqual(loader.loadedCount, len(NAMES))
+        self.assertEqual(sorted(os.listdir(self.extractFolder)), NAMES)
+
+    def test_left_over_rasters_are_loaded(self):
+        # A file left in the extract folder by an earlier run is picked up by LoadFolder()
+        loader = IMERG_30Min_ETL.RasterLoader(self.extractFolder, "EARLY")
+        loader.LoadRaster(NAMES[0])
+        loader.LoadFolder()
+        loader.Finish()
+        self.assertEqual(sorted(self.transformed), NAMES)
+        self.assertEqual(loader.loadedCount, len(NAMES))
+        self.assertEqual(IMERG_30Min_ETL.GetMosaicCatalog(os.path.join(self.folder, "test.gdb", "IMERG")).GetLatest(
+            "EARLY"), datetime.datetime(2018, 8, 9, 23, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# -------------------------------------------------------------------------------
+# Name:        test_retention.py
+# Purpose:     Checks the retention planning and deletes (IMERG_30Min_Retention.py): which rasters either side of the
+#               keep date are deleted, with their sidecar files, both with NumPy (if it is installed) and without it.
+#               Runs under python 2.7 or 3.
+#
+#               Usage:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import IMERG_30Min_Retention  # noqa: E402
+
+KEEP_DATE = datetime.date(2018, 8, 5)
+# The last raster before the keep date and the first one on it
+EXPIRED = "3B-HHR-L.MS.MRG.3IMERG.20180804-S233000-E235959.1410.V05B.30min.tif"
+KEPT = "3B-HHR-L.MS.MRG.3IMERG.20180805-S000000-E002959.0000.V05B.30min.tif"
+EXPIRED_EARLY = "3B-HHR-E.MS.MRG.3IMERG.20180801-S120000-E122959.0720.V05B.30min.tif"
+# No IMERG date, or an impossible one - never deleted
+UNPARSED = ["boundary.tif", "3B-HHR-L.MS.MRG.3IMERG.20181304-S000000-E002959.0000.V05B.30min.tif"]
+SIDECARS = [".aux.xml", ".ovr"]
+
+
+class RetentionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_retention_")
+        for raster in [EXPIRED, KEPT, EXPIRED_EARLY] + UNPARSED:
+            for fileName in [raster] + [raster + sidecar for sidecar in SIDECARS]:
+                open(os.path.join(self.folder, fileName), "wb").close()
+        open(os.path.join(self.folder, "notes.txt"), "wb").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def CheckPlan(self):
+        plan = IMERG_30Min_Retention.PlanRetention(self.folder, KEEP_DATE)
+        self.assertEqual(sorted(plan.expired), sorted([EXPIRED, EXPIRED_EARLY]))
+        self.assertEqual(sorted(plan.expired[EXPIRED]), sorted([EXPIRED] + [EXPIRED + s for s in SIDECARS]))
+        self.assertEqual(plan.kept, 1)
+        self.assertEqual(sorted(plan.unparsed), sorted(UNPARSED))
+        return plan
+
+    def test_plan_splits_at_the_keep_date(self):
+        self.CheckPlan()
+
+    def test_plan_without_numpy(self):
+        numpy, bNumPyImported = IMERG_30Min_Retention.numpy, IMERG_30Min_Retention.bNumPyImported
+        IMERG_30Min_Retention.numpy, IMERG_30Min_Retention.bNumPyImported = None, True
+        try:
+            self.CheckPlan()
+        finally:
+            IMERG_30Min_Retention.numpy, IMERG_30Min_Retention.bNumPyImported = numpy, bNumPyImported
+
+    def test_plan_of_a_missing_folder(self):
+        plan = IMERG_30Min_Retention.PlanRetention(os.path.join(self.folder, "missing"), KEEP_DATE)
+        self.assertEqual((plan.expired, plan.kept, plan.unparsed), ({}, 0, []))
+
+    def CheckDeletes(self, workers):
+        plan = IMERG_30Min_Retention.PlanRetention(self.folder, KEEP_DATE)
+        deleted, failures = IMERG_30Min_Retention.DeleteRasters(self.folder, plan.expired, workers)
+        self.assertEqual(sorted(deleted), sorted(plan.expired))
+        self.assertEqual(failures, [])
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted(
+            [KEPT + s for s in [""] + SIDECARS] + [name + s for name in UNPARSED for s in [""] + SIDECARS] +
+            ["notes.txt"]))
+
+    def test_expired_rasters_are_deleted_with_their_sidecars(self):
+        self.CheckDeletes(1)
+
+    def test_expired_rasters_are_deleted_on_threads(self):
+        self.CheckDeletes(4)
+
+    def test_file_already_gone_is_not_a_failure(self):
+        plan = IMERG_30Min_Retention.PlanRetention(self.folder, KEEP_DATE)
+        os.remove(os.path.join(self.folder, EXPIRED + ".ovr"))
+        deleted, failures = IMERG_30Min_Retention.DeleteRasters(self.folder, plan.expired)
+        self.assertEqual(sorted(deleted), sorted([EXPIRED, EXPIRED_EARLY]))
+        self.assertEqual(failures, [])
+
+    def test_sidecars_are_grouped_with_the_longest_raster_name(self):
+        groups = IMERG_30Min_Retention.GroupRasterFiles(["a.tif", "a.b.tif", "a.b.tif.aux.xml", "a.tif.ovr", "c.txt"])
+        self.assertEqual(groups, {"a.tif": ["a.tif", "a.tif.ovr"], "a.b.tif": ["a.b.tif", "a.b.tif.aux.xml"]})
+
+
+if __name__ == "__main__":
+    unittest.main()